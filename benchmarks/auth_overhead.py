@@ -0,0 +1,67 @@
+"""Per-request authentication overhead with and without the verified-token cache.
+
+Times the same trivial handler mounted without and with @jwt_required, through
+the Flask test client, first with the token cache disabled (every request
+verifies the signature, as before the cache existed) and then enabled. The
+difference between the protected and public timings is the auth overhead.
+
+Usage:
+    python benchmarks/auth_overhead.py --requests 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def time_requests(client, url, headers, requests):
+    client.get(url, headers=headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(url, headers=headers)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp(prefix="auth-")}/main.db'
+    os.environ['RATE_LIMIT_DEFAULT'] = 'off'  # thousands of requests from one client; see rate_limiting.py
+    from flask_jwt_extended import create_access_token, jwt_required
+    from main_app import app as main
+
+    @main.app.route('/_bench/public')
+    def bench_public():
+        return ''
+
+    @main.app.route('/_bench/protected')
+    @jwt_required()
+    def bench_protected():
+        main.current_identity().user_id
+        return ''
+
+    with main.app.app_context():
+        token = create_access_token(identity='1')
+    headers = {'Authorization': f'Bearer {token}'}
+    client = main.app.test_client()
+    token_cache = main.jwt.token_cache
+
+    results = {}
+    for label, cache in (('before (no cache)', None), ('after (token cache)', token_cache)):
+        main.jwt.token_cache = cache
+        public = time_requests(client, '/_bench/public', {}, args.requests)
+        protected = time_requests(client, '/_bench/protected', headers, args.requests)
+        results[label] = protected - public
+        print(f'{label:<22} public {public:8.1f} us  protected {protected:8.1f} us  auth overhead {protected - public:8.1f} us')
+
+    before, after = results.values()
+    print(f'auth overhead reduced by {before - after:.1f} us per request ({(1 - after / before) * 100:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
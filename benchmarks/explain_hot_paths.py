@@ -0,0 +1,219 @@
+"""Check that every hot endpoint query is served by an index.
+
+Seeds throwaway databases for both apps, applies the migrations, calls each
+listed endpoint through the Flask test clients while recording the SQL they
+run, then EXPLAINs every recorded statement. Exits with code 1 if any of them
+scans a large table without an index, or if an endpoint fails (its remaining
+statements would go unchecked). tests/test_explain_hot_paths.py runs it.
+
+Usage:
+    python benchmarks/explain_hot_paths.py
+    python benchmarks/explain_hot_paths.py --database-url postgresql://localhost/booking_test \
+        --crm-database-url postgresql://localhost/crm_test
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Tables that grow without bound; small lookup tables may be scanned
+LARGE_TABLES = {'event', 'booking', 'user', 'crm_outbox', 'booking_notification', 'event_stats',
+                'facilitator_daily_stats'}
+
+SCHEDULE = {'events': [{'facilitator_id': 1, 'date_time': '2030-01-01T09:00:00', 'duration': 60}]}
+
+MAIN_ENDPOINTS = [
+    ('GET', '/api/events'),
+    ('GET', '/api/events?upcoming_only=true&event_type=session&limit=20'),
+    ('GET', '/api/events?date_from=2030-01-01T00:00:00&date_to=2030-02-01T00:00:00'),
+    ('GET', '/api/events/{event_id}'),
+    ('GET', '/api/events/search?specialization=yoga&max_price=50'),  # builds the search index
+    ('GET', '/api/my-bookings'),
+    ('GET', '/api/my-bookings?status=confirmed&upcoming_only=true'),
+    ('GET', '/api/facilitator/events/{facilitator_id}'),
+    ('GET', '/api/facilitator/events/{facilitator_id}?status=active'),
+    ('GET', '/api/facilitator/events/{event_id}/bookings'),
+    ('GET', '/api/facilitator/events/{event_id}/bookings?status=confirmed'),
+    ('GET', '/api/facilitator/{facilitator_id}/analytics'),
+    ('GET', '/api/facilitator/{facilitator_id}/analytics/events'),
+    ('POST', '/api/bookings'),
+    ('DELETE', '/api/bookings/{booking_id}'),
+    # The first check loads the facilitator's events, the second polls the change feed
+    ('POST', '/api/facilitator/schedule/validate', SCHEDULE),
+    ('POST', '/api/facilitator/schedule/validate', SCHEDULE),
+]
+
+CRM_ENDPOINTS = [
+    ('GET', '/notifications'),
+    ('GET', '/notifications?since_id=100'),
+    ('GET', '/notifications?since_version=5'),
+    ('GET', '/notifications?updated_since=2030-01-01T00:00:00'),
+    ('GET', '/notifications?processed=false&limit=50'),
+    ('GET', '/api/notifications?limit=50'),
+]
+
+
+def seed_main(app, db, models, facilitators=20, events=2000, users=500, bookings=20000):
+    User, Facilitator, Event, Booking = models
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(db.insert(Facilitator), [
+            {'id': i, 'name': f'Facilitator {i}', 'email': f'f{i}@example.com', 'specialization': 'Yoga'}
+            for i in range(1, facilitators + 1)
+        ])
+        db.session.execute(db.insert(Event), [
+            {'id': i, 'title': f'Event {i}', 'event_type': 'session' if i % 4 else 'retreat',
+             'date_time': now + timedelta(hours=i - events // 2), 'duration': 60, 'max_participants': 1000,
+             'price': 20.0, 'facilitator_id': i % facilitators + 1, 'is_active': i % 10 != 0}
+            for i in range(1, events + 1)
+        ])
+        db.session.execute(db.insert(User), [
+            {'id': i, 'email': f'user{i}@example.com', 'name': f'User {i}'} for i in range(1, users + 1)
+        ])
+        db.session.execute(db.insert(Booking), [
+            {'user_id': i % users + 1, 'event_id': (i // users * 37 + i % users * 13) % events + 1,
+             'booking_date': now - timedelta(minutes=i), 'status': 'cancelled' if i // users % 5 == 4 else 'confirmed'}
+            for i in range(bookings)
+        ])
+        db.session.commit()
+
+
+def seed_crm(app, db, BookingNotification, notifications=20000):
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(db.insert(BookingNotification), [
+            {'booking_id': i, 'user_name': f'User {i}', 'user_email': f'user{i}@example.com',
+             'event_title': f'Event {i}', 'event_date': now, 'facilitator_id': i % 20 + 1,
+             'received_at': now - timedelta(minutes=i), 'updated_at': now - timedelta(minutes=i),
+             'processed': i % 10 != 0, 'version': i}
+            for i in range(1, notifications + 1)
+        ])
+        db.session.commit()
+
+
+def analyze(engine):
+    with engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
+
+
+def record_statements(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    from sqlalchemy import event
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def full_scans(engine, statement, parameters):
+    """Large tables the statement reads without an index, plus the plan text"""
+    with engine.connect() as connection:
+        if engine.dialect.name == 'sqlite':
+            rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            plan = [row[-1] for row in rows]
+            scans = set()
+            for detail in plan:
+                match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+                if match and 'USING' not in detail and match.group(1) in LARGE_TABLES:
+                    scans.add(match.group(1))
+            return scans, '\n'.join(plan)
+        if engine.dialect.name == 'postgresql':
+            connection.exec_driver_sql('SET enable_seqscan = off')
+            raw = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+            plan = raw if isinstance(raw, list) else json.loads(raw)
+            scans = set()
+            nodes = [plan[0]['Plan']]
+            while nodes:
+                node = nodes.pop()
+                if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES:
+                    scans.add(node['Relation Name'])
+                nodes.extend(node.get('Plans', []))
+            return scans, json.dumps(plan, indent=2)
+        raise SystemExit(f'Unsupported database: {engine.dialect.name}')
+
+
+def check(engine, client, endpoints, headers=None, fill=None):
+    failures = 0
+    statements = record_statements(engine)
+    for method, url, *body in endpoints:
+        url = url.format(**(fill or {}))
+        del statements[:]
+        kwargs = {'headers': headers or {}}
+        if method == 'POST':
+            kwargs['json'] = body[0] if body else {'event_id': fill['event_id']}
+        response = client.open(url, method=method, **kwargs)
+        checked = list(statements)
+        print(f'{method} {url} -> {response.status_code}, {len(checked)} statements')
+        if response.status_code >= 400:
+            failures += 1
+            print('  FAILED: the request was not served, so its statements went unchecked')
+        for statement, parameters in checked:
+            scans, plan = full_scans(engine, statement, parameters)
+            if scans:
+                failures += 1
+                print(f'  FULL SCAN of {", ".join(sorted(scans))}:\n    {" ".join(statement.split())}')
+                print('    ' + plan.replace('\n', '\n    '))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='throwaway main app database (default: temporary SQLite)')
+    parser.add_argument('--crm-database-url', help='throwaway CRM database (default: temporary SQLite)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='explain-')
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{workdir}/main.db'
+    os.environ['CRM_DATABASE_URL'] = args.crm_database_url or f'sqlite:///{workdir}/crm.db'
+    os.environ['CRM_ENDPOINT'] = ''
+    # The apps log JSON to stdout too; keep the report readable unless LOG_LEVEL asks for more
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from flask_jwt_extended import create_access_token
+    from main_app import app as main
+    from crm_app import crm_app as crm
+
+    with main.app.app_context():
+        main.db.drop_all()
+        main.migrate()
+    seed_main(main.app, main.db, (main.User, main.Facilitator, main.Event, main.Booking))
+    with main.app.app_context():
+        main.recount_seats_taken()
+        main.db.session.commit()
+        main.rebuild_analytics()
+        analyze(main.db.engine)
+        token = create_access_token(identity='1')
+        booking_id = main.Booking.query.filter_by(user_id=1, status='confirmed').first().id
+        main_engine = main.db.engine
+
+    with crm.app.app_context():
+        crm.db.drop_all()
+        crm.migrate()
+    seed_crm(crm.app, crm.db, crm.BookingNotification)
+    with crm.app.app_context():
+        analyze(crm.db.engine)
+        crm_engine = crm.db.engine
+
+    failures = check(main_engine, main.app.test_client(), MAIN_ENDPOINTS,
+                     headers={'Authorization': f'Bearer {token}'},
+                     fill={'event_id': 2, 'facilitator_id': 1, 'booking_id': booking_id})
+    failures += check(crm_engine, crm.app.test_client(), CRM_ENDPOINTS,
+                      headers={'Authorization': f"Bearer {os.getenv('CRM_BEARER_TOKEN', 'secure-bearer-token-123')}"})
+
+    if failures:
+        print(f'FAIL: {failures} failed requests or statements scanning a large table without an index')
+        return 1
+    print('OK: every hot path statement uses an index')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Time to first byte and peak memory of the streaming booking / notification exports.
+
+Seeds --rows bookings on one event (main_app) and --rows notifications (CRM)
+in temporary SQLite databases, then consumes each export through the test
+client chunk by chunk. Python heap usage is traced while the export streams:
+with batching it stays at roughly one batch of rows however large --rows is,
+so running with 10x the rows should report about the same peak.
+
+Usage:
+    python benchmarks/export_streaming.py --rows 200000 --format csv --json out.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+CHUNK = 50000
+
+
+def seed_main(main, rows):
+    db = main.db
+    now = datetime.utcnow()
+    db.session.add(main.Facilitator(id=1, name='Bench Facilitator', email='bench@example.com'))
+    db.session.add(main.Event(id=1, title='Export event', event_type='retreat', date_time=now, duration=60,
+                              max_participants=rows, facilitator_id=1, seats_taken=rows))
+    for start in range(0, rows, CHUNK):
+        ids = range(start + 1, min(start + CHUNK, rows) + 1)
+        db.session.execute(main.User.__table__.insert(), [
+            {'id': i, 'email': f'user{i}@example.com', 'name': f'User {i}'} for i in ids
+        ])
+        db.session.execute(main.Booking.__table__.insert(), [
+            {'id': i, 'user_id': i, 'event_id': 1, 'status': 'confirmed', 'notes': 'seeded',
+             'booking_date': now - timedelta(seconds=i)} for i in ids
+        ])
+    db.session.commit()
+
+
+def seed_crm(crm, rows):
+    db = crm.db
+    now = datetime.utcnow()
+    for start in range(0, rows, CHUNK):
+        db.session.execute(crm.BookingNotification.__table__.insert(), [
+            {'id': i, 'booking_id': i, 'user_name': f'User {i}', 'user_email': f'user{i}@example.com',
+             'event_title': 'Export event', 'event_date': now, 'facilitator_id': 1,
+             'received_at': now - timedelta(seconds=i), 'updated_at': now, 'processed': False,
+             'notification_type': 'created', 'version': 1}
+            for i in range(start + 1, min(start + CHUNK, rows) + 1)
+        ])
+    db.session.commit()
+
+
+def consume(client, url, headers):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url, headers=headers, buffered=False)
+    first_byte = None
+    size = lines = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+        lines += chunk.count(b'\n')
+    response.close()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'status': response.status_code,
+        'lines': lines,
+        'bytes': size,
+        'first_byte_ms': round(first_byte * 1000, 1),
+        'total_s': round(elapsed, 2),
+        'rows_per_second': round(lines / elapsed),
+        'peak_traced_mb': round(peak / 2 ** 20, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='export-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/main.db'
+    os.environ['CRM_DATABASE_URL'] = f'sqlite:///{directory}/crm.db'
+    os.environ.setdefault('CRM_BEARER_TOKEN', 'secure-bearer-token-123')
+    from flask_jwt_extended import create_access_token
+    from main_app import app as main
+    from crm_app import crm_app as crm
+
+    with main.app.app_context():
+        main.migrate()
+        seed_main(main, args.rows)
+        token = create_access_token(identity='1')
+    with crm.app.app_context():
+        crm.migrate()
+        seed_crm(crm, args.rows)
+
+    results = {
+        'bookings': consume(main.app.test_client(),
+                            f'/api/facilitator/events/1/bookings/export?format={args.format}',
+                            {'Authorization': f'Bearer {token}'}),
+        'notifications': consume(crm.app.test_client(), f'/notifications/export?format={args.format}',
+                                 {'Authorization': f"Bearer {os.environ['CRM_BEARER_TOKEN']}"})
+    }
+    for name, result in results.items():
+        print(f"{name:<14} {result['lines']:>9} lines {result['bytes'] / 2 ** 20:8.1f} MB  "
+              f"first byte {result['first_byte_ms']:7.1f} ms  total {result['total_s']:6.2f} s  "
+              f"{result['rows_per_second']:>8} rows/s  peak heap {result['peak_traced_mb']:6.2f} MB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': args.rows, 'format': args.format, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
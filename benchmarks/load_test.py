@@ -0,0 +1,418 @@
+"""Replay a configurable traffic mix against both apps and report per-endpoint latency.
+
+By default everything runs in this process:
+- A stub CRM (a tiny HTTP server answering /notify and /notify/batch) takes
+  the main app's outbox deliveries, so CRM ingest does not skew the numbers.
+- The main app and the CRM app are served by threaded werkzeug servers on
+  fresh SQLite databases, seeded by seed.py.
+- Worker threads replay the mix.
+
+Point --main-url/--crm-url at running deployments instead. Those must be
+seeded with seed.py using the same --seed and sizes, and JWT_SECRET_KEY and
+CRM_BEARER_TOKEN must match theirs, because tokens are minted locally.
+
+Operations (weights via --mix, e.g. browse=50,book=15,cancel=5,...):
+    browse        GET /api/events (first page or a type filter), /api/events/search or /api/events/<id>
+    book          POST /api/bookings for a random upcoming event
+    cancel        DELETE /api/bookings/<id> for a booking this run made
+    my_bookings   GET /api/my-bookings
+    facilitator   GET /api/facilitator/events/<id>, /api/facilitator/events/<id>/bookings
+                  or the /api/facilitator/<id>/analytics dashboard
+    dashboard     GET /notifications?limit=50 on the CRM, with If-None-Match like the dashboard poll
+Every --burst-every seconds, --burst-size distinct users book the same hot
+event at once (endpoint "POST /api/bookings [hot]"). The hot event is the
+upcoming one with the most seats.
+
+The report has throughput and p50/p95/p99 per endpoint. It is written as JSON
+to --output, and --compare prints the change against an earlier report. Client
+and servers share one interpreter in the default mode: compare runs made on
+the same machine and settings, not absolute numbers.
+
+Usage:
+    python benchmarks/load_test.py --duration 60 --concurrency 16 --output run.json
+    python benchmarks/load_test.py --mix browse=80,book=10,dashboard=10 --compare run.json --output run2.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DEFAULT_MIX = 'browse=45,book=12,cancel=4,my_bookings=14,facilitator=10,dashboard=15'
+OPERATIONS = ('browse', 'book', 'cancel', 'my_bookings', 'facilitator', 'dashboard')
+
+
+def parse_mix(text):
+    mix = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight)
+    if not any(mix.values()):
+        raise SystemExit('The traffic mix needs at least one operation with a positive weight')
+    return mix
+
+
+class StubCRM(ThreadingHTTPServer):
+    """Accepts every notification the main app's outbox sends, like a healthy CRM"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubCRMHandler)
+        self.received = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/notify'
+
+
+class StubCRMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+        if self.path == '/notify/batch':
+            items = body if isinstance(body, list) else []
+            reply = {'status': 'success', 'accepted': len(items), 'duplicates': 0, 'rejected': 0,
+                     'results': [{'index': index, 'status': 'success', 'notification_id': index + 1}
+                                 for index in range(len(items))]}
+        else:
+            items = [body]
+            reply = {'status': 'success', 'notification_id': 1}
+        with self.server.lock:
+            self.server.received[self.path] += len(items)
+        data = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(app):
+    """Serve a Flask app on a free local port in a background thread; returns (server, base url)"""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def report(self, duration):
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            ordered = sorted(self.latencies[endpoint])
+            statuses = self.statuses[endpoint]
+            errors = sum(count for status, count in statuses.items() if status == 'error' or int(status) >= 500)
+            endpoints[endpoint] = {
+                'requests': len(ordered),
+                'errors': errors,
+                'statuses': dict(sorted(statuses.items())),
+                'rps': round(len(ordered) / duration, 2),
+                'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+                **{f'p{int(fraction * 100)}_ms': round(percentile(ordered, fraction) * 1000, 2)
+                   for fraction in (0.5, 0.95, 0.99)},
+                'max_ms': round(ordered[-1] * 1000, 2),
+            }
+        requests_total = sum(stats['requests'] for stats in endpoints.values())
+        totals = {
+            'requests': requests_total,
+            'errors': sum(stats['errors'] for stats in endpoints.values()),
+            'rps': round(requests_total / duration, 2),
+        }
+        return totals, endpoints
+
+
+class Traffic:
+    """Issues the mix's operations; one requests.Session per worker thread"""
+
+    def __init__(self, main_url, crm_url, tokens, crm_token, events, facilitators, recorder, timeout=30):
+        self.main_url = main_url
+        self.crm_url = crm_url
+        self.tokens = tokens  # user id -> JWT
+        self.user_ids = list(tokens)
+        self.crm_token = crm_token
+        self.events = events  # upcoming active event ids
+        self.facilitators = facilitators
+        self.recorder = recorder
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.bookings = []  # (user id, booking id) made by this run and not cancelled yet
+        self._local = threading.local()
+
+    def session(self):
+        import requests
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def call(self, endpoint, method, url, user_id=None, headers=None, **kwargs):
+        headers = dict(headers or {})
+        if user_id is not None:
+            headers['Authorization'] = f'Bearer {self.tokens[user_id]}'
+        started = time.perf_counter()
+        try:
+            response = self.session().request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            status = str(response.status_code)
+        except Exception:
+            response, status = None, 'error'
+        self.recorder.record(endpoint, time.perf_counter() - started, status)
+        return response
+
+    def browse(self, rng):
+        user_id = rng.choice(self.user_ids)
+        roll = rng.random()
+        if roll < 0.4:
+            self.call('GET /api/events', 'GET', f'{self.main_url}/api/events', user_id)
+        elif roll < 0.55:
+            self.call('GET /api/events?event_type', 'GET', f'{self.main_url}/api/events', user_id,
+                      params={'event_type': rng.choice(('session', 'retreat'))})
+        elif roll < 0.7:
+            start = datetime.utcnow() + timedelta(days=rng.randint(0, 60))
+            self.call('GET /api/events/search', 'GET', f'{self.main_url}/api/events/search', user_id,
+                      params={'start': start.isoformat(timespec='minutes'),
+                              'end': (start + timedelta(days=3)).isoformat(timespec='minutes'),
+                              'max_price': rng.choice((25, 50, 100)),
+                              'specialization': rng.choice(('yoga', 'meditation', 'coaching', 'breath'))})
+        else:
+            self.call('GET /api/events/<id>', 'GET', f'{self.main_url}/api/events/{rng.choice(self.events)}',
+                      user_id)
+
+    def book(self, rng, event_id=None, endpoint='POST /api/bookings'):
+        user_id = rng.choice(self.user_ids)
+        response = self.call(endpoint, 'POST', f'{self.main_url}/api/bookings', user_id,
+                             json={'event_id': event_id or rng.choice(self.events), 'notes': 'load test'})
+        if response is not None and response.status_code == 200:
+            booking_id = response.json().get('booking_id')
+            if booking_id:
+                with self._lock:
+                    self.bookings.append((user_id, booking_id))
+
+    def cancel(self, rng):
+        with self._lock:
+            if not self.bookings:
+                booking = None
+            else:
+                booking = self.bookings.pop(rng.randrange(len(self.bookings)))
+        if booking is None:
+            return self.book(rng)
+        user_id, booking_id = booking
+        self.call('DELETE /api/bookings/<id>', 'DELETE', f'{self.main_url}/api/bookings/{booking_id}', user_id)
+
+    def my_bookings(self, rng):
+        self.call('GET /api/my-bookings', 'GET', f'{self.main_url}/api/my-bookings', rng.choice(self.user_ids))
+
+    def facilitator(self, rng):
+        user_id = rng.choice(self.user_ids)
+        roll = rng.random()
+        if roll < 0.4:
+            self.call('GET /api/facilitator/events/<id>', 'GET',
+                      f'{self.main_url}/api/facilitator/events/{rng.randint(1, self.facilitators)}', user_id)
+        elif roll < 0.6:
+            self.call('GET /api/facilitator/<id>/analytics', 'GET',
+                      f'{self.main_url}/api/facilitator/{rng.randint(1, self.facilitators)}/analytics', user_id)
+        else:
+            self.call('GET /api/facilitator/events/<id>/bookings', 'GET',
+                      f'{self.main_url}/api/facilitator/events/{rng.choice(self.events)}/bookings', user_id)
+
+    def dashboard(self, rng):
+        # Each worker polls like one open dashboard: it sends back the ETag it last saw
+        headers = {'Authorization': f'Bearer {self.crm_token}'}
+        etag = getattr(self._local, 'etag', None)
+        if etag:
+            headers['If-None-Match'] = etag
+        response = self.call('GET crm /notifications', 'GET', f'{self.crm_url}/notifications', headers=headers,
+                             params={'limit': 50})
+        if response is not None and response.headers.get('ETag'):
+            self._local.etag = response.headers['ETag']
+
+
+def run(traffic, mix, duration, concurrency, hot_event, burst_size, burst_every, seed):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < deadline:
+            getattr(traffic, rng.choices(names, weights)[0])(rng)
+
+    def bursts():
+        rng = random.Random(seed)
+        while time.monotonic() + burst_every < deadline:
+            time.sleep(burst_every)
+            shots = [threading.Thread(target=traffic.book, args=(random.Random(rng.random()), hot_event,
+                                                                 'POST /api/bookings [hot]'))
+                     for _ in range(burst_size)]
+            for shot in shots:
+                shot.start()
+            for shot in shots:
+                shot.join()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    if hot_event and burst_size and burst_every:
+        threads.append(threading.Thread(target=bursts))
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - started
+
+
+def print_report(report, previous=None):
+    before = (previous or {}).get('endpoints', {})
+    print(f"{'endpoint':<44}{'reqs':>7}{'err':>5}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, stats in report['endpoints'].items():
+        line = (f"{endpoint:<44}{stats['requests']:>7}{stats['errors']:>5}{stats['rps']:>8.1f}"
+                f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+        old = before.get(endpoint)
+        if old:
+            line += '   vs previous: ' + ', '.join(
+                f"{key.replace('_ms', '')} {change(old[key], stats[key])}" for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'))
+        print(line)
+    totals = report['totals']
+    print(f"{'total':<44}{totals['requests']:>7}{totals['errors']:>5}{totals['rps']:>8.1f}")
+    if previous:
+        print(f"total rps vs previous: {change(previous['totals']['rps'], totals['rps'])}")
+
+
+def change(old, new):
+    if not old:
+        return 'n/a'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=30, help='seconds of traffic')
+    parser.add_argument('--concurrency', type=int, default=8, help='worker threads replaying the mix')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='operation=weight pairs')
+    parser.add_argument('--burst-size', type=int, default=25, help='concurrent bookings per hot-event burst; 0 disables')
+    parser.add_argument('--burst-every', type=float, default=5, help='seconds between bursts')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--bookings', type=int, default=20000)
+    parser.add_argument('--notifications', type=int, default=20000)
+    parser.add_argument('--token-users', type=int, default=500, help='distinct users sending traffic')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='empty main app database to seed (default: a temporary SQLite file)')
+    parser.add_argument('--crm-database-url', help='empty CRM database to seed (default: a temporary SQLite file)')
+    parser.add_argument('--main-url', help='running main app, already seeded; skips the in-process apps')
+    parser.add_argument('--crm-url', help='running CRM app, already seeded (with --main-url)')
+    parser.add_argument('--output', default='load_test.json', help='JSON report path')
+    parser.add_argument('--compare', help='earlier JSON report to compare against')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    if bool(args.main_url) != bool(args.crm_url):
+        parser.error('--main-url and --crm-url go together')
+
+    stub = None
+    if not args.main_url:
+        workdir = tempfile.mkdtemp(prefix='load_test_')
+        stub = StubCRM()
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{workdir}/main.db'
+        os.environ['CRM_DATABASE_URL'] = args.crm_database_url or f'sqlite:///{workdir}/crm.db'
+        os.environ['CRM_ENDPOINT'] = stub.url
+        # Measure the endpoints, not the limiter
+        for name in ('RATE_LIMIT_DEFAULT', 'CRM_RATE_LIMIT_DEFAULT'):
+            os.environ[name] = 'off'
+        for name in ('RATE_LIMITS', 'CRM_RATE_LIMITS'):
+            os.environ[name] = ''
+    # The apps log JSON to stdout too; keep the report readable unless LOG_LEVEL asks for more
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from flask_jwt_extended import create_access_token
+    import crm_app.crm_app as crm
+    import main_app.app as main
+    import seed
+
+    dataset = seed.Dataset(args.seed, args.users, args.events, args.bookings)
+    if args.main_url:
+        main_url, crm_url = args.main_url.rstrip('/'), args.crm_url.rstrip('/')
+    else:
+        seed.seed_main(main, dataset)
+        seed.seed_crm(crm, dataset, args.notifications)
+        _, main_url = serve(main.app)
+        _, crm_url = serve(crm.app)
+        main.crm_dispatcher.start()
+
+    upcoming = [event for event in dataset.events if event['is_active'] and event['date_time'] > dataset.now]
+    if not upcoming:
+        raise SystemExit('The dataset has no upcoming active events')
+    hot_event = max(upcoming, key=lambda event: event['max_participants'])['id']
+    rng = random.Random(args.seed)
+    user_ids = rng.sample(range(1, args.users + 1), min(args.token_users, args.users))
+    with main.app.app_context():
+        tokens = {user_id: create_access_token(identity=str(user_id)) for user_id in user_ids}
+    recorder = Recorder()
+    traffic = Traffic(main_url, crm_url, tokens, os.getenv('CRM_BEARER_TOKEN', 'secure-bearer-token-123'),
+                      [event['id'] for event in upcoming], dataset.facilitators, recorder)
+
+    print(f'replaying {args.mix} for {args.duration:g} s with {args.concurrency} workers against {main_url} '
+          f'and {crm_url}')
+    elapsed = run(traffic, mix, args.duration, args.concurrency, hot_event, args.burst_size, args.burst_every,
+                  args.seed)
+    totals, endpoints = recorder.report(elapsed)
+    report = {
+        'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'config': {
+            **{key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+            'mix': mix,
+            'hot_event': hot_event,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'duration_s': round(elapsed, 2),
+        'totals': totals,
+        'endpoints': endpoints,
+    }
+    if stub is not None:
+        report['stub_crm'] = dict(stub.received)
+    previous = None
+    if args.compare:
+        with open(args.compare) as handle:
+            previous = json.load(handle)
+    print_report(report, previous)
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(f'report written to {args.output}')
+    return 1 if totals['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
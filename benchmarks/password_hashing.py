@@ -0,0 +1,93 @@
+"""Login throughput (password verifications per second per core) for each hashing setting.
+
+Each setting is measured on one core on the calling thread, then through
+PasswordHasher's process pool with --processes workers, which shows how far
+throughput scales when logins are offloaded.
+
+Usage:
+    python benchmarks/password_hashing.py
+    python benchmarks/password_hashing.py --setting bcrypt:12 --setting scrypt:16384 --processes 4 --json out.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main_app.passwords import PasswordHasher, check_password, hash_password
+
+DEFAULT_SETTINGS = ['bcrypt:10', 'bcrypt:12', 'scrypt:16384', 'scrypt:32768', 'pbkdf2:260000', 'pbkdf2:600000']
+PASSWORD = 'correct horse battery staple'
+
+
+def single_core(password_hash, seconds):
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        check_password(PASSWORD, password_hash)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def pooled(scheme, cost, password_hash, processes, seconds):
+    hasher = PasswordHasher(scheme, cost=cost, processes=processes, max_concurrency=processes * 2,
+                            acquire_timeout=60)
+    hasher.verify(PASSWORD, password_hash)  # start the pool outside the timed window
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        count = 0
+        while time.perf_counter() < deadline:
+            hasher.verify(PASSWORD, password_hash)
+            count += 1
+        return count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=processes * 2) as clients:
+        total = sum(clients.map(lambda _: client(), range(processes * 2)))
+    elapsed = time.perf_counter() - started
+    hasher.close()
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--setting', action='append', help='scheme:cost, repeatable (default: a common set)')
+    parser.add_argument('--seconds', type=float, default=2.0, help='measurement time per setting')
+    parser.add_argument('--processes', type=int, default=min(os.cpu_count() or 1, 4),
+                        help='pool size for the offloaded measurement (0 to skip)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    pool_cores = min(args.processes, os.cpu_count() or 1)
+    results = []
+    print(f"{'setting':<16}{'ms/login':>10}{'logins/s/core':>16}{'pool logins/s':>16}{'pool /core':>12}")
+    for setting in args.setting or DEFAULT_SETTINGS:
+        scheme, cost = setting.split(':')
+        cost = int(cost)
+        password_hash = hash_password(PASSWORD, scheme, cost)
+        per_core = single_core(password_hash, args.seconds)
+        pool = pooled(scheme, cost, password_hash, args.processes, args.seconds) if args.processes else None
+        results.append({
+            'scheme': scheme,
+            'cost': cost,
+            'ms_per_login': round(1000 / per_core, 2),
+            'logins_per_second_per_core': round(per_core, 1),
+            'pool_processes': args.processes,
+            'pool_logins_per_second': round(pool, 1) if pool else None,
+            'pool_logins_per_second_per_core': round(pool / pool_cores, 1) if pool else None
+        })
+        row = results[-1]
+        print(f"{setting:<16}{row['ms_per_login']:>10}{row['logins_per_second_per_core']:>16}"
+              f"{row['pool_logins_per_second'] or '-':>16}{row['pool_logins_per_second_per_core'] or '-':>12}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'cpu_count': os.cpu_count(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
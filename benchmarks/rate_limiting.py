@@ -0,0 +1,107 @@
+"""Per-request cost of rate limiting for each bucket backend.
+
+Times the limiter's own before/after-request hooks directly (the number that
+matters, and stable on a busy machine), then a trivial public handler (keyed by client address) and a @jwt_required
+one (keyed by the verified identity) through the Flask test client with
+limiting off, then with memory:// buckets and with shared buckets on the
+LocalRedis stand-in (or a real store given with --shared-url). Limits are set
+high enough that no request is rejected. End-to-end timings through the test
+client are noisier than the hook timings. A final run checks that a small limit rejects
+with 429 and Retry-After.
+
+Usage:
+    python benchmarks/rate_limiting.py --requests 5000 [--shared-url redis://localhost:6379/15]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def time_requests(client, url, headers, requests):
+    client.get(url, headers=headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(url, headers=headers)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def time_hooks(app, limiter, url, headers, requests):
+    """Microseconds per limiter.check() + add_headers() inside one request context"""
+    with app.test_request_context(url, headers=headers):
+        response = app.response_class('')
+        started = time.perf_counter()
+        for _ in range(requests):
+            limiter.check()
+            limiter.add_headers(response)
+        return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--shared-url', default='local://', help='redis:// URL of a throwaway store, or local://')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp(prefix="ratelimit-")}/main.db'
+    from flask_jwt_extended import create_access_token, jwt_required
+    from common.ratelimit import parse_limit, rate_limit_backend
+    from main_app import app as main
+
+    @main.app.route('/_bench/public')
+    def bench_public():
+        return ''
+
+    @main.app.route('/_bench/protected')
+    @jwt_required()
+    def bench_protected():
+        return ''
+
+    with main.app.app_context():
+        token = create_access_token(identity='1')
+    auth = {'Authorization': f'Bearer {token}'}
+    client = main.app.test_client()
+    limiter = main.rate_limiter
+
+    backends = {
+        'off': None,
+        'memory': rate_limit_backend('memory://', prefix='bench:ratelimit:'),
+        'shared': rate_limit_backend(args.shared_url, prefix='bench:ratelimit:'),
+    }
+    # Warm up imports, the token cache and the interpreter before the timed runs
+    limiter.default = None
+    time_requests(client, '/_bench/public', {}, args.requests)
+    time_requests(client, '/_bench/protected', auth, args.requests)
+
+    results = {}
+    print(f"{'backend':<10}{'hook public us':>16}{'hook protected us':>19}{'public us':>12}{'protected us':>15}")
+    for name, backend in backends.items():
+        limiter.backend = backend or backends['memory']
+        limiter.default = parse_limit(f'{args.requests * 10}/second') if backend else None
+        result = results[name] = {
+            'hook_public_us': round(time_hooks(main.app, limiter, '/_bench/public', {}, args.requests), 2),
+            'hook_protected_us': round(time_hooks(main.app, limiter, '/_bench/protected', auth, args.requests), 2),
+            'public_us': round(time_requests(client, '/_bench/public', {}, args.requests), 1),
+            'protected_us': round(time_requests(client, '/_bench/protected', auth, args.requests), 1)
+        }
+        print(f"{name:<10}{result['hook_public_us']:>16}{result['hook_protected_us']:>19}"
+              f"{result['public_us']:>12}{result['protected_us']:>15}")
+
+    limiter.backend = backends['memory']
+    limiter.default = parse_limit('5/minute')
+    statuses = [client.get('/_bench/public', environ_base={'REMOTE_ADDR': '10.0.0.1'}) for _ in range(6)]
+    print('5/minute limit:', [response.status_code for response in statuses],
+          'Retry-After', statuses[-1].headers.get('Retry-After'))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'requests': args.requests, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Cost of facilitator schedule-conflict checks (main_app.schedule) against a naive scan.
+
+Builds one facilitator's calendar in memory (no database): sessions of 45
+minutes to two hours and some two-day retreats, laid out back to back with
+gaps between them. It then times three checks, once through the interval
+tree and once by scanning all the facilitator's events:
+- a single event update
+- a recurring series
+- a whole proposed schedule
+
+Before each tree check another event moves, which the tree picks up from the
+change feed. Separate rounds compare the tree's answers with the scan, and
+the script exits with status 1 on any mismatch.
+
+Usage:
+    python benchmarks/schedule_conflicts.py --events 50000 [--repeat 200] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main_app.schedule import ScheduleConflicts, event_interval
+
+Row = namedtuple('Row', ['id', 'facilitator_id', 'date_time', 'duration', 'is_active'])
+DURATIONS = (45, 60, 60, 90, 120, 2880)
+
+
+class Calendar:
+    """One facilitator's events, served to ScheduleConflicts like the database would"""
+
+    def __init__(self, events, seed):
+        self.rng = random.Random(seed)
+        self.events = {}
+        self.changes = []
+        clock = datetime(2025, 1, 1, 8)
+        for key in range(1, events + 1):
+            clock += timedelta(minutes=self.rng.choice((15, 30, 60, 240, 960)))
+            self.events[key] = event_interval(clock, self.rng.choice(DURATIONS))
+            clock = self.events[key][1]
+        self.first, self.last = datetime(2025, 1, 1, 8), clock
+
+    def load_events(self, facilitator_id):
+        return [Row(key, 1, start, int((end - start).total_seconds() // 60), True)
+                for key, (start, end) in self.events.items()]
+
+    def load_changes(self, changed_since):
+        rows, self.changes = self.changes, []
+        return rows
+
+    def proposal(self, key=None, duration=None):
+        start = self.first + timedelta(seconds=self.rng.random() * (self.last - self.first).total_seconds())
+        start, end = event_interval(start, duration or self.rng.choice(DURATIONS))
+        return {'id': key, 'facilitator_id': 1, 'start': start, 'end': end}
+
+    def move(self):
+        """Another worker moved an event: the next check picks it up from the change feed"""
+        key = self.rng.randrange(1, len(self.events) + 1)
+        moved = self.proposal(key)
+        self.events[key] = moved['start'], moved['end']
+        self.changes.append(Row(key, 1, moved['start'], int((moved['end'] - moved['start']).total_seconds() // 60), True))
+
+
+def naive(events, proposals):
+    """The same answer as ScheduleConflicts.check, scanning every event for every proposal"""
+    moved = {proposal['id'] for proposal in proposals} - {None}
+    results = []
+    for index, proposal in enumerate(proposals):
+        found = [('event', key) for key, (start, end) in events.items()
+                 if key not in moved and start < proposal['end'] and end > proposal['start']]
+        found += [('index', other) for other, rival in enumerate(proposals)
+                  if other != index and rival['start'] < proposal['end'] and rival['end'] > proposal['start']]
+        results.append(sorted(found))
+    return results
+
+
+def normalized(results):
+    return [sorted(('event', conflict['event_id']) if 'event_id' in conflict else ('index', conflict['index'])
+                   for conflict in conflicts) for conflicts in results]
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2], timings[max(int(len(timings) * 0.95) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=50000, help="events in the facilitator's calendar")
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    calendar = Calendar(args.events, args.seed)
+    conflicts = ScheduleConflicts(calendar.load_events, calendar.load_changes)
+    started = time.perf_counter()
+    conflicts.check([calendar.proposal()])
+    print(f'built the tree of {len(calendar.events)} events in {time.perf_counter() - started:.2f} s')
+
+    def series():
+        first = calendar.proposal(duration=60)
+        return [dict(first, start=first['start'] + timedelta(weeks=week), end=first['end'] + timedelta(weeks=week))
+                for week in range(12)]
+
+    scenarios = [
+        ('update one event', lambda: [calendar.proposal(calendar.rng.randrange(1, args.events + 1))]),
+        ('recurring series of 12 weekly sessions', series),
+        ('proposed schedule of 100 events',
+         lambda: [calendar.proposal(calendar.rng.randrange(1, args.events + 1) if calendar.rng.random() < 0.5 else None)
+                  for _ in range(100)]),
+    ]
+    failures = 0
+    results = {'events': len(calendar.events), 'scenarios': {}}
+    print(f"{'check':<42}{'tree p50 ms':>13}{'tree p95 ms':>13}{'scan p50 ms':>13}")
+    for label, make in scenarios:
+        tree, scan = [], []
+        for _ in range(args.repeat):
+            proposals = make()
+            calendar.move()
+            started = time.perf_counter()
+            conflicts.check(proposals)
+            tree.append((time.perf_counter() - started) * 1000)
+        mismatches = 0
+        for _ in range(max(args.repeat // 20, 3)):
+            proposals = make()
+            calendar.move()
+            answer = normalized(conflicts.check(proposals))
+            started = time.perf_counter()
+            mismatches += answer != naive(calendar.events, proposals)
+            scan.append((time.perf_counter() - started) * 1000)
+        failures += mismatches
+        tree_p50, tree_p95 = percentiles(tree)
+        scan_p50, _ = percentiles(scan)
+        print(f"{label:<42}{tree_p50:>13.3f}{tree_p95:>13.3f}{scan_p50:>13.3f}{'   MISMATCH' if mismatches else ''}")
+        results['scenarios'][label] = {'tree_p50_ms': round(tree_p50, 3), 'tree_p95_ms': round(tree_p95, 3),
+                                       'scan_p50_ms': round(scan_p50, 3), 'ok': not mismatches}
+
+    results['stats'] = conflicts.stats()
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=2)
+    if failures:
+        print(f'FAILED: {failures} checks disagree with a full scan')
+        return 1
+    print('OK: every check matches a full scan')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
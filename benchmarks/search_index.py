@@ -0,0 +1,134 @@
+"""Latency of the in-memory availability search (main_app.search) at catalogue scale.
+
+Builds the index from seed.py's synthetic events (no database) and times
+typical searches: weekend and month windows, several sorts and filters, and
+deep pages. It also times an incremental update, such as a booking changing
+one event's seats. Every search is checked against a brute-force scan of the
+same events, and the script exits with status 1 on any mismatch.
+
+Usage:
+    python benchmarks/search_index.py --upcoming 100000 [--repeat 50] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+Row = namedtuple('Row', [
+    'id', 'date_time', 'duration', 'price', 'event_type', 'title', 'max_participants', 'seats_taken',
+    'facilitator_id', 'is_active', 'facilitator_name', 'specialization'
+])
+
+
+def load_rows(upcoming, seed):
+    from seed import Dataset
+    # seed.py spreads events over 90 days back and 180 ahead: two thirds are upcoming
+    dataset = Dataset(seed, users=upcoming // 10, events=upcoming * 3 // 2, bookings=upcoming * 10)
+    facilitators = {row['id']: row for row in dataset.facilitator_rows()}
+    return [
+        Row(event['id'], event['date_time'], event['duration'], event['price'], event['event_type'], event['title'],
+            event['max_participants'], event['seats_taken'], event['facilitator_id'], event['is_active'],
+            facilitators[event['facilitator_id']]['name'], facilitators[event['facilitator_id']]['specialization'])
+        for event in dataset.events
+        if event['is_active'] and event['date_time'] > dataset.now
+    ]
+
+
+def brute_force(entries, start, end, price_ceiling, overlap=False, event_type=None, specialization=None,
+                max_price=None, min_spots=1, sort='rank', offset=0, limit=50):
+    from main_app.search import SORT_KEYS, relevance
+    now = datetime.utcnow()
+    found = [
+        entry for entry in entries
+        if entry.start > now and entry.start < end
+        and (entry.end > start if overlap else entry.start >= start and entry.end <= end)
+        and (event_type is None or entry.event_type == event_type)
+        and (max_price is None or entry.price <= max_price)
+        and entry.max_participants - entry.seats_taken >= min_spots
+        and (specialization is None or specialization in entry.specialization_key)
+    ]
+    span = (end - start).total_seconds()
+    key = SORT_KEYS.get(sort) or (lambda entry: (-relevance(entry, start, span, price_ceiling), entry.start, entry.id))
+    found.sort(key=key)
+    return [entry.id for entry in found[offset:offset + limit]], len(found) > offset + limit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--upcoming', type=int, default=100000, help='upcoming events in the index')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    from main_app.search import EventIndex, indexed_event
+
+    rows = load_rows(args.upcoming, args.seed)
+    index = EventIndex(lambda changed_since=None, ids=(): rows if changed_since is None else [],
+                       refresh_interval=3600)
+    started = time.perf_counter()
+    index.refresh()
+    print(f'built the index of {len(rows)} upcoming events in {time.perf_counter() - started:.2f} s')
+
+    now = datetime.utcnow()
+    weekend = (now + timedelta(days=14)).replace(hour=17, minute=0, second=0, microsecond=0)
+    searches = [
+        ('weekend, rank', dict(start=weekend, end=weekend + timedelta(days=2, hours=6))),
+        ('weekend, yoga sessions under $50', dict(start=weekend, end=weekend + timedelta(days=2, hours=6),
+                                                  event_type='session', specialization='yoga', max_price=50)),
+        ('weekend, overlapping, by price', dict(start=weekend, end=weekend + timedelta(days=2, hours=6),
+                                                overlap=True, sort='price')),
+        ('next 30 days, rank', dict(start=now, end=now + timedelta(days=30))),
+        ('next 30 days, by date', dict(start=now, end=now + timedelta(days=30), sort='date_time')),
+        ('next 30 days, most free seats', dict(start=now, end=now + timedelta(days=30), sort='available_spots')),
+        ('next 92 days, rank', dict(start=now, end=now + timedelta(days=92))),
+        ('next 92 days, retreats, page 5', dict(start=now, end=now + timedelta(days=92), event_type='retreat',
+                                                offset=200)),
+        ('next 92 days, breathwork by price', dict(start=now, end=now + timedelta(days=92),
+                                                   specialization='breath', sort='price')),
+    ]
+    entries = list(index._index._by_id.values())
+    failures = 0
+    results = {'upcoming_events': len(rows), 'searches': {}}
+    print(f"{'search':<40}{'p50 ms':>9}{'p95 ms':>9}{'results':>9}")
+    for label, params in searches:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            page, more = index.search(**params)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p50, p95 = timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1]
+        ceiling = params.get('max_price') or index._index.max_price
+        expected = brute_force(entries, price_ceiling=ceiling, **params)
+        ok = ([entry.id for entry in page], more) == expected
+        failures += not ok
+        print(f"{label:<40}{p50:>9.2f}{p95:>9.2f}{len(page):>9}{'' if ok else '   MISMATCH'}")
+        results['searches'][label] = {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'results': len(page), 'ok': ok}
+
+    # A booking elsewhere: one event reloaded with a seat fewer
+    row = rows[len(rows) // 2]
+    started = time.perf_counter()
+    for taken in range(args.repeat):
+        index._index.add(indexed_event(row._replace(seats_taken=taken % (row.max_participants + 1))))
+    update_us = (time.perf_counter() - started) / args.repeat * 1e6
+    print(f'incremental update of one event: {update_us:.1f} us')
+    results['update_us'] = round(update_us, 1)
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=2)
+    if failures:
+        print(f'FAILED: {failures} searches disagree with a full scan')
+        return 1
+    print('OK: every search matches a full scan')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
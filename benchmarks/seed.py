@@ -0,0 +1,282 @@
+"""Bulk-generate a large, realistic dataset for both databases from a fixed seed.
+
+Fills the main app database with facilitators, users, events and bookings,
+and the CRM database with the notifications those bookings would have sent.
+The same --seed and sizes always produce the same rows (timestamps are relative
+to the time of the run). The data looks like this:
+
+    facilitators  one per --users/100, with specializations
+    users         all sharing the password PASSWORD, for login tests
+    events        sessions and retreats from 90 days ago to 180 days ahead; ~3% inactive
+    bookings      spread over events with a skewed (log-normal) popularity; 5-25% per
+                  event are cancelled. Capacity covers the confirmed bookings (a fifth
+                  of the events are sold out) and Event.seats_taken matches them
+    notifications `created` for every booking plus `cancelled` for cancelled ones,
+                  up to --notifications; those older than a day are processed
+
+Rows are written with multi-row INSERTs in --batch-size chunks on one connection
+per database (on SQLite with synchronous=OFF), without the ORM, so millions of
+rows take minutes rather than hours. The target databases must be empty; tables
+are created with the apps' migrations.
+
+Usage:
+    python benchmarks/seed.py --database-url sqlite:////tmp/main.db --crm-database-url sqlite:////tmp/crm.db \\
+        --users 50000 --events 20000 --bookings 2000000 --notifications 2000000 --seed 42
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PASSWORD = 'loadtest-password'
+
+FIRST_NAMES = ('Aarav', 'Amara', 'Ben', 'Chen', 'Diego', 'Elena', 'Fatima', 'Grace', 'Hiro', 'Ines', 'Jonas',
+               'Kavya', 'Liam', 'Maya', 'Noah', 'Olga', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tariq', 'Uma',
+               'Victor', 'Wen', 'Yara', 'Zoe')
+LAST_NAMES = ('Adams', 'Bianchi', 'Cohen', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Hansen', 'Ito', 'Jensen',
+              'Kim', 'Lopez', 'Mehta', 'Nguyen', 'Okafor', 'Patel', 'Rossi', 'Silva', 'Tanaka', 'Weber')
+SPECIALIZATIONS = ('Mindfulness & Meditation', 'Yoga & Wellness', 'Life Coaching', 'Breathwork',
+                   'Sound Healing', 'Nutrition', 'Sleep & Recovery', 'Movement & Mobility')
+TOPICS = ('Morning Meditation', 'Vinyasa Flow', 'Breathwork Basics', 'Sound Bath', 'Goal Setting Workshop',
+          'Mindful Eating', 'Deep Rest', 'Forest Walk', 'Journaling Circle', 'Mobility Class')
+RETREAT_TOPICS = ('Weekend Retreat', 'Silent Retreat', 'Mountain Retreat', 'Wellness Getaway')
+DURATIONS = (30, 45, 60, 75, 90)
+CAPACITIES = (8, 10, 12, 15, 20, 25, 30, 40, 50, 100, 250)
+CAPACITY_WEIGHTS = (4, 8, 10, 14, 14, 10, 10, 8, 8, 3, 1)
+PRICES = (0.0, 10.0, 15.0, 20.0, 25.0, 35.0, 50.0)
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write(connection, table, rows, batch_size):
+    """Insert `rows` (an iterable of dicts) in batches; returns the number written"""
+    written = 0
+    for chunk in chunks(rows, batch_size):
+        with connection.begin():
+            connection.execute(table.insert(), chunk)
+        written += len(chunk)
+    return written
+
+
+def fast_connection(engine):
+    connection = engine.connect()
+    if engine.dialect.name == 'sqlite':
+        connection.exec_driver_sql('PRAGMA synchronous=OFF')
+        connection.exec_driver_sql('PRAGMA journal_mode=MEMORY')
+    # Drop the implicit transaction the PRAGMAs started; write() opens one per batch
+    connection.commit()
+    return connection
+
+
+def reset_sequences(connection, tables):
+    """Explicit ids bypass PostgreSQL sequences; move them past the seeded rows"""
+    if connection.dialect.name != 'postgresql':
+        return
+    with connection.begin():
+        for table in tables:
+            connection.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))")
+
+
+class Dataset:
+    """Everything generated from (seed, sizes): users, events and the per-event booking plan"""
+
+    def __init__(self, seed, users, events, bookings, now=None):
+        self.rng = random.Random(seed)
+        self.now = (now or datetime.utcnow()).replace(microsecond=0)
+        rng = self.rng
+        self.facilitators = max(1, users // 100)
+        self.user_names = [f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' for _ in range(users)]
+        self.events = []
+        for index in range(events):
+            retreat = rng.random() < 0.1
+            self.events.append({
+                'id': index + 1,
+                'title': f'{rng.choice(RETREAT_TOPICS if retreat else TOPICS)} #{index + 1}',
+                'description': 'Synthetic event generated for load testing',
+                'event_type': 'retreat' if retreat else 'session',
+                'date_time': self.now + timedelta(minutes=rng.randrange(-90 * 1440, 180 * 1440, 15)),
+                'duration': 2880 if retreat else rng.choice(DURATIONS),
+                'max_participants': rng.choices(CAPACITIES, CAPACITY_WEIGHTS)[0],
+                'price': rng.choice(PRICES) * (6 if retreat else 1),
+                # A few facilitators run many events
+                'facilitator_id': min(int(rng.paretovariate(1.0)), self.facilitators) if rng.random() < 0.3
+                else rng.randint(1, self.facilitators),
+                'is_active': rng.random() > 0.03,
+                'seats_taken': 0,
+            })
+        # Skewed popularity: bookings per event proportional to a log-normal weight
+        weights = [rng.lognormvariate(0, 1) for _ in range(events)]
+        total = sum(weights) or 1
+        self.plan = []  # (confirmed, cancelled) per event
+        # Row generators get seeds of their own, so bookings come out the same for both databases
+        self.facilitator_seed, self.booking_seed = rng.random(), rng.random()
+        for event, weight in zip(self.events, weights):
+            count = round(bookings * weight / total)
+            cancelled = round(count * rng.uniform(0.05, 0.25))
+            confirmed = min(count - cancelled, users)
+            # Capacity grows with demand; about a fifth of the events are sold out
+            if rng.random() < 0.2:
+                event['max_participants'] = max(confirmed, 1)
+            else:
+                event['max_participants'] = max(event['max_participants'], confirmed + rng.randint(1, 10))
+            event['seats_taken'] = confirmed
+            self.plan.append((confirmed, count - confirmed))
+
+    def facilitator_rows(self):
+        rng = random.Random(self.facilitator_seed)
+        for index in range(self.facilitators):
+            yield {
+                'id': index + 1,
+                'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                'email': f'facilitator{index + 1}@example.com',
+                'specialization': rng.choice(SPECIALIZATIONS),
+            }
+
+    def user_rows(self, password_hash):
+        for index, name in enumerate(self.user_names):
+            yield {
+                'id': index + 1,
+                'email': f'user{index + 1}@example.com',
+                'name': name,
+                'password_hash': password_hash,
+                'created_at': self.now - timedelta(days=365) + timedelta(seconds=index),
+            }
+
+    def booking_rows(self):
+        """Bookings in id order, following the per-event plan"""
+        rng = random.Random(self.booking_seed)
+        users = len(self.user_names)
+        booking_id = 0
+        for event, (confirmed, cancelled) in zip(self.events, self.plan):
+            latest = min(self.now, event['date_time'])
+            statuses = ['confirmed'] * confirmed + ['cancelled'] * cancelled
+            user_ids = rng.sample(range(1, users + 1), confirmed) + [rng.randint(1, users) for _ in range(cancelled)]
+            for status, user_id in zip(statuses, user_ids):
+                booking_id += 1
+                yield {
+                    'id': booking_id,
+                    'user_id': user_id,
+                    'event_id': event['id'],
+                    'booking_date': latest - timedelta(seconds=rng.randrange(3600, 60 * 86400)),
+                    'status': status,
+                    'notes': '',
+                }
+
+    def notification_rows(self, limit):
+        notification_id = 0
+        for booking in self.booking_rows():
+            event = self.events[booking['event_id'] - 1]
+            types = ('created', 'cancelled') if booking['status'] == 'cancelled' else ('created',)
+            for offset, notification_type in enumerate(types):
+                if notification_id >= limit:
+                    return
+                notification_id += 1
+                received_at = booking['booking_date'] + timedelta(seconds=2 + offset * 3600)
+                yield {
+                    'id': notification_id,
+                    'booking_id': booking['id'],
+                    'user_name': self.user_names[booking['user_id'] - 1],
+                    'user_email': f"user{booking['user_id']}@example.com",
+                    'event_title': event['title'],
+                    'event_date': event['date_time'],
+                    'facilitator_id': event['facilitator_id'],
+                    'received_at': received_at,
+                    'updated_at': received_at,
+                    'processed': received_at < self.now - timedelta(days=1),
+                    'notification_type': notification_type,
+                    'version': notification_id,
+                    'dedup_key': f"{booking['id']}:{notification_type}:{event['id']}",
+                }
+
+
+def seed_main(main, dataset, batch_size=10000, log=print):
+    from main_app.passwords import hash_password
+    password_hash = hash_password(PASSWORD, main.password_hasher.scheme, main.password_hasher.cost)
+    counts = {}
+    with main.app.app_context():
+        main.migrate()
+        if main.db.session.query(main.Event.id).first() is not None:
+            raise SystemExit('The main app database already has events; seed an empty database')
+        connection = fast_connection(main.db.engine)
+        try:
+            for name, table, rows in (
+                ('facilitators', main.Facilitator.__table__, dataset.facilitator_rows()),
+                ('users', main.User.__table__, dataset.user_rows(password_hash)),
+                ('events', main.Event.__table__, iter(dataset.events)),
+                ('bookings', main.Booking.__table__, dataset.booking_rows()),
+            ):
+                started = time.perf_counter()
+                counts[name] = write(connection, table, rows, batch_size)
+                log(f'{name:<14}{counts[name]:>10} rows in {time.perf_counter() - started:6.1f} s')
+            reset_sequences(connection, ('facilitator', 'user', 'event', 'booking'))
+        finally:
+            connection.close()
+        # Direct inserts bypass the rollup writers: roll the bookings up as a backfill would
+        started = time.perf_counter()
+        counts['analytics'] = main.rebuild_analytics(batch_size=100)
+        log(f"{'analytics':<14}{counts['analytics']:>10} facilitators in {time.perf_counter() - started:6.1f} s")
+    return counts
+
+
+def seed_crm(crm, dataset, notifications, batch_size=10000, log=print):
+    with crm.app.app_context():
+        crm.migrate()
+        if crm.db.session.query(crm.BookingNotification.id).first() is not None:
+            raise SystemExit('The CRM database already has notifications; seed an empty database')
+        connection = fast_connection(crm.db.engine)
+        try:
+            started = time.perf_counter()
+            count = write(connection, crm.BookingNotification.__table__, dataset.notification_rows(notifications),
+                          batch_size)
+            with connection.begin():
+                connection.execute(crm.NotificationState.__table__.insert(), [{'id': 1, 'version': count}])
+            reset_sequences(connection, ('booking_notification',))
+            log(f"{'notifications':<14}{count:>10} rows in {time.perf_counter() - started:6.1f} s")
+        finally:
+            connection.close()
+    return {'notifications': count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', required=True, help='empty main app database')
+    parser.add_argument('--crm-database-url', help='empty CRM database (skipped when omitted)')
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--bookings', type=int, default=2000000, help='approximate; rounding per event')
+    parser.add_argument('--notifications', type=int, default=2000000, help='at most this many')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ['CRM_DATABASE_URL'] = args.crm_database_url or 'sqlite://'
+    os.environ['CRM_ENDPOINT'] = ''
+    import crm_app.crm_app as crm
+    import main_app.app as main
+
+    started = time.perf_counter()
+    dataset = Dataset(args.seed, args.users, args.events, args.bookings)
+    print(f'planned in {time.perf_counter() - started:.1f} s (seed {args.seed})')
+    seed_main(main, dataset, args.batch_size)
+    if args.crm_database_url:
+        seed_crm(crm, dataset, args.notifications, args.batch_size)
+    print(f'done in {time.perf_counter() - started:.1f} s; users log in with password {PASSWORD!r}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""CPU time per large listing response: ORM objects + dict building vs compiled row serializers.
+
+Seeds a temporary database where one user and one event each hold --bookings
+bookings, then builds the body of a --limit row page of /api/my-bookings and
+/api/facilitator/events/<id>/bookings three ways:
+
+    orm+stdlib         ORM entities, hand-written dicts, json.dumps (the old path)
+    rows+stdlib        serializer.columns rows, compiled serializer, json.dumps
+    rows+orjson        serializer.columns rows, compiled serializer, orjson
+
+Query, serialization and encoding are timed separately with process CPU time.
+
+Usage:
+    python benchmarks/serialization.py --bookings 20000 --limit 200 --json out.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def seed(main, bookings):
+    """User 1 books events 2..N+1 and users 2..N+1 all book event 1"""
+    db, Booking, Event, Facilitator, User = main.db, main.Booking, main.Event, main.Facilitator, main.User
+    now = datetime.utcnow()
+    db.session.add(Facilitator(id=1, name='Bench Facilitator', email='bench@example.com', specialization='Bench'))
+    db.session.bulk_insert_mappings(User, [{
+        'id': i + 1, 'email': f'user{i}@example.com', 'name': f'User {i}', 'password_hash': 'x'
+    } for i in range(bookings + 1)])
+    db.session.bulk_insert_mappings(Event, [{
+        'id': i + 1, 'title': f'Event {i}', 'description': 'Benchmark event description', 'event_type': 'session',
+        'date_time': now + timedelta(hours=i), 'duration': 60, 'max_participants': bookings + 1, 'price': 10.0,
+        'facilitator_id': 1, 'is_active': True
+    } for i in range(bookings + 1)])
+    db.session.bulk_insert_mappings(Booking, [{
+        'user_id': 1, 'event_id': i + 2, 'status': 'confirmed', 'notes': 'note', 'booking_date': now - timedelta(seconds=i)
+    } for i in range(bookings)] + [{
+        'user_id': i + 2, 'event_id': 1, 'status': 'confirmed', 'notes': 'note', 'booking_date': now - timedelta(seconds=i)
+    } for i in range(bookings)])
+    db.session.commit()
+
+
+def legacy_user_bookings(main, limit):
+    now = datetime.utcnow()
+    rows = main.db.session.query(main.Booking, main.Event).join(main.Event, main.Booking.event_id == main.Event.id
+    ).filter(main.Booking.user_id == 1).order_by(main.Booking.booking_date.desc(), main.Booking.id.desc()
+    ).limit(limit).all()
+    return rows, lambda: [{
+        'id': booking.id,
+        'event': {
+            'id': event.id,
+            'title': event.title,
+            'date_time': event.date_time.isoformat(),
+            'event_type': event.event_type
+        },
+        'booking_date': booking.booking_date.isoformat(),
+        'status': booking.status,
+        'is_upcoming': event.date_time > now
+    } for booking, event in rows]
+
+
+def rows_user_bookings(main, limit):
+    serializer = main.serializers.get('Booking', 'list')
+    rows = main.db.session.query(*serializer.columns).join(main.Event, main.Booking.event_id == main.Event.id
+    ).filter(main.Booking.user_id == 1).params(now=datetime.utcnow()
+    ).order_by(main.Booking.booking_date.desc(), main.Booking.id.desc()).limit(limit).all()
+    return rows, lambda: serializer.many(rows)
+
+
+def legacy_event_bookings(main, limit):
+    rows = main.db.session.query(main.Booking, main.User.name, main.User.email).join(
+        main.User, main.Booking.user_id == main.User.id
+    ).filter(main.Booking.event_id == 1).order_by(main.Booking.booking_date.desc(), main.Booking.id.desc()
+    ).limit(limit).all()
+    return rows, lambda: [{
+        'id': booking.id,
+        'user': {'name': user_name, 'email': user_email},
+        'booking_date': booking.booking_date.isoformat(),
+        'status': booking.status,
+        'notes': booking.notes
+    } for booking, user_name, user_email in rows]
+
+
+def rows_event_bookings(main, limit):
+    serializer = main.serializers.get('Booking', 'facilitator')
+    rows = main.db.session.query(*serializer.columns).join(main.User, main.Booking.user_id == main.User.id
+    ).filter(main.Booking.event_id == 1).order_by(main.Booking.booking_date.desc(), main.Booking.id.desc()
+    ).limit(limit).all()
+    return rows, lambda: serializer.many(rows)
+
+
+def stdlib_dumps(items):
+    return json.dumps(items, sort_keys=True).encode()
+
+
+def orjson_dumps(items):
+    return orjson.dumps(items, option=orjson.OPT_SORT_KEYS)
+
+
+def measure(main, load, dumps, iterations):
+    totals = {'query': 0.0, 'serialize': 0.0, 'encode': 0.0}
+    size = 0
+    for _ in range(iterations):
+        main.db.session.expunge_all()
+        started = time.process_time()
+        rows, build = load(main)
+        loaded = time.process_time()
+        items = build()
+        built = time.process_time()
+        size = len(dumps(items))
+        encoded = time.process_time()
+        totals['query'] += loaded - started
+        totals['serialize'] += built - loaded
+        totals['encode'] += encoded - built
+    result = {phase: round(total / iterations * 1000, 3) for phase, total in totals.items()}
+    result['total'] = round(sum(totals.values()) / iterations * 1000, 3)
+    result['bytes'] = size
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=20000, help='bookings seeded for the benchmark user and event')
+    parser.add_argument('--limit', type=int, default=200, help='rows per response page')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp(prefix="serialization-")}/main.db'
+    from main_app import app as main
+
+    endpoints = {
+        '/api/my-bookings': (legacy_user_bookings, rows_user_bookings),
+        '/api/facilitator/events/<id>/bookings': (legacy_event_bookings, rows_event_bookings),
+    }
+    results = {}
+    with main.app.app_context():
+        main.migrate()
+        seed(main, args.bookings)
+        print(f"{'endpoint':<40}{'variant':<14}{'query ms':>10}{'build ms':>10}{'encode ms':>11}{'total ms':>10}")
+        for endpoint, (legacy, rows) in endpoints.items():
+            variants = {
+                'orm+stdlib': (legacy, stdlib_dumps),
+                'rows+stdlib': (rows, stdlib_dumps),
+            }
+            if orjson is not None:
+                variants['rows+orjson'] = (rows, orjson_dumps)
+            results[endpoint] = {}
+            for variant, (load, dumps) in variants.items():
+                timing = measure(main, lambda m: load(m, args.limit), dumps, args.iterations)
+                results[endpoint][variant] = timing
+                print(f"{endpoint:<40}{variant:<14}{timing['query']:>10}{timing['serialize']:>10}"
+                      f"{timing['encode']:>11}{timing['total']:>10}")
+            before = results[endpoint]['orm+stdlib']['total']
+            after = list(results[endpoint].values())[-1]['total']
+            print(f"{endpoint:<40}CPU per response {before} ms -> {after} ms ({(1 - after / before) * 100:.0f}% less)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'bookings': args.bookings, 'limit': args.limit, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
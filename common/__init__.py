@@ -0,0 +1 @@
+"""Infrastructure shared by main_app and crm_app."""
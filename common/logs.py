@@ -0,0 +1,293 @@
+"""Structured JSON logging shared by main_app and crm_app.
+
+configure_logging(app, name) routes every logger of the process through one
+pipeline:
+
+    logger.info(...)   request thread: tag with the request id, sample, and
+                       put on a bounded in-memory queue (never waits)
+    LogPipeline        listener thread: format as one JSON object per line
+                       and write to stdout
+
+Request threads never format output or touch the stream. When the queue is
+full a record is dropped and counted (`stats()`), rather than making the
+request wait for the writer.
+
+Every request gets an id: the caller's X-Request-ID header when it looks like
+one, else a new one. The id is echoed in the X-Request-ID response header and
+attached to every record logged while the request runs, including the
+`<name>.access` line written when it finishes. main_app copies the id of the
+request that made a booking into the booking's CRM notification, and the CRM
+logs the notification under that id. One id therefore finds a booking and its
+notification in the logs of both apps.
+
+Levels are set per logger, for example LOG_LEVELS='main_app.outbox:DEBUG,werkzeug:WARNING'.
+High-volume loggers can be sampled, for example LOG_SAMPLE='main_app.access:0.1'.
+Sampling keeps that share of their INFO and DEBUG records and always keeps
+warnings and errors. Records with a request id are sampled by a hash of the
+id, so each app keeps or drops every record of a request, and both apps make
+the same decision for a booking and its notification.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+from flask.logging import default_handler
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Ids accepted from callers; anything else is replaced so logs stay greppable and injection-free
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Attributes of every LogRecord; anything else was passed in `extra` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def current_request_id():
+    """Id of the request being handled on this thread, or None outside requests"""
+    return request_id_var.get()
+
+
+def parse_levels(text):
+    """{logger name: level} from 'name:LEVEL,name:LEVEL'"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, level = item.partition(':')
+        level = level.strip().upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f'Unknown log level for {name.strip()}: {level}')
+        levels[name.strip()] = level
+    return levels
+
+
+def parse_sample_rates(text):
+    """{logger name: share of INFO/DEBUG records kept} from 'name:0.1,name:0.5'"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, rate = item.partition(':')
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError(f'Sample rate for {name.strip()} must be between 0 and 1')
+        rates[name.strip()] = rate
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, message, request_id, the `extra` fields, exc_info"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class Sampler(logging.Filter):
+    """Keeps `rate` of the INFO and DEBUG records of each sampled logger (and its children)"""
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._resolved = {}  # logger name -> rate of its closest configured ancestor, or None
+
+    def rate(self, name):
+        if name not in self._resolved:
+            candidate, rate = name, None
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition('.')[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        if rate is None or rate >= 1:
+            return True
+        request_id = getattr(record, 'request_id', None) or request_id_var.get()
+        if request_id is None:
+            return random.random() < rate
+        return zlib.crc32(request_id.encode()) < rate * 2 ** 32
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full at shutdown; wait for room instead of losing the stop signal
+        self.queue.put(self._sentinel)
+
+
+class _Handler(QueueHandler):
+    """Runs on the logging thread: captures the request id and message, then enqueues without blocking"""
+
+    def __init__(self, pipeline):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        # Arguments and tracebacks are rendered here: they may change or go away before the writer runs
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.pipeline.dropped()
+
+
+class LogPipeline:
+    """A queue of log records written as JSON lines to `stream` by a listener thread"""
+
+    def __init__(self, stream=None, queue_size=10000):
+        self.stream = stream
+        self.queue_size = queue_size
+        self.queue = queue.Queue(queue_size)
+        self.sampler = Sampler()
+        self.handler = _Handler(self)
+        self.handler.addFilter(self.sampler)
+        self._output = logging.StreamHandler(stream or sys.stdout)
+        self._output.setFormatter(JsonFormatter())
+        self._listener = None
+        self._lock = threading.Lock()
+        self._dropped = 0
+        # Threads do not survive fork (e.g. Gunicorn preloading the app): the child starts its own writer
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def start(self):
+        if self._listener is None:
+            self._listener = _Listener(self.queue, self._output)
+            self._listener.start()
+
+    def stop(self):
+        """Write every queued record, then stop the listener thread"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+        self._output.flush()
+
+    def _after_fork(self):
+        running = self._listener is not None
+        self._listener = None
+        self._lock = threading.Lock()
+        # The parent's queue may have been locked mid-put when it forked
+        self.queue = self.handler.queue = queue.Queue(self.queue_size)
+        if running:
+            self.start()
+
+    def dropped(self):
+        with self._lock:
+            self._dropped += 1
+
+    def stats(self):
+        with self._lock:
+            return {'queued': self.queue.qsize(), 'dropped': self._dropped}
+
+
+_pipeline = None
+
+
+def install_logging(level='INFO', levels=None, sample=None, queue_size=10000, stream=None):
+    """Route the root logger through the process-wide LogPipeline, created on first call; returns it"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = LogPipeline(stream, queue_size)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_pipeline.handler)
+        _pipeline.start()
+        atexit.register(_pipeline.stop)
+    logging.getLogger().setLevel(level.upper())
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+    _pipeline.sampler.rates.update(sample or {})
+    _pipeline.sampler._resolved.clear()
+    return _pipeline
+
+
+class RequestLogging:
+    """Request ids and a `<name>.access` record per request for `app`.
+
+    Create it before other before_request hooks (e.g. the rate limiter) so the
+    requests they answer early get an id too.
+    """
+
+    def __init__(self, app, name):
+        self.access = logging.getLogger(f'{name}.access')
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+
+    def _start(self):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_log = (request_id_var.set(request_id), time.perf_counter())
+
+    def _finish(self, response):
+        state = g.get('request_log')
+        if state is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = request_id_var.get()
+        self.access.info('%s %s %s', request.method, request.path, response.status_code, extra={
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - state[1]) * 1000, 2),
+        })
+        return response
+
+    def _teardown(self, error=None):
+        state = g.pop('request_log', None)
+        if state is not None:
+            try:
+                request_id_var.reset(state[0])
+            except ValueError:
+                # Torn down in another context than the one that started the request
+                request_id_var.set(None)
+
+
+def configure_logging(app, name, level='INFO', levels='', sample='', queue_size=10000):
+    """JSON logging through the process pipeline plus request ids for `app`; returns the LogPipeline"""
+    pipeline = install_logging(level, parse_levels(levels), parse_sample_rates(sample), queue_size)
+    # Flask adds its own stderr handler to app.logger unless one is removed here
+    app.logger.removeHandler(default_handler)
+    app.extensions['log_pipeline'] = pipeline
+    RequestLogging(app, name)
+    return pipeline
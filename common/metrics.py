@@ -0,0 +1,223 @@
+"""Request, SQL and outbound-call metrics in the Prometheus text format, shared by both apps.
+
+Instrumentation(app, db, registry) times every request and counts the SQL
+statements it runs. It listens to SQLAlchemy cursor events on the app's
+engines and feeds per-endpoint histograms in a MetricsRegistry.
+metrics_response() renders the registry for a /metrics route in the
+Prometheus text exposition format 0.0.4, without needing the
+prometheus_client package. Latency is measured until the response object is
+ready, so streamed bodies (exports, event streams) count only their set-up.
+
+Values are kept per worker process and every series carries a `worker` label
+with the process id. With several workers, a scrape reaches whichever worker
+serves it; aggregate with `sum without (worker)`.
+
+With `slow_request_ms` set, requests slower than that are logged as a warning
+together with the SQL they ran (statement text and time, no parameters).
+"""
+import math
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; request latency, SQL time per request and outbound calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# SQL statements per request; anything past a handful on a list endpoint is an N+1
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def samples(self):
+        """(sample name, ((label, value), ...), value) tuples"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, tuple(zip(self.labelnames, labels)), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            pairs = tuple(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket', pairs + (('le', _format_value(float(bound))),), cumulative
+            yield f'{self.name}_sum', pairs, total
+            yield f'{self.name}_count', pairs, cumulative
+
+
+class Collected(Metric):
+    """Counter or gauge read at scrape time from `collect()` -> {label values tuple: value}"""
+
+    def __init__(self, name, help, type, collect, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in self.collect().items():
+            yield self.name, tuple(zip(self.labelnames, labels)), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collected(self, name, help, type, collect, labelnames=()):
+        return self.register(Collected(name, help, type, collect, labelnames))
+
+    def render(self):
+        worker = (('worker', str(os.getpid())),)
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                labels = ','.join(f'{label}="{_escape(value)}"' for label, value in labels + worker)
+                lines.append(f'{name}{{{labels}}} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def metrics_response(registry):
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+class Instrumentation:
+    """Per-request latency and SQL metrics for `app`, plus the optional slow-request log.
+
+    Create it before other before_request hooks (e.g. the rate limiter) so the
+    requests they answer early are timed too.
+    """
+
+    def __init__(self, app, db, registry, slow_request_ms=0, max_logged_statements=50):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self.max_logged_statements = max_logged_statements
+        self.latency = registry.histogram(
+            'http_request_duration_seconds', 'Request latency until the response is ready',
+            ('method', 'endpoint'))
+        self.responses = registry.counter(
+            'http_requests_total', 'Requests by endpoint and status', ('method', 'endpoint', 'status'))
+        self.query_count = registry.histogram(
+            'http_request_sql_queries', 'SQL statements run per request', ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.query_time = registry.histogram(
+            'http_request_sql_seconds', 'Time spent in SQL per request', ('endpoint',))
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _start(self):
+        # [started, statement count, SQL seconds, statements for the slow log]
+        g.request_metrics = [time.perf_counter(), 0, 0.0, [] if self.slow_request_ms else None]
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('query_started', None)
+        if started is None or not has_app_context():
+            return
+        state = g.get('request_metrics')
+        if state is None:
+            return
+        elapsed = time.perf_counter() - started
+        state[1] += 1
+        state[2] += elapsed
+        if state[3] is not None and len(state[3]) < self.max_logged_statements:
+            state[3].append((elapsed, statement))
+
+    def _finish(self, response):
+        state = g.pop('request_metrics', None)
+        if state is None:
+            return response
+        elapsed = time.perf_counter() - state[0]
+        endpoint = request.endpoint or 'unmatched'
+        self.latency.observe(elapsed, request.method, endpoint)
+        self.responses.inc(request.method, endpoint, str(response.status_code))
+        self.query_count.observe(state[1], endpoint)
+        self.query_time.observe(state[2], endpoint)
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            self._log_slow_request(response, elapsed, state)
+        return response
+
+    def _log_slow_request(self, response, elapsed, state):
+        _, count, sql_seconds, statements = state
+        lines = [f'Slow request: {request.method} {request.full_path.rstrip("?")} -> {response.status_code} '
+                 f'in {elapsed * 1000:.1f} ms, {count} SQL statements in {sql_seconds * 1000:.1f} ms']
+        for seconds, statement in statements:
+            lines.append(f'  {seconds * 1000:8.2f} ms  {_WHITESPACE.sub(" ", statement).strip()[:500]}')
+        if count > len(statements):
+            lines.append(f'  ... {count - len(statements)} more statements')
+        current_app.logger.warning('\n'.join(lines))
@@ -0,0 +1,71 @@
+"""Minimal versioned schema migrations shared by both apps.
+
+Each app lists its migrations as (version, name, upgrade) entries. Applied
+versions are recorded in a schema_migrations table, and pending ones run in
+order, each in its own transaction. The steps use checkfirst-style helpers, so
+a database first created with the old db.create_all() is upgraded in place.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, insert, select, text
+
+Migration = namedtuple('Migration', ['version', 'name', 'upgrade'])  # upgrade(connection, metadata)
+
+_history_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _history_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+
+def run_migrations(engine, metadata, migrations):
+    """Apply pending migrations in version order; returns the names of those applied"""
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+        applied = set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+    newly_applied = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version in applied:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection, metadata)
+            connection.execute(insert(schema_migrations).values(
+                version=migration.version,
+                name=migration.name,
+                applied_at=datetime.utcnow()
+            ))
+        newly_applied.append(migration.name)
+    return newly_applied
+
+
+def create_missing_tables(connection, metadata):
+    """Create every model table (with its indexes) that does not exist yet"""
+    metadata.create_all(connection, checkfirst=True)
+
+
+def add_column(connection, metadata, table_name, column_name):
+    """Add a model column to an existing table unless it is already there"""
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    if column_name in existing:
+        return False
+    column = metadata.tables[table_name].c[column_name]
+    preparer = connection.dialect.identifier_preparer
+    ddl = f'{preparer.quote(column.name)} {column.type.compile(dialect=connection.dialect)}'
+    if column.server_default is not None:
+        default = column.server_default.arg
+        ddl += f" DEFAULT '{default}'" if isinstance(default, str) else f' DEFAULT {default}'
+        if not column.nullable:
+            ddl += ' NOT NULL'
+    connection.execute(text(f'ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {ddl}'))
+    return True
+
+
+def create_indexes(connection, metadata, *index_names):
+    """Create the named model indexes unless they already exist"""
+    indexes = {index.name: index for table in metadata.tables.values() for index in table.indexes}
+    for name in index_names:
+        indexes[name].create(connection, checkfirst=True)
@@ -0,0 +1,208 @@
+"""Token-bucket rate limiting shared by both apps.
+
+A limit is written `<count>/<period>`, where the period is second, minute,
+hour, day or a number of seconds (`10/minute`, `5/30`). It is a bucket of
+`count` tokens refilled at count/period tokens per second: a client may burst
+`count` requests and then keeps the average rate. Routes named in the
+per-endpoint limits (by Flask endpoint name) get a bucket of their own per
+client. Every other route shares one default bucket per client. `off` disables
+a limit. Each app supplies the function identifying the client, such as the
+verified JWT identity, the bearer token or the remote address.
+
+Buckets live per process in MemoryBuckets (memory://). Alternatively, they
+live in a Redis-compatible store shared by every worker (redis://, or the
+local:// stand-in). There a Lua script reads, refills and takes a token in one
+round trip. A rejected request gets 429 with a Retry-After header.
+"""
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from flask import g, make_response, request
+
+from common.shared_store import connect, local_script
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class Limit:
+    """`count` requests per `period` seconds, bursting up to `count`"""
+
+    def __init__(self, count, period):
+        self.count = count
+        self.period = period
+        self.rate = count / period
+
+    def __repr__(self):
+        return f'Limit({self.count}/{self.period:g}s)'
+
+
+def parse_limit(text):
+    """Limit for '<count>/<period>', None for 'off' or ''; raises ValueError when malformed"""
+    text = text.strip().lower()
+    if text in ('', 'off'):
+        return None
+    count, _, period = text.partition('/')
+    period = PERIODS[period] if period in PERIODS else float(period)
+    if int(count) <= 0 or period <= 0:
+        raise ValueError(f'Rate limit must be positive: {text}')
+    return Limit(int(count), period)
+
+
+def parse_limits(text):
+    """{endpoint: Limit or None} from 'endpoint:limit,endpoint:limit'"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        endpoint, _, limit = item.partition(':')
+        limits[endpoint.strip()] = parse_limit(limit)
+    return limits
+
+
+class MemoryBuckets:
+    """Per-process buckets; the least recently used are dropped past `max_keys` (they refill to full)"""
+
+    name = 'memory'
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, monotonic time of last update)
+
+    def take(self, key, limit, cost=1):
+        """(allowed, tokens left, seconds until `cost` tokens are available)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = limit.count
+            else:
+                tokens = min(limit.count, bucket[0] + (now - bucket[1]) * limit.rate)
+                self._buckets.move_to_end(key)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, tokens, 0 if allowed else (cost - tokens) / limit.rate
+
+
+# KEYS[1] = bucket; ARGV = capacity, refill rate per second, now (epoch seconds), cost.
+# The bucket is stored as "<tokens> <updated>" and expires once it would be full again.
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local tokens = capacity
+local state = redis.call('GET', KEYS[1])
+if state then
+    local space = string.find(state, ' ')
+    local updated = tonumber(string.sub(state, space + 1))
+    tokens = math.min(capacity, tonumber(string.sub(state, 1, space - 1)) + math.max(0, now - updated) * rate)
+end
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('SET', KEYS[1], tostring(tokens) .. ' ' .. tostring(now), 'EX', math.ceil((capacity - tokens) / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+@local_script(TOKEN_BUCKET)
+def _token_bucket(store, keys, args):
+    capacity, rate, now, cost = (float(arg) for arg in args)
+    tokens = capacity
+    state = store.get(keys[0])
+    if state is not None:
+        stored, updated = (float(value) for value in state.split())
+        tokens = min(capacity, stored + max(0.0, now - updated) * rate)
+    allowed = 0
+    if tokens >= cost:
+        tokens -= cost
+        allowed = 1
+    store.set(keys[0], f'{tokens!r} {now!r}', ex=math.ceil((capacity - tokens) / rate) + 1)
+    return [allowed, repr(tokens)]
+
+
+class SharedBuckets:
+    """Buckets in a Redis-compatible store, shared by every worker"""
+
+    name = 'shared'
+
+    def __init__(self, client, prefix='ratelimit:'):
+        self.prefix = prefix
+        self._take = client.register_script(TOKEN_BUCKET)
+
+    def take(self, key, limit, cost=1):
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[limit.count, limit.rate, time.time(), cost])
+        tokens = float(tokens)
+        return bool(allowed), tokens, 0 if allowed else (cost - tokens) / limit.rate
+
+
+def rate_limit_backend(url, prefix='ratelimit:', max_keys=100000):
+    """memory:// for per-process buckets, redis:// or local:// for shared ones"""
+    if url.startswith('memory://'):
+        return MemoryBuckets(max_keys)
+    return SharedBuckets(connect(url), prefix)
+
+
+class RateLimiter:
+    """Applies the default and per-endpoint limits to every request, keyed by `key()`.
+
+    `error()` builds the 429 response body; Retry-After is added to it.
+    Allowed responses carry X-RateLimit-Limit and X-RateLimit-Remaining.
+    """
+
+    def __init__(self, app, backend, key, error, default=None, limits=None, exempt=('static',)):
+        self.backend = backend
+        self.key = key
+        self.error = error
+        self.default = default
+        self.limits = limits or {}
+        self.exempt = set(exempt)
+        self._lock = threading.Lock()
+        self._limited = Counter()
+        if app is not None:
+            app.before_request(self.check)
+            app.after_request(self.add_headers)
+
+    def limit_for(self, endpoint):
+        """(bucket scope, Limit or None) for a Flask endpoint"""
+        if endpoint in self.limits:
+            return endpoint, self.limits[endpoint]
+        return 'default', self.default
+
+    def check(self):
+        endpoint = request.endpoint
+        if endpoint is None or endpoint in self.exempt or request.method == 'OPTIONS':
+            return None
+        scope, limit = self.limit_for(endpoint)
+        if limit is None:
+            return None
+        allowed, tokens, wait = self.backend.take(f'{scope}:{self.key()}', limit)
+        if allowed:
+            g.rate_limit = (limit, tokens)
+            return None
+        with self._lock:
+            self._limited[scope] += 1
+        response = make_response(self.error())
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+        return response
+
+    def add_headers(self, response):
+        state = g.pop('rate_limit', None)
+        if state is not None:
+            limit, tokens = state
+            response.headers['X-RateLimit-Limit'] = str(limit.count)
+            response.headers['X-RateLimit-Remaining'] = str(int(tokens))
+        return response
+
+    def stats(self):
+        with self._lock:
+            limited = dict(self._limited)
+        return {'backend': self.backend.name, 'limited': limited}
@@ -0,0 +1,176 @@
+"""Compiled row serializers and a pluggable JSON backend shared by both apps.
+
+A Serializer is declared once per model and view from the columns it needs.
+Queries select exactly `serializer.columns` and the serializer turns each
+result row tuple into a response dict with a function generated at
+declaration time, so listings never build ORM objects or walk attributes
+field by field:
+
+    registry.register('Event', 'list',
+        Field('id', Event.id),
+        Field('date_time', Event.date_time, isoformat),
+        Nested('facilitator', Field('name', Facilitator.name)))
+    serializer = registry.get('Event', 'list')
+    rows = db.session.query(*serializer.columns).join(...).all()
+    items = serializer.many(rows)
+
+install_json_backend() switches Flask's JSON provider to orjson when asked to
+(JSON_BACKEND=orjson); the standard library encoder is the default. Dates and
+datetimes go through Flask's default() like they do with the standard library
+(HTTP dates), so switching changes neither field formats nor key order.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+class Field:
+    """Output key `name` taken from `column`, optionally passed through `convert`"""
+
+    def __init__(self, name, column, convert=None):
+        self.name = name
+        self.column = column
+        self.convert = convert
+
+
+class Nested:
+    """Output key `name` holding a dict built from `fields`"""
+
+    def __init__(self, name, *fields):
+        self.name = name
+        self.fields = fields
+
+
+class Serializer:
+    """Row tuple -> dict function compiled from Field/Nested declarations"""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.columns = []
+        self._projections = {}
+        self._flat = None
+        self._serialize = self._compile(fields)
+
+    def position(self, column):
+        """Index of `column` in the selected row tuple"""
+        for index, selected in enumerate(self.columns):
+            if selected is column:
+                return index
+        self.columns.append(column)
+        return len(self.columns) - 1
+
+    def _compile(self, fields, flat=False):
+        namespace = {}
+        names = []
+
+        def value(field):
+            expression = f'row[{self.position(field.column)}]'
+            if field.convert is not None:
+                converter = f'_convert{len(namespace)}'
+                namespace[converter] = field.convert
+                expression = f'{converter}({expression})'
+            return expression
+
+        def build(fields):
+            parts = []
+            for field in fields:
+                parts.append(f'{field.name!r}: {build(field.fields) if isinstance(field, Nested) else value(field)}')
+            return '{' + ', '.join(parts) + '}'
+
+        def build_flat(fields, prefix=''):
+            parts = []
+            for field in fields:
+                if isinstance(field, Nested):
+                    parts += build_flat(field.fields, f'{prefix}{field.name}_')
+                else:
+                    names.append(prefix + field.name)
+                    parts.append(value(field))
+            return parts
+
+        body = f'({", ".join(build_flat(fields))},)' if flat else build(fields)
+        source = f'def serialize(row):\n    return {body}\n'
+        exec(compile(source, f'<serializer {self.name}>', 'exec'), namespace)
+        return (names, namespace['serialize']) if flat else namespace['serialize']
+
+    def __call__(self, row):
+        return self._serialize(row)
+
+    def many(self, rows):
+        return list(map(self._serialize, rows))
+
+    def flat(self):
+        """(names, row -> tuple function) with nested fields flattened to parent_child names, for CSV"""
+        if self._flat is None:
+            self._flat = self._compile(self.fields, flat=True)
+        return self._flat
+
+    def only(self, names):
+        """Serializer for a subset of the top-level fields, reading the same row layout"""
+        if names is None:
+            return self
+        key = frozenset(names)
+        if key not in self._projections:
+            projection = Serializer.__new__(Serializer)
+            projection.name = f'{self.name}[{",".join(sorted(key))}]'
+            projection.fields = [field for field in self.fields if field.name in key]
+            projection.columns = self.columns
+            projection._projections = {}
+            projection._flat = None
+            projection._serialize = projection._compile(projection.fields)
+            self._projections[key] = projection
+        return self._projections[key]
+
+
+class SerializerRegistry:
+    """One compiled serializer per (model, view)"""
+
+    def __init__(self):
+        self._serializers = {}
+
+    def register(self, model, view, *fields):
+        if (model, view) in self._serializers:
+            raise ValueError(f'Serializer for {model}/{view} is already registered')
+        serializer = Serializer(f'{model}.{view}', fields)
+        self._serializers[model, view] = serializer
+        return serializer
+
+    def get(self, model, view):
+        return self._serializers[model, view]
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; keys and dates are encoded like the default provider's"""
+
+    options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.options | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def install_json_backend(app, backend='stdlib'):
+    """Use orjson for app.json when `backend` is 'orjson'; returns the backend in use"""
+    if backend not in ('orjson', 'stdlib'):
+        raise ValueError(f'Unknown JSON backend: {backend}')
+    if backend == 'stdlib':
+        return 'stdlib'
+    if orjson is None:
+        raise RuntimeError('JSON_BACKEND=orjson requires the orjson package (pip install orjson)')
+    app.json_provider_class = OrjsonProvider
+    app.json = OrjsonProvider(app)
+    return 'orjson'
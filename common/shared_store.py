@@ -0,0 +1,127 @@
+"""Connections to the shared key-value store used by caches and limiters.
+
+`redis://` and `rediss://` URLs connect to Redis (the `redis` package is only
+needed when such a URL is configured). `local://` returns LocalRedis, an
+in-process stand-in implementing the small subset of the Redis client API
+this project uses, so the shared code paths run in development and
+benchmarks without a Redis server. It is not shared between processes.
+
+Lua scripts used through register_script() need a Python twin registered with
+@local_script(source) for LocalRedis to run them.
+"""
+import threading
+import time
+
+
+class LocalRedis:
+    """In-process stand-in for redis.Redis (get/mget/set/delete/incr/expire/pipeline/register_script)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = {}
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def mget(self, keys):
+        with self._lock:
+            return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._live(key):
+                return None
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._live(key) and self._data.pop(key))
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[0]) + amount if entry else amount
+            self._data[key] = (value, entry[1] if entry else None)
+            return value
+
+    def expire(self, key, seconds):
+        with self._lock:
+            entry = self._live(key)
+            if not entry:
+                return False
+            self._data[key] = (entry[0], time.monotonic() + seconds)
+            return True
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+    def register_script(self, script):
+        """Callable like redis-py's Script, running the Python twin of `script` atomically"""
+        try:
+            function = _local_scripts[script]
+        except KeyError:
+            raise NotImplementedError('LocalRedis has no Python twin for this script; see local_script()')
+
+        def run(keys=(), args=(), client=None):
+            with self._lock:
+                return function(self, list(keys), list(args))
+        return run
+
+
+_local_scripts = {}
+
+
+def local_script(source):
+    """Register the decorated function(store, keys, args) as LocalRedis's stand-in for Lua `source`"""
+    def register(function):
+        _local_scripts[source] = function
+        return function
+    return register
+
+
+class LocalPipeline:
+    """Queues commands and runs them under the store lock on execute()"""
+
+    def __init__(self, store):
+        self._store = store
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._store, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._store._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
+def connect(url):
+    """Client for a shared store URL (redis://, rediss:// or local://)"""
+    if url.startswith('local://'):
+        return LocalRedis()
+    if url.startswith(('redis://', 'rediss://')):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(f'{url.split(":")[0]}:// requires the redis package (pip install redis)')
+        return redis.Redis.from_url(url)
+    raise ValueError(f'Unsupported shared store URL: {url}')
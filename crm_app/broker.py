@@ -0,0 +1,153 @@
+"""In-process fan-out of notification changes to Server-Sent Event streams.
+
+A single watcher thread per process asks the database for changes only
+while at least one dashboard is subscribed, serializes each change once and
+hands the same payload to every subscriber queue. Open dashboards therefore
+cost one database read per change instead of one full listing per poll.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class VersionCache:
+    """Latest change version, re-read through `load()` at most every `ttl` seconds.
+
+    Local writes call advance() right after commit, so a poll that finds nothing
+    new is answered with an integer comparison instead of a query. Writes made by
+    other processes become visible within `ttl`.
+    """
+
+    def __init__(self, load, ttl=1.0):
+        self.load = load
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = 0
+        self._loaded_at = None
+
+    def get(self):
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at >= self.ttl:
+            loaded = self.load()
+            with self._lock:
+                self._value = max(self._value, loaded)
+                self._loaded_at = now
+        return self._value
+
+    def advance(self, version):
+        with self._lock:
+            self._value = max(self._value, version)
+
+
+class Subscription:
+    """One connected stream; the broker pushes (version, payload) tuples into its queue"""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def get(self, timeout):
+        """Next (version, payload) tuple, or None when nothing arrived within `timeout`"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class NotificationBroker:
+    """Fan-out broker fed by a watcher that polls `fetch_changes(since_version)`.
+
+    `fetch_changes(version)` returns `(current_version, items)` where `items`
+    are the serialized notifications whose version is greater than `version`.
+    `current_version()` returns the latest version cheaply. Both run on the
+    watcher thread, so they must set up their own application context.
+    `dumps` encodes each batch of items once for every subscriber.
+    """
+
+    def __init__(self, fetch_changes, current_version, poll_interval=1.0, queue_size=100, dumps=json.dumps):
+        self.fetch_changes = fetch_changes
+        self.current_version = current_version
+        self.dumps = dumps
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.version = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def subscribe(self):
+        """Register a stream; every change after the broker's current version is published to it"""
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            if self.version is None:
+                self.version = self.current_version()
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._watch, name='notification-broker', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def close(self):
+        """Disconnect every stream (e.g. on shutdown); clients reconnect with Last-Event-ID"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscription in subscribers:
+            subscription.closed = True
+            try:
+                subscription.queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def changed(self):
+        """Called after a local write so subscribers hear about it without waiting for the next poll"""
+        self._wakeup.set()
+
+    def _watch(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    self.version = None
+                    return
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Notification broker poll failed')
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def poll(self):
+        """Publish any changes since the last published version"""
+        if self.current_version() <= self.version:
+            return
+        version, items = self.fetch_changes(self.version)
+        if not items:
+            self.version = version
+            return
+        self.publish(version, self.dumps(items))
+
+    def publish(self, version, payload):
+        self.version = version
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait((version, payload))
+            except queue.Full:
+                # A stalled client is dropped; it reconnects with Last-Event-ID and catches up
+                self.unsubscribe(subscription)
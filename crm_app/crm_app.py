@@ -1,18 +1,69 @@
-from flask import Flask, request, jsonify, render_template, make_response
+from flask import Flask, request, jsonify, render_template, make_response, Response
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timezone
+import hashlib
+import logging
 import os
+import sys
 import json
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+# Allow `python crm_app/crm_app.py` as well as imports from the project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.export import EXPORT_FORMATS, export_response
+from common.logs import configure_logging, current_request_id
+from common.metrics import Instrumentation, MetricsRegistry, metrics_response
+from common.migrations import run_migrations
+from common.ratelimit import RateLimiter, parse_limit, parse_limits, rate_limit_backend
+from common.serialization import Field, SerializerRegistry, install_json_backend, isoformat
+from crm_app.broker import NotificationBroker, VersionCache
+from crm_app.migrations import MIGRATIONS
 
 load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'crm-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///crm_notifications.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('CRM_DATABASE_URL', 'sqlite:///crm_notifications.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['NOTIFY_BATCH_MAX'] = int(os.getenv('NOTIFY_BATCH_MAX', 500))
+app.config['STREAM_POLL_INTERVAL'] = float(os.getenv('STREAM_POLL_INTERVAL', 1))
+app.config['STREAM_HEARTBEAT'] = float(os.getenv('STREAM_HEARTBEAT', 15))
+app.config['NOTIFICATIONS_VERSION_TTL'] = float(os.getenv('NOTIFICATIONS_VERSION_TTL', 1))
+app.config['NOTIFICATIONS_MAX_LIMIT'] = int(os.getenv('NOTIFICATIONS_MAX_LIMIT', 1000))
+app.config['EXPORT_BATCH_SIZE'] = int(os.getenv('EXPORT_BATCH_SIZE', 1000))  # rows fetched per export chunk
+app.config['JSON_BACKEND'] = os.getenv('JSON_BACKEND', 'stdlib')  # or orjson (optional package)
+# Token-bucket rate limits per client: memory:// per process, redis://host or local:// shared
+app.config['RATE_LIMIT_URL'] = os.getenv('RATE_LIMIT_URL', 'memory://')
+app.config['RATE_LIMIT_DEFAULT'] = os.getenv('CRM_RATE_LIMIT_DEFAULT', '600/minute')  # off disables
+app.config['RATE_LIMITS'] = os.getenv('CRM_RATE_LIMITS', 'receive_booking_notification:1200/minute,'
+                                                         'receive_booking_notification_batch:300/minute')
+# Reverse proxies in front of the app that append X-Forwarded-For/-Proto/-Host; 0 trusts none of them
+app.config['TRUSTED_PROXIES'] = int(os.getenv('TRUSTED_PROXIES', 0))
+app.config['SLOW_REQUEST_MS'] = int(os.getenv('SLOW_REQUEST_MS', 0))  # log slower requests with their SQL; 0 disables
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # bearer token required by /metrics when set
+app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO')
+app.config['LOG_LEVELS'] = os.getenv('LOG_LEVELS', 'werkzeug:WARNING')  # per logger, e.g. crm_app.broker:DEBUG
+app.config['LOG_SAMPLE'] = os.getenv('LOG_SAMPLE', '')  # share of INFO records kept per logger, e.g. crm_app.access:0.1
+app.config['LOG_QUEUE_SIZE'] = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # records buffered for the log writer thread
 
+if app.config['TRUSTED_PROXIES']:
+    # Behind a proxy every request comes from the proxy's address: rate limits and logs need the client's
+    proxies = app.config['TRUSTED_PROXIES']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies)
+
+install_json_backend(app, app.config['JSON_BACKEND'])
 db = SQLAlchemy(app)
+# Registered first so requests answered by later before_request hooks (rate limits) are timed and logged too
+log_pipeline = configure_logging(app, 'crm_app', app.config['LOG_LEVEL'], app.config['LOG_LEVELS'],
+                                 app.config['LOG_SAMPLE'], app.config['LOG_QUEUE_SIZE'])
+logger = logging.getLogger('crm_app')
+notification_log = logging.getLogger('crm_app.notifications')
+metrics = MetricsRegistry()
+instrumentation = Instrumentation(app, db, metrics, slow_request_ms=app.config['SLOW_REQUEST_MS'])
 
 # CRM Models
 class BookingNotification(db.Model):
@@ -25,27 +76,280 @@ class BookingNotification(db.Model):
     facilitator_id = db.Column(db.Integer, nullable=False)
     received_at = db.Column(db.DateTime, default=datetime.utcnow)
     processed = db.Column(db.Boolean, default=False)
+    notification_type = db.Column(db.String(20), nullable=False, default='created', server_default='created')  # see NOTIFICATION_TYPES
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # see next_version()
+    dedup_key = db.Column(db.String(255))  # see notification_key(); null on rows stored before deduplication
+
+    __table_args__ = (
+        db.Index('ix_booking_notification_received_at', 'received_at', 'id'),
+        db.Index('ix_booking_notification_version', 'version'),
+        db.Index('ix_booking_notification_updated_at', 'updated_at'),
+        db.Index('ix_booking_notification_booking_id', 'booking_id'),
+        # A retried delivery of the same notification is recognised instead of stored twice
+        db.Index('uq_booking_notification_dedup_key', 'dedup_key', unique=True),
+        # Pending notifications only; processed ones are the bulk of the table
+        db.Index('ix_booking_notification_pending', 'received_at',
+                 sqlite_where=db.text('processed = 0'),
+                 postgresql_where=db.text('NOT processed')),
+    )
+
+# created: new booking; promoted: booking made from the waitlist; cancelled: booking cancelled
+# (e.g. with its event); moved: booking moved to another event
+NOTIFICATION_TYPES = ('created', 'promoted', 'cancelled', 'moved')
+
+class NotificationState(db.Model):
+    """Single-row change counter, bumped whenever notifications are inserted or processed"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def migrate():
+    """Bring the database schema up to date; returns the names of applied migrations"""
+    return run_migrations(db.engine, db.metadata, MIGRATIONS)
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations"""
+    applied = migrate()
+    print(f"Applied migrations: {', '.join(applied)}" if applied else "Database schema is up to date")
+
+def next_version():
+    """Bump the change counter in the current transaction and return the new value.
+    
+    The counter row stays locked until commit, so versions become visible in order
+    and `version > n` always finds every change made after version n.
+    """
+    result = db.session.execute(
+        update(NotificationState)
+        .where(NotificationState.id == 1)
+        .values(version=NotificationState.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.add(NotificationState(id=1, version=1))
+        db.session.flush()
+        return 1
+    return db.session.query(NotificationState.version).filter_by(id=1).scalar()
+
+def current_version():
+    return db.session.query(NotificationState.version).filter_by(id=1).scalar() or 0
+
+# Response serializers, built from row tuples selecting serializer.columns
+serializers = SerializerRegistry()
+serializers.register('BookingNotification', 'list',
+    Field('id', BookingNotification.id),
+    Field('booking_id', BookingNotification.booking_id),
+    Field('user_name', BookingNotification.user_name),
+    Field('user_email', BookingNotification.user_email),
+    Field('event_title', BookingNotification.event_title),
+    Field('event_date', BookingNotification.event_date, isoformat),
+    Field('facilitator_id', BookingNotification.facilitator_id),
+    Field('received_at', BookingNotification.received_at, isoformat),
+    Field('processed', BookingNotification.processed),
+    Field('type', BookingNotification.notification_type))
+
+def notification_rows():
+    """Query selecting the columns of the notification list serializer"""
+    return db.session.query(*serializers.get('BookingNotification', 'list').columns)
+
+def notification_changes(since_version):
+    """Current version and every notification changed after `since_version`"""
+    version = current_version()
+    rows = notification_rows().filter(
+        BookingNotification.version > since_version
+    ).order_by(BookingNotification.version, BookingNotification.id).all()
+    return version, serializers.get('BookingNotification', 'list').many(rows)
+
+def _broker_changes(since_version):
+    with app.app_context():
+        return notification_changes(since_version)
+
+def _load_version():
+    with app.app_context():
+        return current_version()
+
+notification_version = VersionCache(_load_version, ttl=app.config['NOTIFICATIONS_VERSION_TTL'])
+
+notification_broker = NotificationBroker(
+    _broker_changes, notification_version.get,
+    poll_interval=app.config['STREAM_POLL_INTERVAL'],
+    dumps=app.json.dumps
+)
+# Closed on worker shutdown by gunicorn.conf.py
+app.extensions['notification_broker'] = notification_broker
+metrics.collected('notification_stream_subscribers', 'Open /notifications/stream connections', 'gauge',
+                  lambda: {(): notification_broker.subscriber_count()})
+
+def notifications_changed(version):
+    """Publish a committed change to pollers (ETag) and open streams"""
+    notification_version.advance(version)
+    notification_broker.changed()
+
+def bad_request(message):
+    return jsonify({
+        'error': 'Bad Request',
+        'message': message
+    }), 400
+
+def filter_notifications(query):
+    """Apply the since_id, since_version, updated_since and processed filters; returns (query, error)"""
+    try:
+        if request.args.get('since_id'):
+            query = query.filter(BookingNotification.id > int(request.args['since_id']))
+        if request.args.get('since_version'):
+            query = query.filter(BookingNotification.version > int(request.args['since_version']))
+    except ValueError:
+        return None, 'since_id, since_version and limit must be integers'
+    if request.args.get('updated_since'):
+        try:
+            updated_since = datetime.fromisoformat(request.args['updated_since'].replace('Z', '+00:00'))
+        except ValueError:
+            return None, 'Invalid updated_since format'
+        if updated_since.tzinfo is not None:
+            updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+        query = query.filter(BookingNotification.updated_at > updated_since)
+    if request.args.get('processed') in ('true', 'false'):
+        query = query.filter(BookingNotification.processed == (request.args['processed'] == 'true'))
+    return query, None
+
+def list_notifications():
+    """Notification listing shared by /notifications and /api/notifications.
+    
+    Supports since_id, since_version, updated_since, processed and limit filters,
+    and answers If-None-Match with 304 when nothing changed since the client's ETag.
+    """
+    version = notification_version.get()
+    if request.if_none_match.contains(str(version)):
+        response = make_response('', 304)
+        response.set_etag(str(version))
+        return response
+    
+    query, error = filter_notifications(notification_rows())
+    if error:
+        return bad_request(error)
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return bad_request('since_id, since_version and limit must be integers')
+    
+    query = query.order_by(BookingNotification.received_at.desc(), BookingNotification.id.desc())
+    if limit is not None:
+        query = query.limit(max(1, min(limit, app.config['NOTIFICATIONS_MAX_LIMIT'])))
+    
+    response = app.json.response(serializers.get('BookingNotification', 'list').many(query.all()))
+    response.set_etag(str(version))
+    response.headers['X-Notifications-Version'] = str(version)
+    return response
 
 def validate_bearer_token(token):
     """Validate the Bearer token"""
     expected_token = os.getenv('CRM_BEARER_TOKEN', 'secure-bearer-token-123')
     return token == f'Bearer {expected_token}'
 
+def rate_limit_key():
+    """The bearer token (hashed) when it is valid, else the client address"""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and validate_bearer_token(auth_header):
+        return 'token:' + hashlib.sha256(auth_header.encode()).hexdigest()[:16]
+    return f'ip:{request.remote_addr}'
+
+rate_limiter = RateLimiter(
+    app,
+    rate_limit_backend(app.config['RATE_LIMIT_URL'], prefix='crm:ratelimit:'),
+    key=rate_limit_key,
+    error=lambda: jsonify({
+        'error': 'Too Many Requests',
+        'message': 'Rate limit exceeded, please retry later'
+    }),
+    default=parse_limit(app.config['RATE_LIMIT_DEFAULT']),
+    limits=parse_limits(app.config['RATE_LIMITS']),
+    exempt=('static', 'health_check', 'prometheus_metrics')
+)
+metrics.collected('rate_limited_requests_total', 'Requests rejected with 429 by bucket', 'counter',
+                  lambda: {(scope,): count for scope, count in rate_limiter.stats()['limited'].items()}, ('bucket',))
+metrics.collected('log_records_dropped_total', 'Log records dropped because the log queue was full', 'counter',
+                  lambda: {(): log_pipeline.stats()['dropped']})
+
+def validate_notification(data):
+    """Check a notification payload; returns (error message, parsed event date)"""
+    if not isinstance(data, dict):
+        return 'Notification must be a JSON object', None
+    
+    # Validate required fields
+    required_fields = ['booking_id', 'user', 'event', 'facilitator_id']
+    for field in required_fields:
+        if field not in data:
+            return f'Missing required field: {field}', None
+    
+    for field in ('user', 'event'):
+        if not isinstance(data[field], dict):
+            return f'Field {field} must be an object', None
+    
+    # Validate nested user fields
+    user_fields = ['id', 'name', 'email']
+    for field in user_fields:
+        if field not in data['user']:
+            return f'Missing required user field: {field}', None
+    
+    # Validate nested event fields
+    event_fields = ['id', 'title', 'date_time']
+    for field in event_fields:
+        if field not in data['event']:
+            return f'Missing required event field: {field}', None
+    
+    if data.get('type', 'created') not in NOTIFICATION_TYPES:
+        return f"Field type must be one of: {', '.join(NOTIFICATION_TYPES)}", None
+    
+    key = data.get('idempotency_key')
+    if key is not None and not (isinstance(key, str) and 0 < len(key) <= 255):
+        return 'Field idempotency_key must be a string of 1 to 255 characters', None
+    
+    # Parse event date
+    try:
+        event_date = datetime.fromisoformat(data['event']['date_time'].replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return 'Invalid date_time format', None
+    
+    return None, event_date
+
+def notification_key(data, key=None):
+    """Deduplication key of a validated notification.
+    
+    An explicit key (Idempotency-Key header or idempotency_key field) wins;
+    main_app sends one with every notification. Legacy senders without keys get a
+    derived key instead: at most one notification of each type per booking and
+    event, which drops a repeated change such as a move back to an earlier event.
+    """
+    key = key or data.get('idempotency_key')
+    if key:
+        return f'key:{key}'
+    return f"{data['booking_id']}:{data.get('type', 'created')}:{data['event']['id']}"
+
+def log_notification(notification, data):
+    """One record per stored notification, under the id of the main_app request that made the booking"""
+    request_id = data.get('request_id')
+    notification_log.info('Booking notification received', extra={
+        'request_id': request_id if isinstance(request_id, str) else current_request_id(),
+        'notification_id': notification.id,
+        'booking_id': data['booking_id'],
+        'event_id': data['event']['id'],
+        'user_id': data['user']['id'],
+        'facilitator_id': data['facilitator_id'],
+        'type': notification.notification_type
+    })
+
+def stored_notification_ids(keys):
+    """{dedup_key: notification id} for the keys already stored"""
+    if not keys:
+        return {}
+    return dict(db.session.query(BookingNotification.dedup_key, BookingNotification.id).filter(
+        BookingNotification.dedup_key.in_(keys)
+    ).all())
+
 @app.route('/api/notifications', methods=['GET'])
 def get_api_notifications():
     """Endpoint to get all notifications (API version)"""
-    notifications = BookingNotification.query.order_by(BookingNotification.received_at.desc()).all()
-    return jsonify([{
-        'id': n.id,
-        'booking_id': n.booking_id,
-        'user_name': n.user_name,
-        'user_email': n.user_email,
-        'event_title': n.event_title,
-        'event_date': n.event_date.isoformat(),
-        'facilitator_id': n.facilitator_id,
-        'received_at': n.received_at.isoformat(),
-        'processed': n.processed
-    } for n in notifications])
+    return list_notifications()
 
 @app.route('/notify', methods=['POST'])
 def receive_booking_notification():
@@ -88,42 +392,19 @@ def receive_booking_notification():
             else:
                 data = request.get_json()
         
-        # Validate required fields
-        required_fields = ['booking_id', 'user', 'event', 'facilitator_id']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'error': 'Bad Request',
-                    'message': f'Missing required field: {field}'
-                }), 400
-        
-        # Validate nested user fields
-        user_fields = ['id', 'name', 'email']
-        for field in user_fields:
-            if field not in data['user']:
-                return jsonify({
-                    'error': 'Bad Request',
-                    'message': f'Missing required user field: {field}'
-                }), 400
-        
-        # Validate nested event fields
-        event_fields = ['id', 'title', 'date_time']
-        for field in event_fields:
-            if field not in data['event']:
-                return jsonify({
-                    'error': 'Bad Request',
-                    'message': f'Missing required event field: {field}'
-                }), 400
-        
-        # Parse event date
-        try:
-            event_date = datetime.fromisoformat(data['event']['date_time'].replace('Z', '+00:00'))
-        except ValueError:
+        error, event_date = validate_notification(data)
+        if error:
             return jsonify({
                 'error': 'Bad Request',
-                'message': 'Invalid date_time format'
+                'message': error
             }), 400
         
+        # A retry of a delivery already stored gets the original notification back
+        dedup_key = notification_key(data, request.headers.get('Idempotency-Key'))
+        existing_id = stored_notification_ids([dedup_key]).get(dedup_key)
+        if existing_id is not None:
+            return duplicate_notification(existing_id)
+        
         # Store notification in database
         notification = BookingNotification(
             booking_id=data['booking_id'],
@@ -131,18 +412,23 @@ def receive_booking_notification():
             user_email=data['user']['email'],
             event_title=data['event']['title'],
             event_date=event_date,
-            facilitator_id=data['facilitator_id']
+            facilitator_id=data['facilitator_id'],
+            notification_type=data.get('type', 'created'),
+            dedup_key=dedup_key
         )
         
+        version = next_version()
+        notification.version = version
         db.session.add(notification)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The same notification arrived concurrently and was stored first
+            db.session.rollback()
+            return duplicate_notification(stored_notification_ids([dedup_key])[dedup_key])
+        notifications_changed(version)
         
-        # Log the notification
-        print(f"[{datetime.utcnow()}] New booking notification:")
-        print(f"  Booking ID: {data['booking_id']}")
-        print(f"  User: {data['user']['name']} ({data['user']['email']})")
-        print(f"  Event: {data['event']['title']}")
-        print(f"  Facilitator ID: {data['facilitator_id']}")
+        log_notification(notification, data)
         
         # Create notification object for the dashboard
         notification_data = {
@@ -154,7 +440,8 @@ def receive_booking_notification():
             'event_date': data['event']['date_time'],
             'facilitator_id': data['facilitator_id'],
             'received_at': datetime.utcnow().isoformat(),
-            'processed': False
+            'processed': False,
+            'type': notification.notification_type
         }
         
         # Return HTML with JavaScript to update the dashboard directly
@@ -194,13 +481,150 @@ def receive_booking_notification():
         response.headers['Content-Type'] = 'text/html'
         return response
         
-    except Exception as e:
-        print(f"Error processing notification: {str(e)}")
+    except Exception:
+        logger.exception('Failed to process booking notification')
         return jsonify({
             'error': 'Internal Server Error',
             'message': 'Failed to process booking notification'
         }), 500
 
+def duplicate_notification(notification_id):
+    if request.headers.get('Accept') == 'application/json':
+        return jsonify({
+            'status': 'duplicate',
+            'message': 'Booking notification already received',
+            'notification_id': notification_id
+        }), 200
+    response = make_response('<html><body><p>Notification already received</p></body></html>')
+    response.headers['Content-Type'] = 'text/html'
+    return response
+
+@app.route('/notify/batch', methods=['POST'])
+def receive_booking_notification_batch():
+    """Receive many booking notifications in one request and store them in one transaction.
+    
+    Accepts a JSON array (application/json) or one notification per line
+    (application/x-ndjson) and returns a result for every item, in order.
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not validate_bearer_token(auth_header):
+        return jsonify({
+            'error': 'Unauthorized',
+            'message': 'Invalid or missing Bearer token'
+        }), 401
+    
+    content_type = request.content_type or ''
+    try:
+        if content_type.startswith('application/x-ndjson'):
+            items = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        elif content_type.startswith('application/json'):
+            items = json.loads(request.get_data(as_text=True))
+        else:
+            return jsonify({
+                'error': 'Bad Request',
+                'message': 'Content-Type must be application/json or application/x-ndjson'
+            }), 400
+    except ValueError:
+        return jsonify({
+            'error': 'Bad Request',
+            'message': 'Malformed JSON body'
+        }), 400
+    
+    if not isinstance(items, list):
+        return jsonify({
+            'error': 'Bad Request',
+            'message': 'Body must be an array of notifications'
+        }), 400
+    if len(items) > app.config['NOTIFY_BATCH_MAX']:
+        return jsonify({
+            'error': 'Payload Too Large',
+            'message': f"At most {app.config['NOTIFY_BATCH_MAX']} notifications per batch"
+        }), 413
+    
+    # Validate everything first, then insert the valid items together
+    validated = []
+    for data in items:
+        error, event_date = validate_notification(data)
+        validated.append((data, error, event_date, None if error else notification_key(data)))
+    
+    # A retried batch overlaps one already stored: duplicates (also within the
+    # batch) get the stored notification's id instead of a new row. A second
+    # pass covers keys stored by a concurrent request between lookup and commit.
+    for attempt in range(2):
+        stored = stored_notification_ids({key for _, _, _, key in validated if key})
+        results = []
+        notifications = []
+        seen = {}
+        for index, (data, error, event_date, key) in enumerate(validated):
+            if error:
+                results.append({'index': index, 'status': 'error', 'message': error})
+            elif key in stored:
+                results.append({'index': index, 'status': 'duplicate', 'notification_id': stored[key]})
+            elif key in seen:
+                results.append({'index': index, 'status': 'duplicate', 'notification': seen[key]})
+            else:
+                notification = BookingNotification(
+                    booking_id=data['booking_id'],
+                    user_name=data['user']['name'],
+                    user_email=data['user']['email'],
+                    event_title=data['event']['title'],
+                    event_date=event_date,
+                    facilitator_id=data['facilitator_id'],
+                    notification_type=data.get('type', 'created'),
+                    dedup_key=key
+                )
+                seen[key] = notification
+                notifications.append(notification)
+                results.append({'index': index, 'status': 'created', 'notification': notification})
+        
+        version = 0
+        try:
+            if notifications:
+                version = next_version()
+                for notification in notifications:
+                    notification.version = version
+            db.session.add_all(notifications)
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == 0:
+                continue
+            return jsonify({
+                'error': 'Conflict',
+                'message': 'Notifications in this batch are being stored concurrently; retry'
+            }), 409
+        except Exception:
+            db.session.rollback()
+            logger.exception('Failed to store booking notification batch', extra={'items': len(items)})
+            return jsonify({
+                'error': 'Internal Server Error',
+                'message': 'Failed to process booking notifications'
+            }), 500
+    
+    notifications_changed(version)
+    for result in results:
+        if 'notification' in result:
+            notification = result.pop('notification')
+            result['notification_id'] = notification.id
+            if result['status'] == 'created':
+                log_notification(notification, items[result['index']])
+    duplicates = sum(1 for result in results if result['status'] == 'duplicate')
+    
+    logger.info('Stored booking notification batch', extra={
+        'items': len(items),
+        'stored': len(notifications),
+        'duplicates': duplicates
+    })
+    
+    return jsonify({
+        'status': 'success',
+        'accepted': len(notifications),
+        'duplicates': duplicates,
+        'rejected': len(items) - len(notifications) - duplicates,
+        'results': results
+    }), 200
+
 @app.route('/notifications', methods=['GET'])
 def get_notifications():
     """Get all booking notifications (for CRM dashboard)"""
@@ -213,19 +637,90 @@ def get_notifications():
             'message': 'Invalid or missing Bearer token'
         }), 401
     
-    notifications = BookingNotification.query.order_by(BookingNotification.received_at.desc()).all()
+    return list_notifications()
+
+@app.route('/notifications/export', methods=['GET'])
+def export_notifications():
+    """Stream every notification matching the list filters as CSV or NDJSON (`format`, default csv)"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not validate_bearer_token(auth_header):
+        return jsonify({
+            'error': 'Unauthorized',
+            'message': 'Invalid or missing Bearer token'
+        }), 401
     
-    return jsonify([{
-        'id': notification.id,
-        'booking_id': notification.booking_id,
-        'user_name': notification.user_name,
-        'user_email': notification.user_email,
-        'event_title': notification.event_title,
-        'event_date': notification.event_date.isoformat(),
-        'facilitator_id': notification.facilitator_id,
-        'received_at': notification.received_at.isoformat(),
-        'processed': notification.processed
-    } for notification in notifications])
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return bad_request(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    query, error = filter_notifications(notification_rows())
+    if error:
+        return bad_request(error)
+    query = query.order_by(BookingNotification.received_at, BookingNotification.id)
+    return export_response(query, serializers.get('BookingNotification', 'list'), export_format,
+                           'notifications', batch_size=app.config['EXPORT_BATCH_SIZE'], dumps=app.json.dumps)
+
+@app.route('/notifications/stream', methods=['GET'])
+def stream_notifications():
+    """Server-Sent Events stream of new and changed notifications (for CRM dashboard)
+    
+    EventSource cannot send headers, so the token may also be passed as ?access_token=.
+    Resume with ?since_version=<n> or the Last-Event-ID header sent on reconnect.
+    """
+    auth_header = request.headers.get('Authorization') or f"Bearer {request.args.get('access_token', '')}"
+    if not validate_bearer_token(auth_header):
+        return jsonify({
+            'error': 'Unauthorized',
+            'message': 'Invalid or missing Bearer token'
+        }), 401
+    
+    since = request.headers.get('Last-Event-ID') or request.args.get('since_version')
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        return jsonify({
+            'error': 'Bad Request',
+            'message': 'since_version must be an integer'
+        }), 400
+    
+    # Subscribe before reading the catch-up so no change falls between the two
+    subscription = notification_broker.subscribe()
+    catch_up = None
+    if since is None:
+        sent_version = current_version()
+    else:
+        sent_version, items = notification_changes(since)
+        if items:
+            catch_up = (sent_version, app.json.dumps(items))
+    heartbeat = app.config['STREAM_HEARTBEAT']
+    
+    def generate():
+        last_version = sent_version
+        try:
+            yield 'retry: 3000\n\n'
+            if catch_up:
+                yield format_sse(*catch_up)
+            while True:
+                message = subscription.get(timeout=heartbeat)
+                if message is None:
+                    if subscription.closed:
+                        break
+                    yield ': keep-alive\n\n'
+                    continue
+                version, payload = message
+                if version <= last_version:
+                    continue
+                last_version = version
+                yield format_sse(version, payload)
+        finally:
+            notification_broker.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def format_sse(version, payload):
+    return f'id: {version}\nevent: notifications\ndata: {payload}\n\n'
 
 @app.route('/notifications/<int:notification_id>/process', methods=['POST'])
 def mark_notification_processed(notification_id):
@@ -240,7 +735,10 @@ def mark_notification_processed(notification_id):
     
     notification = BookingNotification.query.get_or_404(notification_id)
     notification.processed = True
+    version = next_version()
+    notification.version = version
     db.session.commit()
+    notifications_changed(version)
     
     return jsonify({
         'status': 'success',
@@ -258,9 +756,21 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'CRM Notification Service',
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow().isoformat(),
+        'rate_limits': rate_limiter.stats(),
+        'logging': log_pipeline.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request and SQL metrics of this worker in the Prometheus text format"""
+    if app.config['METRICS_TOKEN'] and request.headers.get('Authorization') != f"Bearer {app.config['METRICS_TOKEN']}":
+        return jsonify({
+            'error': 'Unauthorized',
+            'message': 'Invalid or missing metrics token'
+        }), 401
+    return metrics_response(metrics)
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({
@@ -277,5 +787,5 @@ def method_not_allowed(error):
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        migrate()
     app.run(debug=True, port=5001)
\ No newline at end of file
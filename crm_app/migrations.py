@@ -0,0 +1,39 @@
+"""Schema migrations for the CRM notifications database (see common.migrations)."""
+from sqlalchemy import text
+
+from common.migrations import Migration, add_column, create_indexes, create_missing_tables
+
+
+def add_notification_versions(connection, metadata):
+    add_column(connection, metadata, 'booking_notification', 'version')
+    if add_column(connection, metadata, 'booking_notification', 'updated_at'):
+        connection.execute(text('UPDATE booking_notification SET updated_at = received_at'))
+
+
+def add_hot_path_indexes(connection, metadata):
+    create_indexes(
+        connection, metadata,
+        'ix_booking_notification_received_at',
+        'ix_booking_notification_version',
+        'ix_booking_notification_updated_at',
+        'ix_booking_notification_booking_id',
+        'ix_booking_notification_pending'
+    )
+
+
+def add_notification_type(connection, metadata):
+    add_column(connection, metadata, 'booking_notification', 'notification_type')
+
+
+def add_notification_dedup_key(connection, metadata):
+    add_column(connection, metadata, 'booking_notification', 'dedup_key')
+    create_indexes(connection, metadata, 'uq_booking_notification_dedup_key')
+
+
+MIGRATIONS = [
+    Migration(1, 'initial_schema', create_missing_tables),
+    Migration(2, 'notification_versions', add_notification_versions),
+    Migration(3, 'hot_path_indexes', add_hot_path_indexes),
+    Migration(4, 'notification_type', add_notification_type),
+    Migration(5, 'notification_dedup_key', add_notification_dedup_key),
+]
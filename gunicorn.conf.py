@@ -0,0 +1,67 @@
+"""Gunicorn settings shared by main_app and crm_app.
+
+run_apps.py starts one Gunicorn master per app with this file and passes the
+bind address and per-app worker/thread counts on the command line. It can also
+be used directly:
+
+    gunicorn -c gunicorn.conf.py main_app.app:app
+"""
+import multiprocessing
+import os
+import signal
+
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Import the app once in the master; workers are forked from it
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    app = server.app.wsgi()
+    # Connections opened by the master must not be shared with the forked workers
+    db = app.extensions.get('sqlalchemy')
+    if db is not None:
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+    # Threads do not survive fork, so background services start in each worker
+    dispatcher = app.extensions.get('outbox_dispatcher')
+    if dispatcher is not None:
+        dispatcher.start()
+
+
+def post_worker_init(worker):
+    broker = worker.app.wsgi().extensions.get('notification_broker')
+    if broker is None:
+        return
+    handle_exit = worker.handle_exit
+
+    def close_streams(sig, frame):
+        # Open event streams would otherwise hold the worker for the whole graceful timeout
+        handle_exit(sig, frame)
+        broker.close()
+
+    signal.signal(signal.SIGTERM, close_streams)
+
+
+def worker_exit(server, worker):
+    extensions = worker.app.wsgi().extensions
+    dispatcher = extensions.get('outbox_dispatcher')
+    if dispatcher is not None:
+        dispatcher.stop()
+    # Write out records still queued for the log writer thread (it restarts in each worker after fork)
+    log_pipeline = extensions.get('log_pipeline')
+    if log_pipeline is not None:
+        log_pipeline.stop()
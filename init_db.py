@@ -6,14 +6,19 @@ from datetime import datetime, timedelta
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 # Import the app and models from main_app
-from main_app.app import app, db, User, Facilitator, Event, Booking
+from main_app.app import app, db, User, Facilitator, Event, Booking, rebuild_analytics, recount_seats_taken, migrate
+from crm_app import crm_app
 from werkzeug.security import generate_password_hash
 
 def init_database():
     """Initialize the database with sample data"""
+    # Create or upgrade the CRM schema
+    with crm_app.app.app_context():
+        crm_app.migrate()
+    
     with app.app_context():
-        # Create tables
-        db.create_all()
+        # Create or upgrade tables
+        migrate()
         
         # Check if data already exists
         if Facilitator.query.first():
@@ -140,9 +145,13 @@ def init_database():
         for booking in bookings:
             db.session.add(booking)
         
+        recount_seats_taken()
         db.session.commit()
         print(f"Created {len(bookings)} bookings")
         
+        # The bookings above bypass the booking routes, which keep the analytics rollups current
+        print(f"Rebuilt analytics for {rebuild_analytics()} facilitators")
+        
         print("Database initialization complete!")
 
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+"""Facilitator analytics rollups.
+
+Three tables hold running counts, so dashboards never scan bookings:
+
+    facilitator_stats        per facilitator: active events and their capacity,
+                             bookings, cancellations, confirmed, revenue
+    event_stats              per event: bookings, cancellations, confirmed
+    facilitator_daily_stats  per facilitator and day a booking was made:
+                             bookings, cancellations, confirmed, revenue
+
+Every count equals an aggregate of the current booking rows, so rebuild()
+reproduces what the incremental updates maintain:
+- bookings counts booking rows
+- cancellations counts those cancelled
+- confirmed counts those still confirmed
+- revenue is the event's price times its confirmed bookings
+
+A booking stays on the day it was made. A later cancellation therefore
+moves that day's row, which makes daily rows cohorts: how many of a day's
+bookings were later cancelled. A move transfers the booking from one event
+(and facilitator) to the other.
+
+Writers call record() and the other methods in the same transaction as the
+change they describe, just before committing. Each call upserts one row per
+facilitator, event and day involved, in a fixed lock order (facilitator
+totals, then events, then days). rebuild() locks the facilitator totals
+first too, so a backfill running next to live traffic neither deadlocks
+with writers nor misses their changes.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+# (bookings, cancellations, confirmed) deltas of one booking
+BOOKED = (1, 0, 1)
+CANCELLED = (0, 1, -1)
+MOVED_OUT = (-1, 0, -1)
+
+COUNTERS = ('bookings', 'cancellations', 'confirmed')
+
+
+def as_date(value):
+    """A date from SQL date(): SQLite returns ISO strings"""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+class Rollups:
+    """Incremental updates and rebuilds of the rollup tables in `metadata`, through the caller's connection"""
+
+    def __init__(self, metadata):
+        tables = metadata.tables
+        self.event = tables['event']
+        self.booking = tables['booking']
+        self.facilitator_stats = tables['facilitator_stats']
+        self.event_stats = tables['event_stats']
+        self.daily_stats = tables['facilitator_daily_stats']
+
+    def record(self, connection, changes):
+        """Apply booking changes given as (event_id, booking_date, delta), delta being BOOKED, CANCELLED or MOVED_OUT"""
+        changes = list(changes)
+        if not changes:
+            return
+        events = {row.id: row for row in connection.execute(
+            select(self.event.c.id, self.event.c.facilitator_id, self.event.c.price)
+            .where(self.event.c.id.in_({event_id for event_id, _, _ in changes})))}
+        facilitators = defaultdict(lambda: [0, 0, 0, 0.0])
+        per_event = defaultdict(lambda: [0, 0, 0])
+        days = defaultdict(lambda: [0, 0, 0, 0.0])
+        for event_id, booked_at, delta in changes:
+            event = events[event_id]
+            revenue = delta[2] * (event.price or 0.0)
+            day = (booked_at or datetime.utcnow()).date()
+            for totals, key in ((facilitators, event.facilitator_id), (days, (event.facilitator_id, day))):
+                for position, value in enumerate((*delta, revenue)):
+                    totals[key][position] += value
+            for position, value in enumerate(delta):
+                per_event[event_id][position] += value
+        self._add(connection, self.facilitator_stats, ('facilitator_id',), COUNTERS + ('revenue',), [
+            dict(zip(COUNTERS + ('revenue',), values), facilitator_id=key) for key, values in sorted(facilitators.items())
+        ])
+        self._add(connection, self.event_stats, ('event_id',), COUNTERS, [
+            dict(zip(COUNTERS, values), event_id=key) for key, values in sorted(per_event.items())
+        ])
+        self._add(connection, self.daily_stats, ('facilitator_id', 'day'), COUNTERS + ('revenue',), [
+            dict(zip(COUNTERS + ('revenue',), values), facilitator_id=key[0], day=key[1])
+            for key, values in sorted(days.items())
+        ])
+
+    def adjust_events(self, connection, facilitator_id, events=0, capacity=0):
+        """Active events created, cancelled or resized: `capacity` is the change in their max_participants"""
+        self._add(connection, self.facilitator_stats, ('facilitator_id',), ('events', 'capacity'),
+                  [{'facilitator_id': facilitator_id, 'events': events, 'capacity': capacity}])
+
+    def reprice(self, connection, event_id, facilitator_id, old_price, new_price):
+        """An event's price changed: revalue its confirmed bookings on the days they were made"""
+        difference = (new_price or 0.0) - (old_price or 0.0)
+        if not difference:
+            return
+        booking = self.booking
+        day = func.date(booking.c.booking_date)
+        rows = connection.execute(
+            select(day, func.count()).where(booking.c.event_id == event_id, booking.c.status == 'confirmed')
+            .group_by(day)).all()
+        if not rows:
+            return
+        self._add(connection, self.facilitator_stats, ('facilitator_id',), ('revenue',), [
+            {'facilitator_id': facilitator_id, 'revenue': difference * sum(count for _, count in rows)}])
+        self._add(connection, self.daily_stats, ('facilitator_id', 'day'), ('revenue',), [
+            {'facilitator_id': facilitator_id, 'day': as_date(booked_on), 'revenue': difference * count}
+            for booked_on, count in sorted(rows, key=lambda row: as_date(row[0]))
+        ])
+
+    def rebuild(self, connection, facilitator_ids):
+        """Recompute the rollups of these facilitators from their events and bookings"""
+        facilitator_ids = sorted(facilitator_ids)
+        if not facilitator_ids:
+            return
+        event, booking, stats = self.event, self.booking, self.facilitator_stats
+        # Lock the totals first, like writers do: their changes wait until this rebuild commits
+        self._add(connection, stats, ('facilitator_id',), ('events',),
+                  [{'facilitator_id': facilitator_id, 'events': 0} for facilitator_id in facilitator_ids])
+        connection.execute(select(stats.c.facilitator_id).where(stats.c.facilitator_id.in_(facilitator_ids))
+                           .with_for_update())
+
+        totals = {facilitator_id: dict(events=0, capacity=0, bookings=0, cancellations=0, confirmed=0, revenue=0.0)
+                  for facilitator_id in facilitator_ids}
+        for facilitator_id, events, capacity in connection.execute(
+                select(event.c.facilitator_id, func.count(), func.coalesce(func.sum(event.c.max_participants), 0))
+                .where(event.c.facilitator_id.in_(facilitator_ids), event.c.is_active == True)
+                .group_by(event.c.facilitator_id)):
+            totals[facilitator_id].update(events=events, capacity=capacity)
+
+        day = func.date(booking.c.booking_date)
+        per_event = defaultdict(lambda: dict(bookings=0, cancellations=0, confirmed=0))
+        days = defaultdict(lambda: dict(bookings=0, cancellations=0, confirmed=0, revenue=0.0))
+        for event_id, facilitator_id, price, booked_on, status, count in connection.execute(
+                select(event.c.id, event.c.facilitator_id, event.c.price, day, booking.c.status, func.count())
+                .select_from(booking.join(event, booking.c.event_id == event.c.id))
+                .where(event.c.facilitator_id.in_(facilitator_ids))
+                .group_by(event.c.id, event.c.facilitator_id, event.c.price, day, booking.c.status)):
+            revenue = count * (price or 0.0) if status == 'confirmed' else 0.0
+            for row in (totals[facilitator_id], per_event[event_id], days[(facilitator_id, as_date(booked_on))]):
+                row['bookings'] += count
+                if status == 'cancelled':
+                    row['cancellations'] += count
+                elif status == 'confirmed':
+                    row['confirmed'] += count
+                if 'revenue' in row:
+                    row['revenue'] += revenue
+
+        connection.execute(self.event_stats.delete().where(self.event_stats.c.event_id.in_(
+            select(event.c.id).where(event.c.facilitator_id.in_(facilitator_ids)).scalar_subquery())))
+        connection.execute(self.daily_stats.delete().where(self.daily_stats.c.facilitator_id.in_(facilitator_ids)))
+        if per_event:
+            connection.execute(self.event_stats.insert(), [dict(values, event_id=key)
+                                                           for key, values in sorted(per_event.items())])
+        if days:
+            connection.execute(self.daily_stats.insert(), [dict(values, facilitator_id=key[0], day=key[1])
+                                                           for key, values in sorted(days.items())])
+        for facilitator_id, values in totals.items():
+            connection.execute(update(stats).where(stats.c.facilitator_id == facilitator_id).values(**values))
+
+    def _add(self, connection, table, keys, counters, rows):
+        """Add each row's `counters` to the row with the same `keys`, inserting it when missing"""
+        if not rows:
+            return
+        dialect = connection.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+            connection.execute(insert.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={counter: table.c[counter] + insert.excluded[counter] for counter in counters}
+            ), rows)
+            return
+        for row in rows:
+            matched = connection.execute(
+                update(table).where(and_(*[table.c[key] == row[key] for key in keys]))
+                .values({counter: table.c[counter] + row[counter] for counter in counters})).rowcount
+            if not matched:
+                connection.execute(table.insert(), [row])
@@ -1,13 +1,45 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session
+from flask import Flask, g, request, jsonify, render_template, redirect, url_for, session
 from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from flask_cors import CORS
 from authlib.integrations.flask_client import OAuth
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-import requests
+import click
+from sqlalchemy import func, and_, or_, update, bindparam, case, cast
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.orm import aliased
+from sqlalchemy.exc import IntegrityError
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from operator import itemgetter
+from urllib.parse import urlencode
+import base64
+import json
+import logging
 import os
+import sys
+import uuid
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+# Allow `python main_app/app.py` as well as imports from the project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.export import EXPORT_FORMATS, export_response
+from common.logs import configure_logging, current_request_id
+from common.metrics import Instrumentation, MetricsRegistry, metrics_response
+from common.migrations import run_migrations
+from common.ratelimit import RateLimiter, parse_limit, parse_limits, rate_limit_backend
+from common.serialization import Field, Nested, SerializerRegistry, install_json_backend, isoformat
+from main_app.analytics import BOOKED, CANCELLED, MOVED_OUT, Rollups
+from main_app.auth import CachingJWTManager, RequestIdentity
+from main_app.cache import Cache, cache_backend
+from main_app.crm_client import CRMClient
+from main_app.idempotency import IdempotencyStore
+from main_app.migrations import MIGRATIONS
+from main_app.outbox import OutboxDispatcher
+from main_app.passwords import PasswordHasher, PasswordHashingBusy
+from main_app.schedule import ScheduleConflicts, event_interval, overlap_groups
+from main_app.search import SORTS, EventIndex
 
 load_dotenv()
 
@@ -19,13 +51,77 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_TOKEN_LOCATION'] = ['headers']
 app.config['JWT_HEADER_NAME'] = 'Authorization'
 app.config['JWT_HEADER_TYPE'] = 'Bearer'
+app.config['JWT_CACHE_SIZE'] = int(os.getenv('JWT_CACHE_SIZE', 10000))  # verified tokens kept; 0 disables
+app.config['JWT_CACHE_MAX_TTL'] = int(os.getenv('JWT_CACHE_MAX_TTL', 300))
+app.config['PAGE_SIZE'] = int(os.getenv('PAGE_SIZE', 50))
+app.config['MAX_PAGE_SIZE'] = int(os.getenv('MAX_PAGE_SIZE', 200))
+app.config['JSON_BACKEND'] = os.getenv('JSON_BACKEND', 'stdlib')  # or orjson (optional package)
+app.config['EXPORT_BATCH_SIZE'] = int(os.getenv('EXPORT_BATCH_SIZE', 1000))  # rows fetched per export chunk
+app.config['BULK_MAX_IDS'] = int(os.getenv('BULK_MAX_IDS', 1000))  # ids per bulk booking request
+app.config['RECURRING_MAX_OCCURRENCES'] = int(os.getenv('RECURRING_MAX_OCCURRENCES', 200))
+app.config['SLOW_REQUEST_MS'] = int(os.getenv('SLOW_REQUEST_MS', 0))  # log slower requests with their SQL; 0 disables
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # bearer token required by /metrics when set
+app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO')
+app.config['LOG_LEVELS'] = os.getenv('LOG_LEVELS', 'werkzeug:WARNING')  # per logger, e.g. main_app.outbox:DEBUG
+app.config['LOG_SAMPLE'] = os.getenv('LOG_SAMPLE', '')  # share of INFO records kept per logger, e.g. main_app.access:0.1
+app.config['LOG_QUEUE_SIZE'] = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # records buffered for the log writer thread
+app.config['IDEMPOTENCY_TTL'] = int(os.getenv('IDEMPOTENCY_TTL', 86400))  # seconds a stored response is replayed
+app.config['IDEMPOTENCY_LOCK_TIMEOUT'] = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', 30))  # in-flight lease per key
+app.config['SEARCH_REFRESH_INTERVAL'] = float(os.getenv('SEARCH_REFRESH_INTERVAL', 2))  # seconds between change polls
+app.config['SEARCH_REBUILD_INTERVAL'] = float(os.getenv('SEARCH_REBUILD_INTERVAL', 3600))  # seconds between full rebuilds
+app.config['SEARCH_MAX_WINDOW_DAYS'] = int(os.getenv('SEARCH_MAX_WINDOW_DAYS', 92))
+app.config['ANALYTICS_MAX_DAYS'] = int(os.getenv('ANALYTICS_MAX_DAYS', 366))  # longest dashboard period
+
+# Event catalogue/detail cache: memory:// per process, redis://host or local:// shared
+app.config['CACHE_URL'] = os.getenv('CACHE_URL', 'memory://')
+app.config['CACHE_TTL'] = int(os.getenv('CACHE_TTL', 30))
+app.config['CACHE_MAX_ENTRIES'] = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+
+# Token-bucket rate limits per client: memory:// per process, redis://host or local:// shared
+app.config['RATE_LIMIT_URL'] = os.getenv('RATE_LIMIT_URL', 'memory://')
+app.config['RATE_LIMIT_DEFAULT'] = os.getenv('RATE_LIMIT_DEFAULT', '300/minute')  # off disables
+app.config['RATE_LIMITS'] = os.getenv('RATE_LIMITS', 'login:10/minute,register:10/minute,create_booking:30/minute')
+# Reverse proxies in front of the app that append X-Forwarded-For/-Proto/-Host; 0 trusts none of them
+app.config['TRUSTED_PROXIES'] = int(os.getenv('TRUSTED_PROXIES', 0))
+
+# CRM outbox delivery
+app.config['CRM_ENDPOINT'] = os.getenv('CRM_ENDPOINT')
+app.config['CRM_BEARER_TOKEN'] = os.getenv('CRM_BEARER_TOKEN')
+app.config['CRM_BATCH_ENDPOINT'] = os.getenv('CRM_BATCH_ENDPOINT') or (
+    app.config['CRM_ENDPOINT'].rstrip('/') + '/batch' if app.config['CRM_ENDPOINT'] else None)
+app.config['CRM_BATCH_SIZE'] = int(os.getenv('CRM_BATCH_SIZE', 100))  # 1 sends one request per notification
+app.config['CRM_POOL_SIZE'] = int(os.getenv('CRM_POOL_SIZE', 10))
+app.config['CRM_CONNECT_TIMEOUT'] = float(os.getenv('CRM_CONNECT_TIMEOUT', 2))
+app.config['CRM_READ_TIMEOUT'] = float(os.getenv('CRM_READ_TIMEOUT', 5))
+app.config['CRM_BREAKER_THRESHOLD'] = int(os.getenv('CRM_BREAKER_THRESHOLD', 5))
+app.config['CRM_BREAKER_RESET'] = float(os.getenv('CRM_BREAKER_RESET', 30))
+app.config['CRM_DISPATCH_WORKERS'] = int(os.getenv('CRM_DISPATCH_WORKERS', 4))
+app.config['CRM_DISPATCH_MAX_ATTEMPTS'] = int(os.getenv('CRM_DISPATCH_MAX_ATTEMPTS', 8))
+
+# Password hashing: bcrypt, scrypt or pbkdf2; cost defaults per scheme (see main_app/passwords.py)
+app.config['PASSWORD_HASH_SCHEME'] = os.getenv('PASSWORD_HASH_SCHEME', 'scrypt')
+app.config['PASSWORD_HASH_COST'] = int(os.getenv('PASSWORD_HASH_COST', 0)) or None
+app.config['PASSWORD_HASH_PROCESSES'] = int(os.getenv('PASSWORD_HASH_PROCESSES', 2))  # 0 hashes on the request thread
+app.config['PASSWORD_HASH_MAX_CONCURRENCY'] = int(os.getenv('PASSWORD_HASH_MAX_CONCURRENCY', 8))
 
 # Google OAuth Config
 app.config['GOOGLE_CLIENT_ID'] = os.getenv('GOOGLE_CLIENT_ID')
 app.config['GOOGLE_CLIENT_SECRET'] = os.getenv('GOOGLE_CLIENT_SECRET')
 
+if app.config['TRUSTED_PROXIES']:
+    # Behind a proxy every request comes from the proxy's address: rate limits and logs need the client's
+    proxies = app.config['TRUSTED_PROXIES']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies)
+
 db = SQLAlchemy(app)
-jwt = JWTManager(app)
+# Registered first so requests answered by later before_request hooks (rate limits) are timed and logged too
+log_pipeline = configure_logging(app, 'main_app', app.config['LOG_LEVEL'], app.config['LOG_LEVELS'],
+                                 app.config['LOG_SAMPLE'], app.config['LOG_QUEUE_SIZE'])
+logger = logging.getLogger('main_app')
+booking_log = logging.getLogger('main_app.bookings')
+metrics = MetricsRegistry()
+instrumentation = Instrumentation(app, db, metrics, slow_request_ms=app.config['SLOW_REQUEST_MS'])
+jwt = CachingJWTManager(app, cache_size=app.config['JWT_CACHE_SIZE'], max_ttl=app.config['JWT_CACHE_MAX_TTL'])
 
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
@@ -42,7 +138,9 @@ def invalid_token_callback(error):
         'sub_status': 43,
         'message': 'Invalid token: ' + str(error)
     }), 401
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'Link', 'Retry-After', 'X-RateLimit-Limit', 'X-RateLimit-Remaining',
+                         'Idempotent-Replayed', 'X-Request-ID'])
+install_json_backend(app, app.config['JSON_BACKEND'])
 oauth = OAuth(app)
 
 # Google OAuth setup
@@ -64,7 +162,7 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     name = db.Column(db.String(100), nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(255))
     google_id = db.Column(db.String(100), unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     bookings = db.relationship('Booking', backref='user', lazy=True)
@@ -87,8 +185,20 @@ class Event(db.Model):
     price = db.Column(db.Float, default=0.0)
     facilitator_id = db.Column(db.Integer, db.ForeignKey('facilitator.id'), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
+    seats_taken = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # confirmed bookings
+    # Moves on every change, seat counts included; the search index polls it (see main_app.search)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     bookings = db.relationship('Booking', backref='event', lazy=True)
 
+    __table_args__ = (
+        # Catalogue listing: active events in (date_time, id) order
+        db.Index('ix_event_active_date_time', 'date_time', 'id',
+                 sqlite_where=db.text('is_active = 1'),
+                 postgresql_where=db.text('is_active')),
+        db.Index('ix_event_facilitator_date_time', 'facilitator_id', 'date_time', 'id'),
+        db.Index('ix_event_updated_at', 'updated_at'),
+    )
+
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -97,6 +207,275 @@ class Booking(db.Model):
     status = db.Column(db.String(20), default='confirmed')  # confirmed, cancelled
     notes = db.Column(db.Text)
 
+    __table_args__ = (
+        # A user may hold at most one confirmed booking per event
+        db.Index('uq_booking_active_user_event', 'user_id', 'event_id', unique=True,
+                 sqlite_where=db.text("status = 'confirmed'"),
+                 postgresql_where=db.text("status = 'confirmed'")),
+        # Keyset pages of a user's and an event's bookings
+        db.Index('ix_booking_user_booking_date', 'user_id', 'booking_date', 'id'),
+        db.Index('ix_booking_event_booking_date', 'event_id', 'booking_date', 'id'),
+        db.Index('ix_booking_event_status', 'event_id', 'status'),
+    )
+
+class WaitlistEntry(db.Model):
+    """A user queued for a full event; promoted to a booking when a seat frees up, oldest first"""
+    id = db.Column(db.Integer, primary_key=True)  # FIFO order within an event
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='waiting')  # waiting, promoted, left, cancelled
+    notes = db.Column(db.Text)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'))  # set on promotion
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    promoted_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Head of an event's queue: the first waiting entry in id order
+        db.Index('ix_waitlist_event_waiting', 'event_id', 'id',
+                 sqlite_where=db.text("status = 'waiting'"),
+                 postgresql_where=db.text("status = 'waiting'")),
+        # A user waits at most once per event
+        db.Index('uq_waitlist_waiting_user_event', 'user_id', 'event_id', unique=True,
+                 sqlite_where=db.text("status = 'waiting'"),
+                 postgresql_where=db.text("status = 'waiting'")),
+    )
+
+class IdempotencyKey(db.Model):
+    """Response stored for a request sent with an Idempotency-Key header, replayed to its retries"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # SHA-256 of method, path and body
+    status_code = db.Column(db.Integer)  # null while the first request is in flight
+    response_body = db.Column(db.Text)
+    locked_until = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_idempotency_key_expires_at', 'expires_at'),
+    )
+
+class CrmOutbox(db.Model):
+    """CRM notifications written in the booking transaction and delivered by crm_dispatcher"""
+    id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON body for CRM /notify
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, delivered, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_crm_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+# Analytics rollups, kept by main_app.analytics in the transactions that change bookings and events
+class FacilitatorStats(db.Model):
+    facilitator_id = db.Column(db.Integer, db.ForeignKey('facilitator.id'), primary_key=True)
+    events = db.Column(db.Integer, nullable=False, default=0)  # active events
+    capacity = db.Column(db.Integer, nullable=False, default=0)  # max_participants of active events
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    confirmed = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)  # price x confirmed bookings
+
+class EventStats(db.Model):
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    confirmed = db.Column(db.Integer, nullable=False, default=0)
+
+class FacilitatorDailyStats(db.Model):
+    """Bookings by the day they were made; later cancellations and moves update that day"""
+    facilitator_id = db.Column(db.Integer, db.ForeignKey('facilitator.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    confirmed = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+analytics = Rollups(db.metadata)
+
+def record_booking_changes(*changes):
+    """Queue (event_id, booking_date, delta) rollup changes; they are written just before the commit"""
+    db.session.info.setdefault('analytics_changes', []).extend(changes)
+
+@sqlalchemy_event.listens_for(db.session, 'before_commit')
+def write_booking_changes(session):
+    # Last in the transaction, after every seat update, so the rollup rows are locked briefly
+    # and always after the event rows (see main_app.analytics)
+    changes = session.info.pop('analytics_changes', None)
+    if changes:
+        analytics.record(session.connection(), changes)
+
+@sqlalchemy_event.listens_for(db.session, 'after_rollback')
+def drop_booking_changes(session):
+    session.info.pop('analytics_changes', None)
+
+# Response serializers: one per model and view, built from row tuples that
+# select exactly serializer.columns (no ORM objects are loaded for listings)
+serializers = SerializerRegistry()
+
+def rounded(rate):
+    return round(rate, 4) if rate is not None else None
+
+serializers.register('Event', 'list',
+    Field('id', Event.id),
+    Field('title', Event.title),
+    Field('description', Event.description),
+    Field('event_type', Event.event_type),
+    Field('date_time', Event.date_time, isoformat),
+    Field('duration', Event.duration),
+    Field('max_participants', Event.max_participants),
+    Field('price', Event.price),
+    Field('facilitator', Facilitator.name))
+serializers.register('Event', 'detail',
+    Field('id', Event.id),
+    Field('title', Event.title),
+    Field('description', Event.description),
+    Field('event_type', Event.event_type),
+    Field('date_time', Event.date_time, isoformat),
+    Field('duration', Event.duration),
+    Field('max_participants', Event.max_participants),
+    Field('price', Event.price),
+    Nested('facilitator',
+        Field('id', Event.facilitator_id),
+        Field('name', Facilitator.name),
+        Field('specialization', Facilitator.specialization)))
+serializers.register('Event', 'facilitator',
+    Field('id', Event.id),
+    Field('title', Event.title),
+    Field('date_time', Event.date_time, isoformat),
+    Field('bookings_count', Event.seats_taken),
+    Field('max_participants', Event.max_participants),
+    Field('is_active', Event.is_active))
+# Select from Event outer-joined to EventStats
+serializers.register('Event', 'analytics',
+    Field('id', Event.id),
+    Field('title', Event.title),
+    Field('date_time', Event.date_time, isoformat),
+    Field('is_active', Event.is_active),
+    Field('max_participants', Event.max_participants),
+    Field('price', Event.price),
+    Field('bookings', func.coalesce(EventStats.bookings, 0).label('bookings')),
+    Field('cancellations', func.coalesce(EventStats.cancellations, 0).label('cancellations')),
+    Field('confirmed', func.coalesce(EventStats.confirmed, 0).label('confirmed')),
+    Field('revenue', (func.coalesce(Event.price, 0.0) * func.coalesce(EventStats.confirmed, 0)).label('revenue')),
+    Field('occupancy_rate', (cast(EventStats.confirmed, db.Float) / func.nullif(Event.max_participants, 0)
+                             ).label('occupancy_rate'), rounded),
+    Field('cancellation_rate', (cast(EventStats.cancellations, db.Float) / func.nullif(EventStats.bookings, 0)
+                                ).label('cancellation_rate'), rounded))
+serializers.register('Booking', 'list',
+    Field('id', Booking.id),
+    Nested('event',
+        Field('id', Event.id),
+        Field('title', Event.title),
+        Field('date_time', Event.date_time, isoformat),
+        Field('event_type', Event.event_type)),
+    Field('booking_date', Booking.booking_date, isoformat),
+    Field('status', Booking.status),
+    # Bound per request with query.params(now=...)
+    Field('is_upcoming', (Event.date_time > bindparam('now')).label('is_upcoming'), bool))
+serializers.register('Booking', 'facilitator',
+    Field('id', Booking.id),
+    Nested('user',
+        Field('name', User.name),
+        Field('email', User.email)),
+    Field('booking_date', Booking.booking_date, isoformat),
+    Field('status', Booking.status),
+    Field('notes', Booking.notes))
+# CRM /notify payload for bulk operations; select from Booking joined to User and Event
+serializers.register('Booking', 'notification',
+    Field('booking_id', Booking.id),
+    Nested('user',
+        Field('id', User.id),
+        Field('name', User.name),
+        Field('email', User.email)),
+    Nested('event',
+        Field('id', Event.id),
+        Field('title', Event.title),
+        Field('date_time', Event.date_time, isoformat)),
+    Field('facilitator_id', Event.facilitator_id))
+
+def row_key(serializer, *columns):
+    """Function picking `columns` out of rows selected for `serializer` (for keyset cursors)"""
+    return itemgetter(*[serializer.position(column) for column in columns])
+
+# Bulk operations record rollup changes by the day each booking was made: selected with every notification row
+notification_booking_date = row_key(serializers.get('Booking', 'notification'), Booking.booking_date)
+
+def migrate():
+    """Bring the database schema up to date; returns the names of applied migrations"""
+    return run_migrations(db.engine, db.metadata, MIGRATIONS)
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations"""
+    applied = migrate()
+    print(f"Applied migrations: {', '.join(applied)}" if applied else "Database schema is up to date")
+
+# Seat accounting
+def reserve_seat(event_id, count=1):
+    """Atomically claim `count` seats; False when the event lacks room or is inactive.
+
+    The conditional UPDATE acts as a compare-and-swap on Event.seats_taken, so
+    concurrent bookings can never push it past max_participants.
+    """
+    result = db.session.execute(
+        update(Event)
+        .where(Event.id == event_id,
+               Event.is_active == True,
+               Event.seats_taken + count <= Event.max_participants)
+        .values(seats_taken=Event.seats_taken + count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def release_seats(event_id, count=1):
+    db.session.execute(
+        update(Event)
+        .where(Event.id == event_id)
+        .values(seats_taken=Event.seats_taken - count)
+        .execution_options(synchronize_session=False)
+    )
+
+def release_seat_counts(counts):
+    """Give back `count` seats for every {event_id: count} with a single UPDATE"""
+    if counts:
+        db.session.execute(
+            update(Event)
+            .where(Event.id.in_(counts))
+            .values(seats_taken=Event.seats_taken - case(counts, value=Event.id))
+            .execution_options(synchronize_session=False)
+        )
+
+def hand_back_seats(event_ids):
+    """Seats freed in this transaction, one event id per seat: waiting users get them first, the rest are released"""
+    counts = Counter(event_ids)
+    if not counts:
+        return []
+    waiting = db.session.query(WaitlistEntry.event_id).filter(
+        WaitlistEntry.event_id.in_(counts),
+        WaitlistEntry.status == 'waiting'
+    ).distinct().all()
+    promoted = []
+    for event_id, in waiting:
+        promoted += promote_waitlist(event_id, counts.pop(event_id), held=True)
+    release_seat_counts(counts)
+    return promoted
+
+def recount_seats_taken():
+    """Rebuild every Event.seats_taken from confirmed bookings (backfills, direct inserts)"""
+    confirmed = db.session.query(func.count(Booking.id)).filter(
+        Booking.event_id == Event.id,
+        Booking.status == 'confirmed'
+    ).scalar_subquery()
+    db.session.execute(
+        update(Event)
+        .values(seats_taken=confirmed)
+        .execution_options(synchronize_session=False)
+    )
+
 # Routes
 @app.route('/')
 def index():
@@ -110,7 +489,45 @@ def login_page():
 def dashboard():
     return render_template('dashboard.html')
 
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint with CRM client and outbox delivery metrics"""
+    return jsonify({
+        'status': 'healthy',
+        'service': 'Booking System',
+        'timestamp': datetime.utcnow().isoformat(),
+        'crm_client': crm_client.metrics(),
+        'crm_outbox': crm_dispatcher.stats(),
+        'cache': event_cache.stats(),
+        'password_hashing': password_hasher.stats(),
+        'search_index': event_index.stats(),
+        'schedule_conflicts': schedule_conflicts.stats(),
+        'token_cache': jwt.cache_stats(),
+        'rate_limits': rate_limiter.stats(),
+        'logging': log_pipeline.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, SQL, CRM delivery and cache metrics of this worker in the Prometheus text format"""
+    if app.config['METRICS_TOKEN'] and request.headers.get('Authorization') != f"Bearer {app.config['METRICS_TOKEN']}":
+        return jsonify({'message': 'Invalid or missing metrics token'}), 401
+    return metrics_response(metrics)
+
 # Authentication Routes
+password_hasher = PasswordHasher(
+    app.config['PASSWORD_HASH_SCHEME'],
+    cost=app.config['PASSWORD_HASH_COST'],
+    processes=app.config['PASSWORD_HASH_PROCESSES'],
+    max_concurrency=app.config['PASSWORD_HASH_MAX_CONCURRENCY']
+)
+
+@app.errorhandler(PasswordHashingBusy)
+def password_hashing_busy(error):
+    response = jsonify({'message': 'Too many login attempts in progress, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @app.route('/api/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -121,7 +538,7 @@ def register():
     user = User(
         email=data['email'],
         name=data['name'],
-        password_hash=generate_password_hash(data['password'])
+        password_hash=password_hasher.hash(data['password'])
     )
     
     db.session.add(user)
@@ -135,7 +552,15 @@ def login():
     data = request.get_json()
     user = User.query.filter_by(email=data['email']).first()
     
-    if user and check_password_hash(user.password_hash, data['password']):
+    valid = False
+    if user and user.password_hash:
+        valid, new_hash = password_hasher.verify(data['password'], user.password_hash)
+        if new_hash:
+            # Stored with older hashing parameters; upgrade while the plaintext is at hand
+            user.password_hash = new_hash
+            db.session.commit()
+    
+    if valid:
         access_token = create_access_token(identity=str(user.id))
         return jsonify({'access_token': access_token, 'user': {'id': user.id, 'name': user.name, 'email': user.email}})
     
@@ -189,68 +614,411 @@ def google_callback():
         </html>
         '''
         return html
-    except Exception as e:
-        print(f"Google OAuth error: {str(e)}")
+    except Exception:
+        logger.exception('Google OAuth login failed')
         return redirect('/login?error=google_auth_failed')
 
+def current_identity():
+    """The caller of this @jwt_required request; `.user` is loaded at most once, on first use"""
+    if 'identity' not in g:
+        g.identity = RequestIdentity(int(get_jwt_identity()), lambda user_id: db.session.get(User, user_id))
+    return g.identity
+
+def rate_limit_key():
+    """The caller's identity when their token is already verified (token cache), else the client address.
+
+    Runs before @jwt_required, so it does not verify tokens itself: a token not
+    seen yet, including a forged one, counts against its sender's address.
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        identity = jwt.cached_identity(auth_header[7:])
+        if identity is not None:
+            return f'user:{identity}'
+    return f'ip:{request.remote_addr}'
+
+rate_limiter = RateLimiter(
+    app,
+    rate_limit_backend(app.config['RATE_LIMIT_URL'], prefix='booking:ratelimit:'),
+    key=rate_limit_key,
+    error=lambda: jsonify({'message': 'Too many requests, please retry later'}),
+    default=parse_limit(app.config['RATE_LIMIT_DEFAULT']),
+    limits=parse_limits(app.config['RATE_LIMITS']),
+    exempt=('static', 'health_check', 'prometheus_metrics')
+)
+
+idempotency = IdempotencyStore(
+    db, IdempotencyKey, lambda: current_identity().user_id,
+    ttl=app.config['IDEMPOTENCY_TTL'],
+    lock_timeout=app.config['IDEMPOTENCY_LOCK_TIMEOUT']
+)
+
+@app.cli.command('purge-idempotency-keys')
+def purge_idempotency_keys_command():
+    """Delete stored Idempotency-Key responses past IDEMPOTENCY_TTL"""
+    print(f"Purged {idempotency.purge_expired()} expired idempotency keys")
+
+# List query helpers
+class InvalidQueryParameter(ValueError):
+    """Raised when a list endpoint receives a malformed query parameter"""
+
+@app.errorhandler(InvalidQueryParameter)
+def invalid_query_parameter(error):
+    return jsonify({'message': str(error)}), 400
+
+def encode_cursor(sort_value, row_id):
+    """Opaque keyset cursor for the (sort_value, id) position of a row"""
+    raw = json.dumps([sort_value.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidQueryParameter('Invalid cursor')
+
+def datetime_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise InvalidQueryParameter(f'Invalid {name} format')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def bool_arg(name):
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+def number_arg(name, convert=float):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        raise InvalidQueryParameter(f'Invalid {name}')
+
+def limit_arg():
+    try:
+        limit = int(request.args.get('limit', app.config['PAGE_SIZE']))
+    except ValueError:
+        raise InvalidQueryParameter('Invalid limit')
+    if limit < 1:
+        raise InvalidQueryParameter('Invalid limit')
+    return min(limit, app.config['MAX_PAGE_SIZE'])
+
+def fields_arg(allowed):
+    """Requested top-level response fields, or None for all of them"""
+    value = request.args.get('fields')
+    if not value:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - set(allowed)
+    if unknown:
+        raise InvalidQueryParameter('Unknown fields: ' + ', '.join(sorted(unknown)))
+    return fields
+
+def apply_event_filters(query):
+    """Filter a query joined to Event by event_type, date range and upcoming_only"""
+    event_type = request.args.get('event_type')
+    if event_type:
+        query = query.filter(Event.event_type == event_type)
+    date_from = datetime_arg('date_from')
+    if date_from:
+        query = query.filter(Event.date_time >= date_from)
+    date_to = datetime_arg('date_to')
+    if date_to:
+        query = query.filter(Event.date_time < date_to)
+    if bool_arg('upcoming_only'):
+        query = query.filter(Event.date_time > datetime.utcnow())
+    return query
+
+def keyset_page(query, sort_column, id_column, cursor_key):
+    """Fetch one page ordered by (sort_column, id_column) after the request cursor.
+
+    Returns the page rows and the cursor for the next page (None on the last page).
+    """
+    limit = limit_arg()
+    cursor = request.args.get('cursor')
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            sort_column > sort_value,
+            and_(sort_column == sort_value, id_column > row_id)
+        ))
+    rows = query.order_by(sort_column, id_column).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*cursor_key(rows[-1]))
+
+def list_response(items, next_cursor, fields=None):
+    """JSON array response with optional field projection and next-page headers"""
+    if fields is not None:
+        items = [{key: value for key, value in item.items() if key in fields} for item in items]
+    response = app.json.response(items)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        next_url = url_for(request.endpoint, **request.view_args, **args)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+# Event listing queries
+def event_listing_query(serializer):
+    """Events joined to their facilitator, selecting the columns `serializer` needs"""
+    return db.session.query(*serializer.columns).join(Facilitator, Event.facilitator_id == Facilitator.id)
+
+# Event cache: catalogue pages and event details are cached without seat counts,
+# which are cached per event so a booking only invalidates its own event's entry.
+# A per-process cache (memory://, or local://) only holds catalogue pages: with several
+# workers, invalidations would miss the others, so seats and details are read live.
+# Seats and details are stored under per-key versions (Cache.read_through_many), so a
+# load that races with invalidate_event_cache() cannot leave a stale entry behind.
+event_cache = Cache(
+    cache_backend(app.config['CACHE_URL'], max_entries=app.config['CACHE_MAX_ENTRIES']),
+    ttl=app.config['CACHE_TTL']
+)
+
+def load_available_spots(event_ids):
+    rows = db.session.query(Event.id, Event.max_participants, Event.seats_taken
+    ).filter(Event.id.in_(event_ids)).all()
+    return {row.id: max(row.max_participants - row.seats_taken, 0) for row in rows}
+
+def available_spots(event_ids):
+    """Seats left per event id, read through the cache when every worker shares it"""
+    if not event_cache.shared:
+        return load_available_spots(event_ids)
+
+    def load(keys):
+        loaded = load_available_spots([int(key.split(':', 1)[1]) for key in keys])
+        return {f'seats:{event_id}': value for event_id, value in loaded.items()}
+
+    spots = event_cache.read_through_many([f'seats:{event_id}' for event_id in event_ids], load)
+    return {event_id: spots[f'seats:{event_id}'] for event_id in event_ids
+            if spots.get(f'seats:{event_id}') is not None}
+
+def load_search_rows(changed_since=None, ids=()):
+    """Search index rows: active upcoming events, or those changed since `changed_since` or listed in `ids`"""
+    query = db.session.query(
+        Event.id, Event.date_time, Event.duration, Event.price, Event.event_type, Event.title,
+        Event.max_participants, Event.seats_taken, Event.facilitator_id, Event.is_active,
+        Facilitator.name.label('facilitator_name'), Facilitator.specialization
+    ).join(Facilitator, Event.facilitator_id == Facilitator.id)
+    if changed_since is None:
+        return query.filter(Event.is_active == True, Event.date_time > datetime.utcnow()).all()
+    changed = Event.updated_at >= changed_since
+    return query.filter(or_(changed, Event.id.in_(ids)) if ids else changed).all()
+
+# Availability search index, per process; see main_app.search
+event_index = EventIndex(
+    load_search_rows,
+    refresh_interval=app.config['SEARCH_REFRESH_INTERVAL'],
+    rebuild_interval=app.config['SEARCH_REBUILD_INTERVAL']
+)
+
+def invalidate_event_cache(*event_ids, details_changed=False):
+    """Drop cached data for events after a committed change.
+
+    Seat changes only touch each event's seat entry; changes to the events
+    themselves also drop their details and start a new catalogue generation.
+    The search index reloads the events either way.
+    """
+    event_index.mark_changed(*event_ids)
+    keys = [f'seats:{event_id}' for event_id in event_ids]
+    if details_changed:
+        keys += [f'event:{event_id}' for event_id in event_ids]
+        event_cache.bump_generation('catalogue')
+    event_cache.invalidate(*keys)
+
+# Facilitator schedules: a facilitator runs at most one active event at a time; see main_app.schedule
+def load_schedule_rows(facilitator_id):
+    """(id, date_time, duration) of a facilitator's active events"""
+    return db.session.query(Event.id, Event.date_time, Event.duration
+    ).filter(Event.facilitator_id == facilitator_id, Event.is_active == True).all()
+
+def load_schedule_changes(changed_since):
+    return db.session.query(Event.id, Event.facilitator_id, Event.date_time, Event.duration, Event.is_active
+    ).filter(Event.updated_at >= changed_since).all()
+
+schedule_conflicts = ScheduleConflicts(load_schedule_rows, load_schedule_changes)
+
+def check_schedule(proposals, lock=False):
+    """ScheduleConflicts.check, first locking the facilitators' rows when the caller is about to write.
+
+    Call it before changing any event in the session: the change feed is read
+    through the same session and must not see uncommitted changes.
+    """
+    if lock:
+        facilitator_ids = sorted({proposal['facilitator_id'] for proposal in proposals})
+        db.session.query(Facilitator.id).filter(Facilitator.id.in_(facilitator_ids)).with_for_update().all()
+    return schedule_conflicts.check(proposals)
+
+def conflict_json(conflict):
+    """A conflict from check_schedule, with ISO timestamps"""
+    item = {'event_id': conflict['event_id']} if 'event_id' in conflict else {'index': conflict['index']}
+    item.update(date_time=conflict['start'].isoformat(), end_time=conflict['end'].isoformat())
+    return item
+
+def booking_overlaps(user_id):
+    """{booking id: ids of the user's other confirmed bookings at overlapping times}, for events not yet over"""
+    now = datetime.utcnow()
+    rows = db.session.query(Booking.id, Event.date_time, Event.duration
+    ).join(Event, Booking.event_id == Event.id
+    ).filter(Booking.user_id == user_id, Booking.status == 'confirmed', Event.is_active == True).all()
+    intervals = [(*event_interval(row.date_time, row.duration), row.id) for row in rows]
+    return overlap_groups([interval for interval in intervals if interval[1] > now])
+
 # Events Routes
+EVENT_LIST_FIELDS = (
+    'id', 'title', 'description', 'event_type', 'date_time', 'duration',
+    'max_participants', 'price', 'facilitator', 'available_spots'
+)
+
 @app.route('/api/events', methods=['GET'])
 @jwt_required()
 def get_events():
-    events = Event.query.filter_by(is_active=True).all()
-    return jsonify([{
-        'id': event.id,
-        'title': event.title,
-        'description': event.description,
-        'event_type': event.event_type,
-        'date_time': event.date_time.isoformat(),
-        'duration': event.duration,
-        'max_participants': event.max_participants,
-        'price': event.price,
-        'facilitator': event.facilitator.name,
-        'available_spots': event.max_participants - len(event.bookings)
-    } for event in events])
+    fields = fields_arg(EVENT_LIST_FIELDS)
+    args = sorted((key, value) for key, value in request.args.items(multi=True) if key != 'fields')
+    
+    def load_page():
+        serializer = serializers.get('Event', 'list')
+        query = apply_event_filters(event_listing_query(serializer).filter(Event.is_active == True))
+        rows, next_cursor = keyset_page(query, Event.date_time, Event.id,
+                                        row_key(serializer, Event.date_time, Event.id))
+        return {'items': serializer.many(rows), 'next_cursor': next_cursor}
+    
+    page = event_cache.read_through(
+        f"catalogue:{event_cache.generation('catalogue')}:{urlencode(args)}", load_page)
+    spots = available_spots([item['id'] for item in page['items']])
+    return list_response([dict(item, available_spots=spots.get(item['id'], 0)) for item in page['items']],
+                         page['next_cursor'], fields)
 
 @app.route('/api/events/<int:event_id>', methods=['GET'])
 @jwt_required()
 def get_event(event_id):
-    event = Event.query.get_or_404(event_id)
-    return jsonify({
-        'id': event.id,
-        'title': event.title,
-        'description': event.description,
-        'event_type': event.event_type,
-        'date_time': event.date_time.isoformat(),
-        'duration': event.duration,
-        'max_participants': event.max_participants,
-        'price': event.price,
+    def load_event():
+        serializer = serializers.get('Event', 'detail')
+        return serializer(event_listing_query(serializer).filter(Event.id == event_id).first_or_404())
+    
+    if event_cache.shared:
+        key = f'event:{event_id}'
+        event = event_cache.read_through_many([key], lambda keys: {key: load_event()})[key]
+    else:
+        event = load_event()
+    return jsonify(dict(event, available_spots=available_spots([event_id]).get(event_id, 0)))
+
+SEARCH_FIELDS = (
+    'id', 'title', 'event_type', 'date_time', 'end_time', 'duration', 'price', 'max_participants',
+    'available_spots', 'facilitator'
+)
+
+def search_offset(cursor):
+    """Result offset encoded in a search cursor"""
+    if not cursor:
+        return 0
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidQueryParameter('Invalid cursor')
+    if offset < 0:
+        raise InvalidQueryParameter('Invalid cursor')
+    return offset
+
+@app.route('/api/events/search', methods=['GET'])
+@jwt_required()
+def search_events():
+    """Upcoming events in a time window, filtered and ranked by the in-memory search index"""
+    start = datetime_arg('start') or datetime.utcnow()
+    end = datetime_arg('end') or start + timedelta(days=7)
+    if end <= start:
+        raise InvalidQueryParameter('end must be after start')
+    if end - start > timedelta(days=app.config['SEARCH_MAX_WINDOW_DAYS']):
+        raise InvalidQueryParameter(f"The window may span at most {app.config['SEARCH_MAX_WINDOW_DAYS']} days")
+    sort = request.args.get('sort', 'rank')
+    if sort not in SORTS:
+        raise InvalidQueryParameter('sort must be one of ' + ', '.join(SORTS))
+    min_spots = number_arg('min_spots', int)
+    fields = fields_arg(SEARCH_FIELDS)
+    limit = limit_arg()
+    offset = search_offset(request.args.get('cursor'))
+    
+    page, more = event_index.search(
+        start, end,
+        overlap=bool_arg('overlap'),
+        event_type=request.args.get('event_type') or None,
+        specialization=request.args.get('specialization') or None,
+        min_price=number_arg('min_price'),
+        max_price=number_arg('max_price'),
+        min_duration=number_arg('min_duration', int),
+        max_duration=number_arg('max_duration', int),
+        min_spots=1 if min_spots is None else max(min_spots, 0),
+        sort=sort,
+        offset=offset,
+        limit=limit
+    )
+    # The index may lag other workers by SEARCH_REFRESH_INTERVAL; the page shows live counts
+    spots = available_spots([entry.id for entry in page])
+    items = [{
+        'id': entry.id,
+        'title': entry.title,
+        'event_type': entry.event_type,
+        'date_time': entry.start.isoformat(),
+        'end_time': entry.end.isoformat(),
+        'duration': entry.duration,
+        'price': entry.price,
+        'max_participants': entry.max_participants,
+        'available_spots': spots.get(entry.id, 0),
         'facilitator': {
-            'id': event.facilitator.id,
-            'name': event.facilitator.name,
-            'specialization': event.facilitator.specialization
-        },
-        'available_spots': event.max_participants - len(event.bookings)
-    })
+            'id': entry.facilitator_id,
+            'name': entry.facilitator_name,
+            'specialization': entry.specialization
+        }
+    } for entry in page]
+    next_cursor = base64.urlsafe_b64encode(str(offset + limit).encode()).decode().rstrip('=') if more else None
+    return list_response(items, next_cursor, fields)
 
 # Booking Routes
 @app.route('/api/bookings', methods=['POST'])
 @jwt_required()
+@idempotency.guard
 def create_booking():
-    user_id = int(get_jwt_identity())
+    user_id = current_identity().user_id
     data = request.get_json()
     event_id = data['event_id']
     
     event = Event.query.get_or_404(event_id)
-    
-    # Check if event is full
-    if len(event.bookings) >= event.max_participants:
-        return jsonify({'message': 'Event is fully booked'}), 400
+    if not event.is_active:
+        return jsonify({'message': 'Event is no longer available'}), 400
     
     # Check if user already booked this event
-    existing_booking = Booking.query.filter_by(user_id=user_id, event_id=event_id).first()
+    existing_booking = Booking.query.filter_by(user_id=user_id, event_id=event_id, status='confirmed').first()
     if existing_booking:
         return jsonify({'message': 'Already booked this event'}), 400
     
+    # Claim a seat; the counter, not a count of booking rows, decides capacity
+    if not reserve_seat(event_id):
+        db.session.rollback()
+        if data.get('waitlist'):
+            joined = join_waitlist(user_id, event_id, data.get('notes', ''))
+            if joined is None:
+                return jsonify({'message': 'Already on the waitlist for this event'}), 400
+            entry_id, position = joined
+            if position is None:
+                return jsonify({'message': 'Booking confirmed from the waitlist', 'waitlist_id': entry_id})
+            return jsonify({
+                'message': 'Event is fully booked; added to the waitlist',
+                'waitlist_id': entry_id,
+                'position': position
+            }), 202
+        return jsonify({'message': 'Event is fully booked'}), 400
+    
     booking = Booking(
         user_id=user_id,
         event_id=event_id,
@@ -258,45 +1026,78 @@ def create_booking():
     )
     
     db.session.add(booking)
-    db.session.commit()
-    
-    # Notify CRM
-    notify_crm(booking)
+    try:
+        db.session.flush()
+        # Notify CRM (queued in the booking transaction, delivered in the background)
+        notify_crm(booking, current_identity().user, event)
+        record_booking_changes((event_id, booking.booking_date, BOOKED))
+        # Built before commit, which would expire the objects and reload them
+        result = {
+            'message': 'Booking confirmed',
+            'booking_id': booking.id,
+            'event': event.title,
+            'date_time': event.date_time.isoformat()
+        }
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request booked the same event for this user; the seat claim is rolled back too
+        db.session.rollback()
+        return jsonify({'message': 'Already booked this event'}), 400
+    invalidate_event_cache(event_id)
+    crm_dispatcher.wake()
+    booking_log.info('Booking confirmed', extra={'booking_id': result['booking_id'], 'event_id': event_id,
+                                                 'user_id': user_id})
     
-    return jsonify({
-        'message': 'Booking confirmed',
-        'booking_id': booking.id,
-        'event': event.title,
-        'date_time': event.date_time.isoformat()
-    })
+    return jsonify(result)
 
 @app.route('/api/my-bookings', methods=['GET'])
 @jwt_required()
 def get_user_bookings():
-    user_id = int(get_jwt_identity())
-    bookings = Booking.query.filter_by(user_id=user_id).all()
-    
-    return jsonify([{
-        'id': booking.id,
-        'event': {
-            'id': booking.event.id,
-            'title': booking.event.title,
-            'date_time': booking.event.date_time.isoformat(),
-            'event_type': booking.event.event_type
-        },
-        'booking_date': booking.booking_date.isoformat(),
-        'status': booking.status,
-        'is_upcoming': booking.event.date_time > datetime.utcnow()
-    } for booking in bookings])
+    user_id = current_identity().user_id
+    fields = fields_arg(('id', 'event', 'booking_date', 'status', 'is_upcoming', 'overlaps_with'))
+    serializer = serializers.get('Booking', 'list')
+    query = db.session.query(*serializer.columns).join(Event, Booking.event_id == Event.id
+    ).filter(Booking.user_id == user_id).params(now=datetime.utcnow())
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Booking.status == status)
+    query = apply_event_filters(query)
+    rows, next_cursor = keyset_page(query, Booking.booking_date, Booking.id,
+                                    row_key(serializer, Booking.booking_date, Booking.id))
+    items = serializer.only(fields).many(rows)
+    if fields is None or 'overlaps_with' in fields:
+        # Flags confirmed bookings whose events clash with another of the user's bookings
+        overlaps = booking_overlaps(user_id)
+        booking_id = row_key(serializer, Booking.id)
+        for row, item in zip(rows, items):
+            item['overlaps_with'] = sorted(overlaps.get(booking_id(row), []))
+    return list_response(items, next_cursor)
 
 @app.route('/api/bookings/<int:booking_id>', methods=['DELETE'])
 @jwt_required()
 def cancel_booking(booking_id):
-    user_id = int(get_jwt_identity())
+    user_id = current_identity().user_id
     booking = Booking.query.filter_by(id=booking_id, user_id=user_id).first_or_404()
     
-    booking.status = 'cancelled'
+    # Only the request that flips confirmed -> cancelled releases the seat
+    cancelled = db.session.execute(
+        update(Booking)
+        .where(Booking.id == booking.id, Booking.status == 'confirmed')
+        .values(status='cancelled')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    promoted = hand_back_seats([booking.event_id] * cancelled)
+    if cancelled:
+        # Queued in the cancelling transaction, like bulk and event cancellations
+        notify_crm(booking, current_identity().user, db.session.get(Event, booking.event_id), 'cancelled')
+        record_booking_changes((booking.event_id, booking.booking_date, CANCELLED))
     db.session.commit()
+    if cancelled:
+        invalidate_event_cache(booking.event_id)
+        booking_log.info('Booking cancelled', extra={'booking_id': booking_id, 'event_id': booking.event_id,
+                                                     'user_id': user_id})
+    if cancelled or promoted:
+        crm_dispatcher.wake()
     
     return jsonify({'message': 'Booking cancelled successfully'})
 
@@ -304,30 +1105,119 @@ def cancel_booking(booking_id):
 @app.route('/api/facilitator/events/<int:facilitator_id>', methods=['GET'])
 @jwt_required()
 def get_facilitator_events(facilitator_id):
-    events = Event.query.filter_by(facilitator_id=facilitator_id).all()
-    return jsonify([{
-        'id': event.id,
-        'title': event.title,
-        'date_time': event.date_time.isoformat(),
-        'bookings_count': len(event.bookings),
-        'max_participants': event.max_participants,
-        'is_active': event.is_active
-    } for event in events])
+    fields = fields_arg(('id', 'title', 'date_time', 'bookings_count', 'max_participants', 'is_active'))
+    serializer = serializers.get('Event', 'facilitator')
+    query = db.session.query(*serializer.columns).filter(Event.facilitator_id == facilitator_id)
+    status = request.args.get('status')
+    if status:
+        if status not in ('active', 'cancelled'):
+            raise InvalidQueryParameter('status must be active or cancelled')
+        query = query.filter(Event.is_active == (status == 'active'))
+    query = apply_event_filters(query)
+    rows, next_cursor = keyset_page(query, Event.date_time, Event.id,
+                                    row_key(serializer, Event.date_time, Event.id))
+    return list_response(serializer.only(fields).many(rows), next_cursor)
 
 @app.route('/api/facilitator/events/<int:event_id>/bookings', methods=['GET'])
 @jwt_required()
 def get_event_bookings(event_id):
-    event = Event.query.get_or_404(event_id)
-    return jsonify([{
-        'id': booking.id,
-        'user': {
-            'name': booking.user.name,
-            'email': booking.user.email
-        },
-        'booking_date': booking.booking_date.isoformat(),
-        'status': booking.status,
-        'notes': booking.notes
-    } for booking in event.bookings])
+    Event.query.get_or_404(event_id)
+    fields = fields_arg(('id', 'user', 'booking_date', 'status', 'notes'))
+    serializer = serializers.get('Booking', 'facilitator')
+    query = db.session.query(*serializer.columns).join(User, Booking.user_id == User.id
+    ).filter(Booking.event_id == event_id)
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Booking.status == status)
+    rows, next_cursor = keyset_page(query, Booking.booking_date, Booking.id,
+                                    row_key(serializer, Booking.booking_date, Booking.id))
+    return list_response(serializer.only(fields).many(rows), next_cursor)
+
+@app.route('/api/facilitator/events/<int:event_id>/bookings/export', methods=['GET'])
+@jwt_required()
+def export_event_bookings(event_id):
+    """Stream every booking of an event as CSV or NDJSON (`format`, default csv)"""
+    Event.query.get_or_404(event_id)
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise InvalidQueryParameter(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    serializer = serializers.get('Booking', 'facilitator')
+    query = db.session.query(*serializer.columns).join(User, Booking.user_id == User.id
+    ).filter(Booking.event_id == event_id)
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Booking.status == status)
+    query = query.order_by(Booking.booking_date, Booking.id)
+    return export_response(query, serializer, export_format, f'event-{event_id}-bookings',
+                           batch_size=app.config['EXPORT_BATCH_SIZE'], dumps=app.json.dumps)
+
+# Facilitator analytics, answered from the rollup tables (see main_app.analytics)
+def day_arg(name, default):
+    """Optional ISO date query parameter"""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidQueryParameter(f'{name} must be an ISO date (YYYY-MM-DD)')
+
+def rollup_rates(counts):
+    """Counts from a rollup row with cancellation_rate (and occupancy_rate when capacity is known)"""
+    counts['revenue'] = round(counts['revenue'], 2)
+    counts['cancellation_rate'] = rounded(counts['cancellations'] / counts['bookings'] if counts['bookings'] else None)
+    if 'capacity' in counts:
+        counts['occupancy_rate'] = rounded(counts['confirmed'] / counts['capacity'] if counts['capacity'] else None)
+    return counts
+
+@app.route('/api/facilitator/<int:facilitator_id>/analytics', methods=['GET'])
+@jwt_required()
+def get_facilitator_analytics(facilitator_id):
+    """Totals, and per-day bookings between date_from and date_to (default: the last 30 days)"""
+    Facilitator.query.get_or_404(facilitator_id)
+    date_to = day_arg('date_to', datetime.utcnow().date())
+    date_from = day_arg('date_from', date_to - timedelta(days=29))
+    days = (date_to - date_from).days + 1
+    if not 1 <= days <= app.config['ANALYTICS_MAX_DAYS']:
+        raise InvalidQueryParameter(f"The period must span 1 to {app.config['ANALYTICS_MAX_DAYS']} days")
+    
+    counters = ('bookings', 'cancellations', 'confirmed', 'revenue')
+    totals = db.session.get(FacilitatorStats, facilitator_id)
+    totals = {name: getattr(totals, name) if totals is not None else 0
+              for name in ('events', 'capacity') + counters}
+    daily = db.session.query(FacilitatorDailyStats.day, *[getattr(FacilitatorDailyStats, name) for name in counters]
+    ).filter(
+        FacilitatorDailyStats.facilitator_id == facilitator_id,
+        FacilitatorDailyStats.day.between(date_from, date_to)
+    ).order_by(FacilitatorDailyStats.day).all()
+    period = {name: sum(row[position] for row in daily) for position, name in enumerate(counters, 1)}
+    period.update(date_from=date_from.isoformat(), date_to=date_to.isoformat(), days=days,
+                  bookings_per_day=round(period['bookings'] / days, 2))
+    return jsonify({
+        'facilitator_id': facilitator_id,
+        'totals': rollup_rates(totals),
+        'period': rollup_rates(period),
+        'daily': [rollup_rates(dict(zip(counters, row[1:]), date=row.day.isoformat())) for row in daily]
+    })
+
+@app.route('/api/facilitator/<int:facilitator_id>/analytics/events', methods=['GET'])
+@jwt_required()
+def get_facilitator_event_analytics(facilitator_id):
+    """Per-event bookings, occupancy, cancellations and revenue, in event date order"""
+    allowed = ('id', 'title', 'date_time', 'is_active', 'max_participants', 'price', 'bookings',
+               'cancellations', 'confirmed', 'revenue', 'occupancy_rate', 'cancellation_rate')
+    fields = fields_arg(allowed)
+    serializer = serializers.get('Event', 'analytics')
+    query = db.session.query(*serializer.columns).outerjoin(EventStats, EventStats.event_id == Event.id
+    ).filter(Event.facilitator_id == facilitator_id)
+    query = apply_event_filters(query)
+    rows, next_cursor = keyset_page(query, Event.date_time, Event.id,
+                                    row_key(serializer, Event.date_time, Event.id))
+    return list_response(serializer.only(fields).many(rows), next_cursor)
+
+def is_count(value):
+    """Whether a JSON body value is a non-negative integer that fits an INTEGER column (true and false are not)"""
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 2 ** 31
 
 @app.route('/api/facilitator/events/<int:event_id>', methods=['PUT'])
 @jwt_required()
@@ -335,63 +1225,589 @@ def update_event(event_id):
     event = Event.query.get_or_404(event_id)
     data = request.get_json()
     
+    if 'max_participants' in data:
+        if not is_count(data['max_participants']):
+            return jsonify({'message': 'max_participants must be a non-negative integer'}), 400
+        if data['max_participants'] < event.seats_taken:
+            return jsonify({'message': 'max_participants cannot be lower than seats already taken'}), 400
+    date_time = datetime.fromisoformat(data.get('date_time', event.date_time.isoformat()))
+    if event.is_active and date_time != event.date_time:
+        start, end = event_interval(date_time, event.duration)
+        conflicts = check_schedule([{'id': event.id, 'facilitator_id': event.facilitator_id,
+                                     'start': start, 'end': end}], lock=True)[0]
+        if conflicts:
+            return jsonify({'message': 'The facilitator already has an event at that time',
+                            'conflicts': [conflict_json(conflict) for conflict in conflicts]}), 409
+    
+    old_capacity, old_price = event.max_participants or 0, event.price
+    
     event.title = data.get('title', event.title)
     event.description = data.get('description', event.description)
-    event.date_time = datetime.fromisoformat(data.get('date_time', event.date_time.isoformat()))
+    event.date_time = date_time
     event.max_participants = data.get('max_participants', event.max_participants)
     event.price = data.get('price', event.price)
     
+    db.session.flush()
+    # Before any promotion: promoted bookings are recorded at the new price already
+    connection = db.session.connection()
+    analytics.reprice(connection, event_id, event.facilitator_id, old_price, event.price)
+    if event.is_active and (event.max_participants or 0) != old_capacity:
+        analytics.adjust_events(connection, event.facilitator_id, capacity=(event.max_participants or 0) - old_capacity)
+    # Extra capacity goes to the waitlist first
+    promoted = []
+    if event.is_active and event.max_participants > event.seats_taken:
+        promoted = promote_waitlist(event_id, event.max_participants - event.seats_taken)
+    
     db.session.commit()
-    return jsonify({'message': 'Event updated successfully'})
+    invalidate_event_cache(event_id, details_changed=True)
+    if promoted:
+        crm_dispatcher.wake()
+    return jsonify({'message': 'Event updated successfully', 'promoted_from_waitlist': len(promoted)})
 
 @app.route('/api/facilitator/events/<int:event_id>/cancel', methods=['POST'])
 @jwt_required()
 def cancel_event(event_id):
     event = Event.query.get_or_404(event_id)
-    event.is_active = False
+    was_active, facilitator_id, capacity = event.is_active, event.facilitator_id, event.max_participants or 0
     
-    # Cancel all bookings
-    for booking in event.bookings:
-        booking.status = 'cancelled'
+    # Deactivate first: this locks the event row, so in-flight seat claims finish
+    # before the bookings are cancelled and no new claim can succeed afterwards
+    db.session.execute(
+        update(Event)
+        .where(Event.id == event_id)
+        .values(is_active=False, seats_taken=0)
+        .execution_options(synchronize_session=False)
+    )
+    
+    # Cancel all bookings with one UPDATE and tell the CRM in batches
+    cancelled = update_bookings(locked_bookings(Booking.event_id == event_id), status='cancelled')
+    queue_crm_notifications([notification_payload(row, 'cancelled') for row in cancelled])
+    record_booking_changes(*[(event_id, notification_booking_date(row), CANCELLED) for row in cancelled])
+    # Nobody can be promoted into a cancelled event
+    db.session.execute(
+        update(WaitlistEntry)
+        .where(WaitlistEntry.event_id == event_id, WaitlistEntry.status == 'waiting')
+        .values(status='cancelled')
+        .execution_options(synchronize_session=False)
+    )
+    if was_active:
+        analytics.adjust_events(db.session.connection(), facilitator_id, events=-1, capacity=-capacity)
     
     db.session.commit()
-    return jsonify({'message': 'Event cancelled successfully'})
+    invalidate_event_cache(event_id, details_changed=True)
+    if cancelled:
+        crm_dispatcher.wake()
+    return jsonify({'message': 'Event cancelled successfully', 'bookings_cancelled': len(cancelled)})
 
-def notify_crm(booking):
-    """Notify CRM system about new booking"""
+@app.route('/api/facilitator/events/<int:facilitator_id>/recurring', methods=['POST'])
+@jwt_required()
+def create_recurring_events(facilitator_id):
+    """Create `count` sessions starting at `date_time`, one every `interval_days` days (the facilitator only)"""
+    Facilitator.query.get_or_404(facilitator_id)
+    if facilitator_id not in caller_facilitator_ids():
+        return jsonify({'message': 'Only the facilitator can schedule their sessions'}), 403
+    data = request.get_json() or {}
+    
     try:
-        payload = {
-            'booking_id': booking.id,
-            'user': {
-                'id': booking.user.id,
-                'name': booking.user.name,
-                'email': booking.user.email
-            },
-            'event': {
-                'id': booking.event.id,
-                'title': booking.event.title,
-                'date_time': booking.event.date_time.isoformat()
-            },
-            'facilitator_id': booking.event.facilitator_id
-        }
-        
-        headers = {
-            'Authorization': f'Bearer {os.getenv("CRM_BEARER_TOKEN")}',
-            'Content-Type': 'application/json'
+        start = datetime.fromisoformat(data['date_time'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': 'date_time (ISO format) is required'}), 400
+    if not data.get('title'):
+        return jsonify({'message': 'title is required'}), 400
+    count = data.get('count')
+    if not is_count(count) or not 1 <= count <= app.config['RECURRING_MAX_OCCURRENCES']:
+        return jsonify({'message': f"count must be an integer between 1 and {app.config['RECURRING_MAX_OCCURRENCES']}"}), 400
+    interval_days = data.get('interval_days', 7)
+    if not is_count(interval_days) or interval_days < 1:
+        return jsonify({'message': 'interval_days must be a positive integer'}), 400
+    duration = data.get('duration')
+    if duration is not None and not is_count(duration):
+        return jsonify({'message': 'duration must be a non-negative integer (minutes)'}), 400
+    max_participants = data.get('max_participants', 10)
+    if not is_count(max_participants):
+        return jsonify({'message': 'max_participants must be a non-negative integer'}), 400
+    price = data.get('price', 0.0)
+    if not isinstance(price, (int, float)) or isinstance(price, bool) or not 0 <= price < float('inf'):
+        return jsonify({'message': 'price must be a non-negative number'}), 400
+    interval = timedelta(days=interval_days)
+    
+    # Occurrences may also clash with each other when the duration outlasts the interval
+    try:
+        proposals = [dict(zip(('start', 'end'), event_interval(start + interval * occurrence, duration)),
+                          facilitator_id=facilitator_id) for occurrence in range(count)]
+    except OverflowError:
+        return jsonify({'message': 'The series would end past the latest supported date'}), 400
+    conflicts = [
+        {'occurrence': occurrence, 'date_time': proposals[occurrence]['start'].isoformat(),
+         'conflicts': [conflict_json(conflict) for conflict in found]}
+        for occurrence, found in enumerate(check_schedule(proposals, lock=True)) if found
+    ]
+    if conflicts:
+        return jsonify({'message': 'Some sessions clash with the facilitator\'s schedule', 'conflicts': conflicts}), 409
+    
+    events = [Event(
+        title=data['title'],
+        description=data.get('description'),
+        event_type=data.get('event_type', 'session'),
+        date_time=start + interval * occurrence,
+        duration=duration,
+        max_participants=max_participants,
+        price=price,
+        facilitator_id=facilitator_id
+    ) for occurrence in range(count)]
+    # One flush inserts every occurrence with batched multi-row INSERTs
+    db.session.add_all(events)
+    db.session.flush()
+    analytics.adjust_events(db.session.connection(), facilitator_id, events=count, capacity=count * max_participants)
+    result = {
+        'message': f'Created {count} sessions',
+        'events': [{'id': event.id, 'date_time': event.date_time.isoformat()} for event in events]
+    }
+    db.session.commit()
+    invalidate_event_cache(*[item['id'] for item in result['events']], details_changed=True)
+    return jsonify(result), 201
+
+@app.route('/api/facilitator/schedule/validate', methods=['POST'])
+@jwt_required()
+def validate_schedule():
+    """Check a proposed schedule against the facilitators' active events and against itself"""
+    data = request.get_json() or {}
+    items = data.get('events')
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'events must be a non-empty list'}), 400
+    if len(items) > app.config['BULK_MAX_IDS']:
+        return jsonify({'message': f"At most {app.config['BULK_MAX_IDS']} events per request"}), 400
+    
+    proposals = []
+    for index, item in enumerate(items):
+        try:
+            start, end = event_interval(datetime.fromisoformat(item['date_time']), int(item.get('duration') or 0))
+            proposals.append({'id': int(item['id']) if item.get('id') is not None else None,
+                              'facilitator_id': int(item['facilitator_id']), 'start': start, 'end': end})
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return jsonify({'message': f'events[{index}] needs facilitator_id and date_time (ISO format); '
+                                       'duration and id must be integers'}), 400
+    
+    results = [
+        {'index': index, 'conflicts': [conflict_json(conflict) for conflict in found]}
+        for index, found in enumerate(check_schedule(proposals)) if found
+    ]
+    return jsonify({'valid': not results, 'results': results})
+
+def caller_facilitator_ids():
+    """Ids of the facilitators the caller acts as: those registered under the caller's email"""
+    user = current_identity().user
+    if user is None:
+        return []
+    return [facilitator_id for facilitator_id, in db.session.query(Facilitator.id).filter(Facilitator.email == user.email)]
+
+def owns_all(facilitator_ids, event_ids=(), booking_ids=()):
+    """Whether every listed event, and the event of every listed booking, belongs to one of `facilitator_ids`"""
+    foreign = Event.facilitator_id.notin_(facilitator_ids)
+    if event_ids and db.session.query(Event.id).filter(Event.id.in_(event_ids), foreign).first():
+        return False
+    if booking_ids and db.session.query(Booking.id).join(Event, Booking.event_id == Event.id
+    ).filter(Booking.id.in_(booking_ids), foreign).first():
+        return False
+    return True
+
+def id_list_arg(data, name):
+    """Optional list of integer ids in a JSON body, at most BULK_MAX_IDS long"""
+    ids = data.get(name)
+    if ids is None:
+        return None
+    if not isinstance(ids, list) or not all(isinstance(value, int) for value in ids):
+        raise InvalidQueryParameter(f'{name} must be a list of integers')
+    if len(ids) > app.config['BULK_MAX_IDS']:
+        raise InvalidQueryParameter(f"At most {app.config['BULK_MAX_IDS']} {name} per request")
+    return ids
+
+@app.route('/api/facilitator/bookings/cancel', methods=['POST'])
+@jwt_required()
+def bulk_cancel_bookings():
+    """Cancel the confirmed bookings listed in `booking_ids` and every one held on `event_ids`.
+
+    Only the facilitator of every event involved may do this.
+    """
+    data = request.get_json() or {}
+    booking_ids = id_list_arg(data, 'booking_ids')
+    event_ids = id_list_arg(data, 'event_ids')
+    if not booking_ids and not event_ids:
+        return jsonify({'message': 'booking_ids or event_ids is required'}), 400
+    facilitator_ids = caller_facilitator_ids()
+    if not facilitator_ids or not owns_all(facilitator_ids, event_ids or (), booking_ids or ()):
+        return jsonify({'message': 'Only the facilitator of these events can cancel their bookings'}), 403
+    
+    criteria = []
+    if booking_ids:
+        criteria.append(Booking.id.in_(booking_ids))
+    if event_ids:
+        criteria.append(Booking.event_id.in_(event_ids))
+    cancelled = update_bookings(locked_bookings(or_(*criteria), Event.facilitator_id.in_(facilitator_ids)),
+                                status='cancelled')
+    booking_id, event_id = notification_row_keys()
+    queue_crm_notifications([notification_payload(row, 'cancelled') for row in cancelled])
+    record_booking_changes(*[(event_id(row), notification_booking_date(row), CANCELLED) for row in cancelled])
+    promoted = hand_back_seats([event_id(row) for row in cancelled])
+    db.session.commit()
+    
+    invalidate_event_cache(*{event_id(row) for row in cancelled})
+    if cancelled:
+        crm_dispatcher.wake()
+    return jsonify({
+        'message': f'Cancelled {len(cancelled)} bookings',
+        'booking_ids': [booking_id(row) for row in cancelled],
+        'promoted_from_waitlist': len(promoted)
+    })
+
+@app.route('/api/facilitator/bookings/move', methods=['POST'])
+@jwt_required()
+def bulk_move_bookings():
+    """Move confirmed bookings (`booking_ids` and/or every booking on `from_event_id`) to `to_event_id`.
+
+    Bookings whose user already holds a confirmed booking on the target event
+    are skipped. Capacity is all-or-nothing: nothing moves unless the target
+    event has a seat for every booking being moved. Only the facilitator of
+    every event involved may do this.
+    """
+    data = request.get_json() or {}
+    booking_ids = id_list_arg(data, 'booking_ids')
+    from_event_id = data.get('from_event_id')
+    if not isinstance(data.get('to_event_id'), int) or not (booking_ids or isinstance(from_event_id, int)):
+        return jsonify({'message': 'to_event_id and booking_ids or from_event_id are required'}), 400
+    target = Event.query.get_or_404(data['to_event_id'])
+    facilitator_ids = caller_facilitator_ids()
+    if target.facilitator_id not in facilitator_ids or not owns_all(
+            facilitator_ids, [from_event_id] if isinstance(from_event_id, int) else (), booking_ids or ()):
+        return jsonify({'message': 'Only the facilitator of these events can move their bookings'}), 403
+    if not target.is_active:
+        return jsonify({'message': 'Event is no longer available'}), 400
+    
+    criteria = []
+    if booking_ids:
+        criteria.append(Booking.id.in_(booking_ids))
+    if isinstance(from_event_id, int):
+        criteria.append(Booking.event_id == from_event_id)
+    held = aliased(Booking)
+    already_booked = db.session.query(held.id).filter(
+        held.user_id == Booking.user_id,
+        held.event_id == target.id,
+        held.status == 'confirmed'
+    ).exists()
+    rows = locked_bookings(or_(*criteria), Event.facilitator_id.in_(facilitator_ids), Booking.event_id != target.id,
+                           ~already_booked)
+    if rows and not reserve_seat(target.id, len(rows)):
+        db.session.rollback()
+        return jsonify({'message': 'Not enough seats on the target event'}), 400
+    
+    booking_id, event_id = notification_row_keys()
+    try:
+        moved = update_bookings(rows, event_id=target.id)
+        if len(moved) < len(rows):
+            # Some bookings were cancelled concurrently; pass their seats on
+            hand_back_seats([target.id] * (len(rows) - len(moved)))
+        hand_back_seats([event_id(row) for row in moved])
+        new_event = {'id': target.id, 'title': target.title, 'date_time': target.date_time.isoformat()}
+        queue_crm_notifications([
+            notification_payload(row, 'moved', event=new_event, facilitator_id=target.facilitator_id,
+                                 previous_event_id=event_id(row))
+            for row in moved
+        ])
+        record_booking_changes(*[change for row in moved for change in (
+            (event_id(row), notification_booking_date(row), MOVED_OUT),
+            (target.id, notification_booking_date(row), BOOKED))])
+        result = {
+            'message': f'Moved {len(moved)} bookings',
+            'booking_ids': [booking_id(row) for row in moved]
         }
-        
-        response = requests.post(
-            os.getenv('CRM_ENDPOINT'),
-            json=payload,
-            headers=headers,
-            timeout=5
+        if booking_ids:
+            result['skipped'] = sorted(set(booking_ids) - set(result['booking_ids']))
+        db.session.commit()
+    except IntegrityError:
+        # A user booked the target event concurrently; nothing was moved
+        db.session.rollback()
+        return jsonify({'message': 'Bookings changed while moving, please retry'}), 409
+    
+    invalidate_event_cache(target.id, *{event_id(row) for row in moved})
+    if moved:
+        crm_dispatcher.wake()
+    return jsonify(result)
+
+# Bulk booking helpers
+def locked_bookings(*criteria):
+    """Confirmed bookings matching `criteria` as 'notification' serializer rows, locked until commit"""
+    return db.session.query(*serializers.get('Booking', 'notification').columns
+    ).join(User, Booking.user_id == User.id).join(Event, Booking.event_id == Event.id
+    ).filter(Booking.status == 'confirmed', *criteria
+    ).order_by(Booking.id).with_for_update(of=Booking).all()
+
+def notification_row_keys():
+    """(booking id, event id) getters for locked_bookings() rows"""
+    serializer = serializers.get('Booking', 'notification')
+    return row_key(serializer, Booking.id), row_key(serializer, Event.id)
+
+def update_bookings(rows, **values):
+    """Apply `values` to the still-confirmed bookings among `rows` with one UPDATE; returns the rows changed"""
+    if not rows:
+        return []
+    booking_id, _ = notification_row_keys()
+    statement = (
+        update(Booking)
+        .where(Booking.id.in_([booking_id(row) for row in rows]), Booking.status == 'confirmed')
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if not db.engine.dialect.update_returning:
+        # locked_bookings() holds row locks here, so every row is updated
+        db.session.execute(statement)
+        return rows
+    changed = set(db.session.scalars(statement.returning(Booking.id)))
+    return [row for row in rows if booking_id(row) in changed]
+
+def notification_key():
+    """Idempotency key of one CRM notification, stored with its outbox payload.
+
+    Every redelivery of the payload carries the same key, so the CRM stores it once. Distinct
+    notifications never share a key, even when they repeat a booking, type and event (a booking
+    moved back to an event it left).
+    """
+    return uuid.uuid4().hex
+
+def notification_payload(row, notification_type, **overrides):
+    """CRM payload for a locked_bookings() row; `notification_type` is cancelled or moved"""
+    return dict(serializers.get('Booking', 'notification')(row), type=notification_type,
+                request_id=current_request_id(), idempotency_key=notification_key(), **overrides)
+
+def queue_crm_notifications(payloads):
+    """Queue CRM notifications as batch outbox rows of up to CRM_BATCH_SIZE payloads each"""
+    size = max(app.config['CRM_BATCH_SIZE'], 1)
+    db.session.add_all([CrmOutbox(payload=json.dumps(payloads[i:i + size])) for i in range(0, len(payloads), size)])
+
+# Waitlist
+def claim_waitlist_head(event_id):
+    """Mark the oldest waiting entry of an event promoted and return it; None when nobody waits.
+    
+    Concurrent promoters skip each other's locked head rows (PostgreSQL), and the
+    conditional UPDATE makes sure each entry is claimed by exactly one of them.
+    """
+    while True:
+        entry = db.session.query(WaitlistEntry.id, WaitlistEntry.user_id, WaitlistEntry.notes).filter(
+            WaitlistEntry.event_id == event_id,
+            WaitlistEntry.status == 'waiting'
+        ).order_by(WaitlistEntry.id).with_for_update(skip_locked=True).first()
+        if entry is None:
+            return None
+        claimed = db.session.execute(
+            update(WaitlistEntry)
+            .where(WaitlistEntry.id == entry.id, WaitlistEntry.status == 'waiting')
+            .values(status='promoted', promoted_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            continue
+        if Booking.query.filter_by(user_id=entry.user_id, event_id=event_id, status='confirmed').first():
+            # Booked directly in the meantime; drop the entry and try the next one
+            db.session.execute(
+                update(WaitlistEntry)
+                .where(WaitlistEntry.id == entry.id)
+                .values(status='left')
+                .execution_options(synchronize_session=False)
+            )
+            continue
+        return entry
+
+def promote_waitlist(event_id, seats, held=False):
+    """Turn up to `seats` waiting users of an event into confirmed bookings, first come first served.
+    
+    With held=True the caller already holds the seats in Event.seats_taken (freed
+    by a cancellation in this transaction), so they pass straight to waiting
+    users and a concurrent booking can never grab them first; seats nobody is
+    waiting for are released. Otherwise each seat is claimed from free capacity.
+    Each promotion is a constant number of statements in the caller's
+    transaction and queues a CRM notification. Returns the new bookings.
+    """
+    promoted = []
+    for index in range(seats):
+        if not held and not reserve_seat(event_id):
+            break
+        entry = claim_waitlist_head(event_id)
+        if entry is None:
+            release_seats(event_id, seats - index if held else 1)
+            break
+        booking = Booking(user_id=entry.user_id, event_id=event_id, notes=entry.notes or '')
+        db.session.add(booking)
+        db.session.flush()
+        db.session.execute(
+            update(WaitlistEntry)
+            .where(WaitlistEntry.id == entry.id)
+            .values(booking_id=booking.id)
+            .execution_options(synchronize_session=False)
         )
-        
-        if response.status_code != 200:
-            print(f"CRM notification failed: {response.status_code}")
-            
-    except Exception as e:
-        print(f"CRM notification error: {str(e)}")
+        notify_crm(booking, db.session.get(User, entry.user_id), db.session.get(Event, event_id), 'promoted')
+        record_booking_changes((event_id, booking.booking_date, BOOKED))
+        promoted.append(booking)
+    return promoted
+
+def join_waitlist(user_id, event_id, notes):
+    """Queue the user for a full event; returns (entry id, position) or None if already waiting"""
+    entry = WaitlistEntry(user_id=user_id, event_id=event_id, notes=notes)
+    db.session.add(entry)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    # A seat freed just before the entry existed was released rather than handed over; claim it now
+    promoted = promote_waitlist(event_id, 1)
+    position = None
+    if not any(booking.user_id == user_id for booking in promoted):
+        position = waitlist_position(entry.id, event_id)
+    db.session.commit()
+    if promoted:
+        invalidate_event_cache(event_id)
+        crm_dispatcher.wake()
+    return entry.id, position
+
+def waitlist_position(entry_id, event_id):
+    """1-based place of a waiting entry in its event's queue"""
+    return db.session.query(func.count(WaitlistEntry.id)).filter(
+        WaitlistEntry.event_id == event_id,
+        WaitlistEntry.status == 'waiting',
+        WaitlistEntry.id <= entry_id
+    ).scalar()
+
+@app.route('/api/my-waitlist', methods=['GET'])
+@jwt_required()
+def get_user_waitlist():
+    user_id = current_identity().user_id
+    ahead = aliased(WaitlistEntry)
+    position = db.session.query(func.count(ahead.id)).filter(
+        ahead.event_id == WaitlistEntry.event_id,
+        ahead.status == 'waiting',
+        ahead.id <= WaitlistEntry.id
+    ).scalar_subquery()
+    rows = db.session.query(WaitlistEntry.id, WaitlistEntry.created_at, Event.id, Event.title, Event.date_time, position
+    ).join(Event, WaitlistEntry.event_id == Event.id).filter(
+        WaitlistEntry.user_id == user_id,
+        WaitlistEntry.status == 'waiting'
+    ).order_by(WaitlistEntry.id).all()
+    return jsonify([{
+        'id': entry_id,
+        'event': {
+            'id': event_id,
+            'title': title,
+            'date_time': date_time.isoformat()
+        },
+        'joined_at': created_at.isoformat(),
+        'position': place
+    } for entry_id, created_at, event_id, title, date_time, place in rows])
+
+@app.route('/api/waitlist/<int:entry_id>', methods=['DELETE'])
+@jwt_required()
+def leave_waitlist(entry_id):
+    left = db.session.execute(
+        update(WaitlistEntry)
+        .where(WaitlistEntry.id == entry_id,
+               WaitlistEntry.user_id == current_identity().user_id,
+               WaitlistEntry.status == 'waiting')
+        .values(status='left')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not left:
+        return jsonify({'message': 'Not on this waitlist'}), 404
+    return jsonify({'message': 'Left the waitlist'})
+
+def notify_crm(booking, user, event, notification_type='created'):
+    """Queue a CRM notification about a booking (created, promoted or cancelled) in the current transaction"""
+    payload = {
+        'booking_id': booking.id,
+        'user': {
+            'id': user.id,
+            'name': user.name,
+            'email': user.email
+        },
+        'event': {
+            'id': event.id,
+            'title': event.title,
+            'date_time': event.date_time.isoformat()
+        },
+        'facilitator_id': event.facilitator_id,
+        'type': notification_type,
+        'request_id': current_request_id(),
+        'idempotency_key': notification_key()
+    }
+    db.session.add(CrmOutbox(payload=json.dumps(payload)))
+
+crm_latency = metrics.histogram('crm_request_duration_seconds',
+                                'CRM notify calls by operation (notify, batch) and outcome', ('operation', 'outcome'))
+crm_client = CRMClient(
+    app.config['CRM_ENDPOINT'],
+    app.config['CRM_BEARER_TOKEN'],
+    batch_endpoint=app.config['CRM_BATCH_ENDPOINT'],
+    pool_size=app.config['CRM_POOL_SIZE'],
+    connect_timeout=app.config['CRM_CONNECT_TIMEOUT'],
+    read_timeout=app.config['CRM_READ_TIMEOUT'],
+    failure_threshold=app.config['CRM_BREAKER_THRESHOLD'],
+    reset_timeout=app.config['CRM_BREAKER_RESET'],
+    observe=lambda operation, seconds, outcome: crm_latency.observe(seconds, operation, outcome)
+)
+
+crm_dispatcher = OutboxDispatcher(
+    app, db, CrmOutbox, crm_client.send,
+    send_batch=crm_client.send_batch if app.config['CRM_BATCH_SIZE'] > 1 else None,
+    send_batch_size=app.config['CRM_BATCH_SIZE'],
+    workers=app.config['CRM_DISPATCH_WORKERS'],
+    max_attempts=app.config['CRM_DISPATCH_MAX_ATTEMPTS']
+)
+# Started per worker process by gunicorn.conf.py
+app.extensions['outbox_dispatcher'] = crm_dispatcher
+
+metrics.collected('crm_outbox_rows_total', 'Outbox rows handled by this worker by outcome', 'counter',
+                  lambda: {(outcome,): count for outcome, count in crm_dispatcher.stats().items()}, ('outcome',))
+metrics.collected('crm_circuit_open', '1 while the CRM circuit breaker is open', 'gauge',
+                  lambda: {(): int(crm_client.breaker.state == 'open')})
+metrics.collected('cache_requests_total', 'Event cache lookups by key family and result', 'counter',
+                  lambda: {(namespace, result): counts[result]
+                           for namespace, counts in event_cache.stats()['namespaces'].items()
+                           for result in ('hits', 'misses')}, ('namespace', 'result'))
+metrics.collected('rate_limited_requests_total', 'Requests rejected with 429 by bucket', 'counter',
+                  lambda: {(scope,): count for scope, count in rate_limiter.stats()['limited'].items()}, ('bucket',))
+metrics.collected('log_records_dropped_total', 'Log records dropped because the log queue was full', 'counter',
+                  lambda: {(): log_pipeline.stats()['dropped']})
+
+def rebuild_analytics(batch_size=100, log=None):
+    """Recompute every facilitator's rollups from events and bookings, `batch_size` facilitators per
+    transaction; returns the number of facilitators"""
+    last_id, total = 0, 0
+    while True:
+        facilitator_ids = [facilitator_id for facilitator_id, in db.session.query(Facilitator.id).filter(
+            Facilitator.id > last_id).order_by(Facilitator.id).limit(batch_size)]
+        if not facilitator_ids:
+            return total
+        analytics.rebuild(db.session.connection(), facilitator_ids)
+        db.session.commit()
+        last_id, total = facilitator_ids[-1], total + len(facilitator_ids)
+        if log:
+            log(f'Rebuilt analytics for {total} facilitators')
+
+@app.cli.command('rebuild-analytics')
+@click.option('--batch-size', default=100, show_default=True, help='Facilitators rebuilt per transaction')
+def rebuild_analytics_command(batch_size):
+    """Recompute the facilitator analytics rollups from events and bookings"""
+    total = rebuild_analytics(batch_size, log=print)
+    print(f"Rebuilt analytics rollups for {total} facilitators")
+
+@app.cli.command('drain-outbox')
+def drain_outbox_command():
+    """Deliver every due CRM notification once and exit"""
+    total = 0
+    while True:
+        dispatched = crm_dispatcher.dispatch_due()
+        if not dispatched:
+            break
+        total += dispatched
+    print(f"Dispatched {total} CRM notifications")
 
 def init_sample_data():
     """Initialize database with sample data"""
@@ -423,9 +1839,11 @@ def init_sample_data():
             db.session.add(event)
         
         db.session.commit()
+        rebuild_analytics()
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        migrate()
         init_sample_data()
+    crm_dispatcher.start()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""Request authentication helpers for main_app.
+
+CachingJWTManager remembers the claims of tokens it has already verified, keyed
+by a SHA-256 digest of the token, so a client sending the same token on every
+request pays for signature verification once. Entries expire with the token's
+own `exp` claim (or after `max_ttl` for tokens without one), so an expired
+token is always re-verified and rejected. Revocation and custom claim checks
+still run on every request, as they happen after decoding. Tokens are only
+cached while the app uses the configured secret: a custom decode_key_loader
+may pick or retire keys per token, so with one every token is verified.
+
+Flask-JWT-Extended has no public hook around decoding, so the cache overrides
+JWTManager._decode_jwt_from_config. requirements.txt pins the version it was
+written against; if that method is missing or its signature changes, the
+cache turns itself off with a warning instead of breaking authentication.
+
+RequestIdentity carries the caller's user id for one request and loads the
+User row only when a handler asks for it, at most once.
+"""
+import hashlib
+import inspect
+import logging
+import time
+
+from flask_jwt_extended import JWTManager
+from flask_jwt_extended.default_callbacks import default_decode_key_callback
+
+from main_app.cache import Cache, MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+# Parameters of the Flask-JWT-Extended 4.x method CachingJWTManager overrides
+DECODE_PARAMETERS = ['self', 'encoded_token', 'csrf_value', 'allow_expired']
+
+
+def can_cache_decoding():
+    """Whether the installed JWTManager still decodes tokens through the method the cache overrides"""
+    method = getattr(JWTManager, '_decode_jwt_from_config', None)
+    return method is not None and list(inspect.signature(method).parameters) == DECODE_PARAMETERS
+
+
+class CachingJWTManager(JWTManager):
+    """JWTManager with an LRU cache of verified claims (`cache_size=0` disables it)"""
+
+    def __init__(self, app=None, cache_size=10000, max_ttl=300, **kwargs):
+        if cache_size and not can_cache_decoding():
+            logger.warning('Flask-JWT-Extended no longer exposes _decode_jwt_from_config as expected; '
+                           'the JWT cache is disabled')
+            cache_size = 0
+        self.token_cache = Cache(MemoryBackend(cache_size), ttl=max_ttl) if cache_size else None
+        self._identity_claim = 'sub'
+        super().__init__(app, **kwargs)
+
+    def init_app(self, app, *args, **kwargs):
+        super().init_app(app, *args, **kwargs)
+        self._identity_claim = app.config['JWT_IDENTITY_CLAIM']
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if (self.token_cache is None or csrf_value is not None or allow_expired
+                or self._decode_key_callback is not default_decode_key_callback):
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        key = 'token:' + hashlib.sha256(encoded_token.encode()).hexdigest()
+        claims = self.token_cache.get(key)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+            ttl = claims['exp'] - time.time() if 'exp' in claims else self.token_cache.ttl
+            if ttl > 0:
+                self.token_cache.set(key, claims, ttl=min(ttl, self.token_cache.ttl))
+        # Callers may add to the claims; keep the cached copy pristine
+        return dict(claims)
+
+    def cached_identity(self, encoded_token):
+        """Identity of a token this manager has already verified and cached; None otherwise"""
+        if self.token_cache is None:
+            return None
+        claims = self.token_cache.get('token:' + hashlib.sha256(encoded_token.encode()).hexdigest())
+        return claims.get(self._identity_claim) if claims is not None else None
+
+    def cache_stats(self):
+        return self.token_cache.stats() if self.token_cache is not None else None
+
+
+class RequestIdentity:
+    """The authenticated caller; `user` runs `load_user(user_id)` on first access only"""
+
+    _NOT_LOADED = object()
+
+    def __init__(self, user_id, load_user):
+        self.user_id = user_id
+        self._load_user = load_user
+        self._user = self._NOT_LOADED
+
+    @property
+    def user(self):
+        if self._user is self._NOT_LOADED:
+            self._user = self._load_user(self.user_id)
+        return self._user
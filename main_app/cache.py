@@ -0,0 +1,212 @@
+"""Read-through caching for serialized event data and verified tokens.
+
+Values are plain JSON-compatible structures. MemoryBackend keeps them per
+process with TTL and LRU eviction; SharedBackend stores them in Redis so every
+worker sees the same entries and invalidations (over the in-process LocalRedis
+stand-in it behaves like a per-process cache). Cache.shared tells callers which
+one they have, so data that must not go stale between workers is only cached
+when invalidations reach them all.
+
+Entries that are invalidated one by one go through read_through_many(), which
+stores each value under its key's current version, read before loading, and
+invalidate(), which bumps the version: a load that raced with an invalidation
+is stored under a version nobody reads any more, like a catalogue page built
+from an old generation.
+Cache counts hits and misses per key namespace (the text before the first ':').
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from common.shared_store import connect
+
+
+class MemoryBackend:
+    """Per-process LRU map with a TTL per entry"""
+
+    name = 'memory'
+    shared = False
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counters = {}
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    values.append(entry[1])
+        return values
+
+    def set_many(self, items, ttl):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def counters(self, keys):
+        with self._lock:
+            return [self._counters.get(key, 0) for key in keys]
+
+    def incr_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._counters[key] = self._counters.get(key, 0) + 1
+            return [self._counters[key] for key in keys]
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SharedBackend:
+    """Entries in a Redis-compatible store; eviction is left to the store's maxmemory policy"""
+
+    name = 'shared'
+
+    def __init__(self, client, prefix='booking:cache:', shared=True):
+        self.client = client
+        self.prefix = prefix
+        # False over LocalRedis, which only lives in this process
+        self.shared = shared
+
+    def get_many(self, keys):
+        raw = self.client.mget([self.prefix + key for key in keys])
+        return [json.loads(value) if value is not None else None for value in raw]
+
+    def set_many(self, items, ttl):
+        pipe = self.client.pipeline()
+        for key, value in items.items():
+            pipe.set(self.prefix + key, json.dumps(value), ex=ttl)
+        pipe.execute()
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def counters(self, keys):
+        raw = self.client.mget([self.prefix + key for key in keys])
+        return [int(value) if value is not None else 0 for value in raw]
+
+    def incr_many(self, keys):
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.incr(self.prefix + key)
+        return pipe.execute()
+
+    def size(self):
+        return None
+
+
+def cache_backend(url, max_entries=10000):
+    """memory:// for a per-process cache, redis:// for a shared one (local:// runs the shared code in-process)"""
+    if url.startswith('memory://'):
+        return MemoryBackend(max_entries)
+    return SharedBackend(connect(url), shared=not url.startswith('local://'))
+
+
+class Cache:
+    """Read-through front for a backend with per-namespace hit/miss counters"""
+
+    def __init__(self, backend, ttl=30):
+        self.backend = backend
+        self.ttl = ttl
+        # Whether invalidate() and bump_generation() reach every worker, not just this process
+        self.shared = backend.shared
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        values = self.backend.get_many(keys)
+        with self._stats_lock:
+            for key, value in zip(keys, values):
+                counts = self._stats.setdefault(key.split(':', 1)[0], {'hits': 0, 'misses': 0})
+                counts['hits' if value is not None else 'misses'] += 1
+        return values
+
+    def set(self, key, value, ttl=None):
+        self.backend.set_many({key: value}, ttl or self.ttl)
+
+    def set_many(self, items):
+        if items:
+            self.backend.set_many(items, self.ttl)
+
+    def read_through(self, key, load):
+        """Cached value for `key`, calling `load()` and storing its result on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = load()
+            self.set(key, value)
+        return value
+
+    def read_through_many(self, keys, load):
+        """Cached values for `keys`, calling `load(missing_keys)` -> {key: value} for the misses.
+
+        Values are stored under the version each key had before loading, so one
+        invalidated meanwhile is never served; keys `load` leaves out are not cached.
+        """
+        if not keys:
+            return {}
+        versioned = [f'{key}@{version}' for key, version
+                     in zip(keys, self.backend.counters([f'version:{key}' for key in keys]))]
+        values = dict(zip(keys, self.get_many(versioned)))
+        missing = [key for key, value in values.items() if value is None]
+        if missing:
+            loaded = load(missing)
+            stored = dict(zip(keys, versioned))
+            self.set_many({stored[key]: value for key, value in loaded.items() if value is not None})
+            values.update(loaded)
+        return values
+
+    def invalidate(self, *keys):
+        """Start a new version of `keys`; entries from read_through_many() stop being served"""
+        if not keys:
+            return
+        versions = self.backend.incr_many([f'version:{key}' for key in keys])
+        # The old entries are unreachable now; dropping them just frees the space early
+        self.backend.delete([f'{key}@{version - 1}' for key, version in zip(keys, versions)])
+
+    def generation(self, name):
+        """Current generation of a key family; bump_generation() orphans every key built from it"""
+        return self.backend.counters([f'generation:{name}'])[0]
+
+    def bump_generation(self, name):
+        self.backend.incr_many([f'generation:{name}'])
+
+    def stats(self):
+        with self._stats_lock:
+            namespaces = {name: dict(counts) for name, counts in self._stats.items()}
+        hits = sum(counts['hits'] for counts in namespaces.values())
+        misses = sum(counts['misses'] for counts in namespaces.values())
+        return {
+            'backend': self.backend.name,
+            'shared': self.shared,
+            'entries': self.backend.size(),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            'namespaces': namespaces
+        }
@@ -0,0 +1,187 @@
+"""Process-wide HTTP client for main_app -> CRM traffic.
+
+One requests.Session with a sized keep-alive connection pool is shared by
+every delivery thread, so notifications reuse TCP (and TLS) connections
+instead of opening one per booking. A circuit breaker stops calling the CRM
+while it is failing and lets a single trial request through after a cool-down.
+Calls it refuses raise CircuitOpenError, a DeliveryDeferred: the outbox
+reschedules those notifications for when the breaker half-opens and does not
+count the refusal as a delivery attempt.
+An optional `observe(operation, seconds, outcome)` callback is told how long
+every CRM request took (operation notify or batch; outcome ok, rejected or error).
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from main_app.outbox import DeliveryDeferred, PermanentDeliveryError
+
+
+class CircuitOpenError(DeliveryDeferred, RuntimeError):
+    """Raised instead of calling the CRM while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; half-open after `reset_timeout`"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._rejected = 0
+        self._opened_count = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == 'closed':
+                return True
+            if self._state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = 'half_open'
+            if self._state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def retry_after(self):
+        """Seconds until an open breaker lets a trial request through (0 when it is not open)"""
+        with self._lock:
+            if self._state != 'open':
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._state = 'closed'
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    self._opened_count += 1
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+
+    def metrics(self):
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'rejected_calls': self._rejected,
+                'times_opened': self._opened_count
+            }
+
+
+class CRMClient:
+    """Pooled, keep-alive client for the CRM notify endpoints"""
+
+    def __init__(self, endpoint, token, batch_endpoint=None, pool_size=10, connect_timeout=2.0,
+                 read_timeout=5.0, failure_threshold=5, reset_timeout=30.0, observe=None):
+        self.endpoint = endpoint
+        self.observe = observe
+        self.batch_endpoint = batch_endpoint
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self._session = requests.Session()
+        self._session.mount('http://', self._adapter)
+        self._session.mount('https://', self._adapter)
+        self._session.headers.update({
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        })
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'failures': 0}
+
+    def send(self, payload):
+        """Deliver one notification to /notify under the id of the request that queued it; raises on failure"""
+        request_id = payload.get('request_id')
+        self._post(self.endpoint, payload, headers={'X-Request-ID': request_id} if request_id else None)
+
+    def send_batch(self, payloads):
+        """Deliver notifications to /notify/batch; returns per-item errors (None = delivered)"""
+        response = self._post(self.batch_endpoint, payloads)
+        return [
+            PermanentDeliveryError(result.get('message', 'rejected')) if result['status'] == 'error' else None
+            for result in response.json()['results']
+        ]
+
+    def _post(self, url, body, headers=None):
+        if not url:
+            raise PermanentDeliveryError('CRM endpoint is not configured')
+        if not self.breaker.allow():
+            raise CircuitOpenError('CRM circuit breaker is open', retry_after=self.breaker.retry_after())
+        with self._stats_lock:
+            self._stats['requests'] += 1
+        operation = 'batch' if url == self.batch_endpoint else 'notify'
+        started = time.perf_counter()
+        try:
+            response = self._session.post(url, json=body, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            self._observe(operation, started, 'error')
+            self._record_failure()
+            raise
+        # Retryable failures count against the breaker; rejections that retrying cannot fix do not
+        if response.status_code in (401, 403, 408, 429) or response.status_code >= 500:
+            self._observe(operation, started, 'error')
+            self._record_failure()
+            raise RuntimeError(f"CRM notification failed: {response.status_code}")
+        self.breaker.record_success()
+        if response.status_code != 200:
+            self._observe(operation, started, 'rejected')
+            raise PermanentDeliveryError(f"CRM rejected notification: {response.status_code}")
+        self._observe(operation, started, 'ok')
+        return response
+
+    def _observe(self, operation, started, outcome):
+        if self.observe is not None:
+            self.observe(operation, time.perf_counter() - started, outcome)
+
+    def _record_failure(self):
+        self.breaker.record_failure()
+        with self._stats_lock:
+            self._stats['failures'] += 1
+
+    def metrics(self):
+        pools = []
+        manager = self._adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            # Empty slots in urllib3's pool queue are None placeholders
+            idle = [conn for conn in list(pool.pool.queue) if conn is not None] if pool.pool is not None else []
+            pools.append({
+                'host': f'{pool.scheme}://{pool.host}:{pool.port}',
+                'maxsize': pool.pool.maxsize if pool.pool is not None else 0,
+                'idle_connections': len(idle),
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests
+            })
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['breaker'] = self.breaker.metrics()
+        stats['pools'] = pools
+        return stats
+
+    def close(self):
+        self._session.close()
@@ -0,0 +1,150 @@
+"""Idempotency-Key support for state-changing endpoints.
+
+The first request with a given key (per user) records a placeholder row and
+runs; its response is then stored on the row. A retry with the same key and
+the same request replays the stored response without running the handler
+again, a retry while the first request is still running gets 409, and
+reusing a key for a different request gets 422. Server errors (5xx) are not
+stored, so the client can retry them. The placeholder is leased for
+`lock_timeout` seconds: if the process dies mid-request, a retry after the
+lease takes over. Rows expire after `ttl` seconds.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint():
+    """SHA-256 of the method, path and (canonical JSON) body of the current request"""
+    body = request.get_json(silent=True)
+    body = json.dumps(body, sort_keys=True) if body is not None else request.get_data(as_text=True)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Replays stored responses for repeated Idempotency-Key requests; `guard` decorates a view"""
+
+    def __init__(self, db, model, identity, ttl=86400, lock_timeout=30):
+        self.db = db
+        self.model = model
+        self.identity = identity
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+
+    def guard(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return view(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return jsonify({'message': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}), 400
+            user_id = self.identity()
+            outcome = self.begin(user_id, key, request_fingerprint())
+            if outcome is not None:
+                return outcome
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except Exception:
+                self.release(user_id, key)
+                raise
+            if response.status_code >= 500:
+                self.release(user_id, key)
+            else:
+                self.complete(user_id, key, response)
+            return response
+        return wrapper
+
+    def begin(self, user_id, key, fingerprint):
+        """Claim the key for this request (None) or return the response a retry gets instead"""
+        model = self.model
+        session = self.db.session
+        now = datetime.utcnow()
+        for _ in range(2):
+            row = session.get(model, (user_id, key))
+            if row is not None and row.expires_at <= now:
+                session.delete(row)
+                session.flush()
+                row = None
+            if row is None:
+                session.add(model(user_id=user_id, key=key, fingerprint=fingerprint,
+                                  locked_until=now + timedelta(seconds=self.lock_timeout),
+                                  expires_at=now + timedelta(seconds=self.ttl)))
+                try:
+                    session.commit()
+                    return None
+                except IntegrityError:
+                    # A concurrent request with the same key got there first
+                    session.rollback()
+                    continue
+            if row.fingerprint != fingerprint:
+                session.rollback()
+                return jsonify({'message': f'{HEADER} was already used for a different request'}), 422
+            if row.status_code is not None:
+                response = current_app.response_class(row.response_body, status=row.status_code,
+                                                      mimetype='application/json')
+                session.rollback()
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if row.locked_until <= now and self._take_over(row, now):
+                return None
+            session.rollback()
+            response = jsonify({'message': f'A request with this {HEADER} is still in progress'})
+            response.headers['Retry-After'] = '1'
+            return response, 409
+        response = jsonify({'message': f'A request with this {HEADER} is still in progress'})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+
+    def _take_over(self, row, now):
+        """Re-lease a placeholder whose request died; only one retry wins"""
+        model = self.model
+        claimed = self.db.session.execute(
+            update(model)
+            .where(model.user_id == row.user_id, model.key == row.key,
+                   model.status_code.is_(None), model.locked_until == row.locked_until)
+            .values(locked_until=now + timedelta(seconds=self.lock_timeout))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.db.session.commit()
+        return claimed == 1
+
+    def complete(self, user_id, key, response):
+        model = self.model
+        self.db.session.rollback()
+        self.db.session.execute(
+            update(model)
+            .where(model.user_id == user_id, model.key == key)
+            .values(status_code=response.status_code, response_body=response.get_data(as_text=True))
+            .execution_options(synchronize_session=False)
+        )
+        self.db.session.commit()
+
+    def release(self, user_id, key):
+        """Forget an in-flight key so the client may retry the request"""
+        model = self.model
+        self.db.session.rollback()
+        self.db.session.execute(
+            delete(model)
+            .where(model.user_id == user_id, model.key == key, model.status_code.is_(None))
+            .execution_options(synchronize_session=False)
+        )
+        self.db.session.commit()
+
+    def purge_expired(self):
+        model = self.model
+        deleted = self.db.session.execute(
+            delete(model)
+            .where(model.expires_at <= datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.db.session.commit()
+        return deleted
@@ -0,0 +1,66 @@
+"""Schema migrations for the main application database (see common.migrations)."""
+from sqlalchemy import text
+
+from common.migrations import Migration, add_column, create_indexes, create_missing_tables
+from main_app.analytics import Rollups
+
+
+def add_event_seats_taken(connection, metadata):
+    if add_column(connection, metadata, 'event', 'seats_taken'):
+        connection.execute(text(
+            "UPDATE event SET seats_taken = ("
+            "SELECT COUNT(*) FROM booking "
+            "WHERE booking.event_id = event.id AND booking.status = 'confirmed')"
+        ))
+
+
+def add_booking_active_unique(connection, metadata):
+    create_indexes(connection, metadata, 'uq_booking_active_user_event')
+
+
+def add_hot_path_indexes(connection, metadata):
+    create_indexes(
+        connection, metadata,
+        'ix_event_active_date_time',
+        'ix_event_facilitator_date_time',
+        'ix_booking_user_booking_date',
+        'ix_booking_event_booking_date',
+        'ix_booking_event_status',
+        'ix_crm_outbox_status_next_attempt'
+    )
+
+
+def widen_password_hash(connection, metadata):
+    # scrypt and pbkdf2 hashes are longer than the original VARCHAR(128); SQLite ignores the length
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('ALTER TABLE "user" ALTER COLUMN password_hash TYPE VARCHAR(255)'))
+    elif connection.dialect.name == 'mysql':
+        connection.execute(text('ALTER TABLE user MODIFY password_hash VARCHAR(255)'))
+
+
+def add_event_updated_at(connection, metadata):
+    # Existing rows keep NULL until they next change; the search index loads them on its full builds
+    add_column(connection, metadata, 'event', 'updated_at')
+    create_indexes(connection, metadata, 'ix_event_updated_at')
+
+
+def add_analytics_rollups(connection, metadata):
+    create_missing_tables(connection, metadata)
+    # Roll up the existing bookings once; `flask rebuild-analytics` repeats this in batches
+    rollups = Rollups(metadata)
+    facilitator_ids = [row[0] for row in connection.execute(text('SELECT id FROM facilitator ORDER BY id'))]
+    for start in range(0, len(facilitator_ids), 100):
+        rollups.rebuild(connection, facilitator_ids[start:start + 100])
+
+
+MIGRATIONS = [
+    Migration(1, 'initial_schema', create_missing_tables),
+    Migration(2, 'event_seats_taken', add_event_seats_taken),
+    Migration(3, 'booking_active_unique', add_booking_active_unique),
+    Migration(4, 'hot_path_indexes', add_hot_path_indexes),
+    Migration(5, 'password_hash_length', widen_password_hash),
+    Migration(6, 'waitlist', create_missing_tables),
+    Migration(7, 'idempotency_keys', create_missing_tables),
+    Migration(8, 'event_updated_at', add_event_updated_at),
+    Migration(9, 'analytics_rollups', add_analytics_rollups),
+]
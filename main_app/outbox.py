@@ -0,0 +1,252 @@
+"""Transactional outbox delivery for main_app.
+
+Rows are written to the outbox table in the same transaction as the change
+they describe. OutboxDispatcher drains due rows in the background with a
+bounded thread pool, retries failures with exponential backoff and moves rows
+that keep failing to the 'dead' state instead of dropping them. When a
+batch sender is configured, due rows are coalesced into batches so one
+request delivers many notifications. A row whose payload is a JSON array is
+a batch written by a bulk operation: it is delivered in chunks of
+send_batch_size and, if some items fail, only those stay queued for retry.
+A sender that declines to send at all (DeliveryDeferred, e.g. while a circuit
+breaker is open) gets the row back later without using up one of its
+attempts, so an outage longer than the backoff schedule dead-letters nothing.
+"""
+import json
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a sender when retrying cannot succeed (e.g. the receiver rejected the payload)"""
+
+
+class DeliveryDeferred(Exception):
+    """Raised by a sender that did not try to deliver; the row is retried after `retry_after` seconds"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OutboxDispatcher:
+    """Background delivery of outbox rows with bounded concurrency, retries and dead-lettering.
+
+    A row is claimed by pushing its next_attempt_at forward by `lease` seconds
+    with a conditional UPDATE, so several processes can drain the same table
+    without delivering a row twice at the same time. A process that dies mid
+    delivery simply lets the lease expire and the row is retried.
+
+    `send(payload)` delivers one payload and raises on failure. The optional
+    `send_batch(payloads)` delivers a list at once and returns one entry per
+    payload: None when it was delivered, or the exception it failed with.
+    """
+
+    def __init__(self, app, db, model, send, send_batch=None, send_batch_size=100, workers=4,
+                 batch_size=200, poll_interval=1.0, max_attempts=8, backoff_base=2.0,
+                 backoff_max=600.0, lease=60.0):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.send = send
+        self.send_batch = send_batch
+        self.send_batch_size = send_batch_size
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {'delivered': 0, 'retried': 0, 'deferred': 0, 'dead': 0}
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbox-send')
+        self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def wake(self):
+        """Deliver immediately instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                dispatched = self.dispatch_due()
+            except Exception:
+                logger.exception('Outbox dispatch failed')
+                dispatched = 0
+            if not dispatched:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def dispatch_due(self):
+        """Claim and deliver one batch of due rows; returns how many were attempted"""
+        rows = self._claim_batch()
+        if not rows:
+            return 0
+        batches = [row for row in rows if row.payload.startswith('[')]
+        rows = [row for row in rows if not row.payload.startswith('[')]
+        tasks = [(self._deliver_many, row) for row in batches]
+        if self.send_batch is not None:
+            size = self.send_batch_size
+            tasks += [(self._deliver_batch, rows[i:i + size]) for i in range(0, len(rows), size)]
+        else:
+            tasks += [(self._deliver, row) for row in rows]
+        if self._executor is None:
+            for deliver, item in tasks:
+                deliver(item)
+        else:
+            wait([self._executor.submit(deliver, item) for deliver, item in tasks])
+        return len(rows) + len(batches)
+
+    def _claim_batch(self):
+        model = self.model
+        with self.app.app_context():
+            session = self.db.session
+            now = datetime.utcnow()
+            candidates = session.query(
+                model.id, model.payload, model.attempts, model.next_attempt_at
+            ).filter(
+                model.status == 'pending',
+                model.next_attempt_at <= now
+            ).order_by(model.next_attempt_at, model.id).limit(self.batch_size).all()
+
+            lease_until = now + timedelta(seconds=self.lease)
+            claimed = []
+            for row in candidates:
+                result = session.execute(
+                    update(model)
+                    .where(model.id == row.id,
+                           model.status == 'pending',
+                           model.next_attempt_at == row.next_attempt_at)
+                    .values(next_attempt_at=lease_until)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount == 1:
+                    claimed.append(row)
+            session.commit()
+            return claimed
+
+    def _deliver(self, row):
+        try:
+            self.send(json.loads(row.payload))
+        except Exception as e:
+            self._fail(row, e)
+        else:
+            self._mark_delivered([row.id])
+
+    def _deliver_batch(self, rows):
+        try:
+            errors = self.send_batch([json.loads(row.payload) for row in rows])
+        except Exception as e:
+            errors = [e] * len(rows)
+        self._mark_delivered([row.id for row, error in zip(rows, errors) if error is None])
+        for row, error in zip(rows, errors):
+            if error is not None:
+                self._fail(row, error)
+
+    def _deliver_many(self, row):
+        """Deliver a batch row; items that fail are kept in the row for the next attempt"""
+        payloads = json.loads(row.payload)
+        size = self.send_batch_size if self.send_batch is not None else 1
+        failed = []
+        for i in range(0, len(payloads), size):
+            chunk = payloads[i:i + size]
+            try:
+                if self.send_batch is not None:
+                    errors = self.send_batch(chunk)
+                else:
+                    self.send(chunk[0])
+                    errors = [None]
+            except Exception as e:
+                errors = [e] * len(chunk)
+            failed += [(payload, error) for payload, error in zip(chunk, errors) if error is not None]
+        if not failed:
+            self._mark_delivered([row.id])
+            return
+        # Retry while any failure is transient; a batch the CRM rejected outright goes to dead letter.
+        # The attempt only counts when some chunk was actually sent and failed.
+        retryable = [error for _, error in failed if not isinstance(error, PermanentDeliveryError)]
+        attempted = [error for error in retryable if not isinstance(error, DeliveryDeferred)]
+        self._fail(row, (attempted or retryable or [failed[0][1]])[0],
+                   payload=json.dumps([payload for payload, _ in failed]))
+
+    def _fail(self, row, error, **values):
+        if isinstance(error, DeliveryDeferred):
+            delay = max(error.retry_after or 0, self.poll_interval)
+            self._finish(row.id, 'pending', row.attempts, error=str(error), outcome='deferred',
+                         next_attempt_at=datetime.utcnow() + timedelta(seconds=delay), **values)
+            return
+        attempts = row.attempts + 1
+        if isinstance(error, PermanentDeliveryError) or attempts >= self.max_attempts:
+            self._finish(row.id, 'dead', attempts, error=str(error), **values)
+        else:
+            self._finish(row.id, 'pending', attempts, error=str(error),
+                         next_attempt_at=datetime.utcnow() + timedelta(seconds=self.backoff(attempts)), **values)
+
+    def _mark_delivered(self, row_ids):
+        if not row_ids:
+            return
+        model = self.model
+        with self.app.app_context():
+            self.db.session.execute(
+                update(model)
+                .where(model.id.in_(row_ids))
+                .values(status='delivered', attempts=model.attempts + 1, last_error=None,
+                        delivered_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            self.db.session.commit()
+        with self._stats_lock:
+            self._stats['delivered'] += len(row_ids)
+
+    def backoff(self, attempts):
+        """Exponential backoff with jitter, capped at backoff_max seconds"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _finish(self, row_id, status, attempts, error=None, outcome=None, **values):
+        model = self.model
+        with self.app.app_context():
+            self.db.session.execute(
+                update(model)
+                .where(model.id == row_id)
+                .values(status=status, attempts=attempts, last_error=error, **values)
+                .execution_options(synchronize_session=False)
+            )
+            self.db.session.commit()
+        with self._stats_lock:
+            self._stats[outcome or ('dead' if status == 'dead' else 'retried')] += 1
+        if status == 'dead':
+            logger.error('Outbox row moved to dead letter',
+                         extra={'outbox_id': row_id, 'attempts': attempts, 'error': error})
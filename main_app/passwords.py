@@ -0,0 +1,128 @@
+"""Password hashing with a configurable scheme and cost.
+
+Supported schemes:
+    bcrypt  cost = log2 rounds (default 12), via the bcrypt package
+    scrypt  cost = N (default 32768), via werkzeug
+    pbkdf2  cost = iterations (default 600000, SHA-256), via werkzeug
+
+Hashes record their own scheme and parameters, so verification works for any
+stored hash; one whose parameters differ from the configured ones is re-hashed
+on the next successful login. Hashing and verification run in a small process
+pool so bursts of logins do not hold the GIL of the web worker, and a
+semaphore caps how many may be in flight: beyond that, callers get
+PasswordHashingBusy immediately instead of queueing behind the burst.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_COSTS = {'bcrypt': 12, 'scrypt': 32768, 'pbkdf2': 600000}
+
+
+class PasswordHashingBusy(RuntimeError):
+    """Raised when the hashing concurrency cap is reached"""
+
+
+def method_for(scheme, cost):
+    """Parameter prefix a hash made with (scheme, cost) starts with"""
+    if scheme == 'bcrypt':
+        return f'$2b${cost:02d}$'
+    if scheme == 'scrypt':
+        return f'scrypt:{cost}:8:1$'
+    if scheme == 'pbkdf2':
+        return f'pbkdf2:sha256:{cost}$'
+    raise ValueError(f'Unknown password hash scheme: {scheme}')
+
+
+def hash_password(password, scheme, cost):
+    if scheme == 'bcrypt':
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(cost)).decode('ascii')
+    return generate_password_hash(password, method=method_for(scheme, cost).rstrip('$'))
+
+
+def check_password(password, password_hash):
+    if password_hash.startswith('$2'):
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('ascii'))
+    return check_password_hash(password_hash, password)
+
+
+def verify_and_update(password, password_hash, scheme, cost):
+    """(valid, new hash or None); the new hash is set when the stored parameters are outdated"""
+    if not check_password(password, password_hash):
+        return False, None
+    if password_hash.startswith(method_for(scheme, cost)):
+        return True, None
+    return True, hash_password(password, scheme, cost)
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords in a bounded process pool.
+
+    `processes=0` runs the work on the calling thread (still subject to the
+    concurrency cap). The pool is created on first use, so it belongs to the
+    process that serves requests rather than a pre-fork parent.
+    """
+
+    def __init__(self, scheme='scrypt', cost=None, processes=2, max_concurrency=8, acquire_timeout=0.5):
+        self.scheme = scheme
+        self.cost = cost or DEFAULT_COSTS[scheme]
+        method_for(self.scheme, self.cost)
+        self.processes = processes
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected_busy': 0}
+
+    def hash(self, password):
+        new_hash = self._run(hash_password, password, self.scheme, self.cost)
+        self._count('hashed')
+        return new_hash
+
+    def verify(self, password, password_hash):
+        """(valid, new hash or None); store the new hash when it is returned"""
+        valid, new_hash = self._run(verify_and_update, password, password_hash, self.scheme, self.cost)
+        self._count('verified')
+        if new_hash:
+            self._count('rehashed')
+        return valid, new_hash
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._count('rejected_busy')
+            raise PasswordHashingBusy('Too many password checks in progress')
+        try:
+            if not self.processes:
+                return function(*args)
+            return self._executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # forkserver: workers start from a clean process, not a fork of a threaded web worker
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+            return self._pool
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(scheme=self.scheme, cost=self.cost, processes=self.processes)
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
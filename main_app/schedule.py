@@ -0,0 +1,273 @@
+"""Facilitator schedule-conflict detection.
+
+IntervalTree is a randomized balanced search tree (a treap) of half-open
+intervals [start, end), ordered by start. Every node also records the latest
+end in its subtree, so a lookup skips whole subtrees that finish before the
+probe begins. Finding whether an interval overlaps anything takes O(log n);
+listing every overlap takes O(log n + k). Inserts and removals take O(log n).
+
+ScheduleConflicts keeps one tree per facilitator_id of that facilitator's
+active events, built on first use. Before each check it reloads the events
+whose updated_at moved since the last check, so edits made by other workers
+are seen too. After STALE_AFTER without checks it drops its trees and builds
+them again rather than replaying a long backlog. A check therefore costs
+O(log n) per proposed event, plus the rows changed since the previous check.
+
+Checks are only as strong as the write path around them: callers take the
+facilitator's row lock (SELECT ... FOR UPDATE) before checking and hold it
+until they commit, so two concurrent edits of one schedule cannot both pass.
+"""
+import heapq
+import random
+import threading
+from datetime import datetime, timedelta
+
+# Changes committed shortly before a poll may carry an earlier updated_at than rows already seen
+CHANGE_OVERLAP = timedelta(seconds=5)
+# Idle longer than this, the trees are rebuilt instead of replaying the change feed
+STALE_AFTER = timedelta(minutes=10)
+
+
+class _Node:
+    __slots__ = ('start', 'end', 'key', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, start, end, key, priority):
+        self.start = start
+        self.end = end
+        self.key = key
+        self.priority = priority
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+
+def _update(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+class IntervalTree:
+    """Intervals [start, end) identified by a unique key (an event id)"""
+
+    def __init__(self, intervals=(), seed=None):
+        self._root = None
+        self._random = random.Random(seed)
+        self._size = 0
+        for start, end, key in intervals:
+            self.insert(start, end, key)
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, start, end, key):
+        self._root = self._insert(self._root, _Node(start, end, key, self._random.random()))
+        self._size += 1
+
+    def _insert(self, node, new):
+        if node is None:
+            return new
+        if (new.start, new.key) < (node.start, node.key):
+            node.left = self._insert(node.left, new)
+            if node.left.priority > node.priority:
+                return _rotate_right(node)
+        else:
+            node.right = self._insert(node.right, new)
+            if node.right.priority > node.priority:
+                return _rotate_left(node)
+        _update(node)
+        return node
+
+    def remove(self, start, key):
+        """Remove the interval inserted with (start, key); False when it is not there"""
+        size = self._size
+        self._root = self._remove(self._root, (start, key))
+        return self._size < size
+
+    def _remove(self, node, target):
+        if node is None:
+            return None
+        current = (node.start, node.key)
+        if target < current:
+            node.left = self._remove(node.left, target)
+        elif target > current:
+            node.right = self._remove(node.right, target)
+        else:
+            if node.left is None:
+                self._size -= 1
+                return node.right
+            if node.right is None:
+                self._size -= 1
+                return node.left
+            # Rotate the node down towards a leaf, keeping the heap order of priorities
+            if node.left.priority > node.right.priority:
+                node = _rotate_right(node)
+                node.right = self._remove(node.right, target)
+            else:
+                node = _rotate_left(node)
+                node.left = self._remove(node.left, target)
+        _update(node)
+        return node
+
+    def overlaps_any(self, start, end, exclude=()):
+        """Whether any interval other than those keyed in `exclude` overlaps [start, end)"""
+        if not exclude:
+            # CLRS interval search: one root-to-leaf walk
+            node = self._root
+            while node is not None:
+                if node.start < end and node.end > start:
+                    return True
+                node = node.left if node.left is not None and node.left.max_end > start else node.right
+            return False
+        return any(key not in exclude for _, _, key in self.overlapping(start, end))
+
+    def overlapping(self, start, end):
+        """(start, end, key) of every interval overlapping [start, end), in start order"""
+        found = []
+        stack = []
+        node = self._root
+        # In-order walk that skips subtrees ending before `start` and nodes starting at or after `end`
+        while stack or node is not None:
+            while node is not None and node.max_end > start:
+                stack.append(node)
+                node = node.left
+            if not stack:
+                break
+            node = stack.pop()
+            if node.start >= end:
+                break
+            if node.end > start:
+                found.append((node.start, node.end, node.key))
+            node = node.right
+        return found
+
+
+def overlap_groups(intervals):
+    """{key: [keys of the other intervals overlapping it]} for (start, end, key) intervals, by a sweep"""
+    overlaps = {}
+    active = []  # min-heap of (end, sequence, key) for intervals started and not yet ended
+    for sequence, (start, end, key) in enumerate(sorted(intervals, key=lambda interval: interval[:2])):
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            overlaps.setdefault(key, []).append(other)
+            overlaps.setdefault(other, []).append(key)
+        heapq.heappush(active, (end, sequence, key))
+    return overlaps
+
+
+def event_interval(date_time, duration):
+    """[start, end) of an event; one without a duration still occupies its starting minute"""
+    return date_time, date_time + timedelta(minutes=max(duration or 0, 1))
+
+
+class ScheduleConflicts:
+    """Per-facilitator interval trees of active events, kept current from the updated_at change feed.
+
+    `load_events(facilitator_id)` returns (id, date_time, duration) rows for
+    the facilitator's active events. `load_changes(changed_since)` returns
+    (id, facilitator_id, date_time, duration, is_active) rows for every event
+    whose updated_at is at or after `changed_since`.
+    """
+
+    def __init__(self, load_events, load_changes):
+        self.load_events = load_events
+        self.load_changes = load_changes
+        self._lock = threading.Lock()
+        self._trees = {}  # facilitator_id -> IntervalTree
+        self._events = {}  # event id -> (facilitator_id, start) of loaded trees
+        self._since = None
+        self._stats = {'checks': 0, 'conflicts': 0, 'trees_built': 0, 'reloaded': 0}
+
+    def _refresh(self):
+        started = datetime.utcnow()
+        if self._since is None or started - self._since > STALE_AFTER:
+            self._trees.clear()
+            self._events.clear()
+        else:
+            rows = self.load_changes(self._since)
+            for row in rows:
+                self._apply(row)
+            self._stats['reloaded'] += len(rows)
+        self._since = started - CHANGE_OVERLAP
+
+    def _apply(self, row):
+        previous = self._events.pop(row.id, None)
+        if previous is not None:
+            self._trees[previous[0]].remove(previous[1], row.id)
+        tree = self._trees.get(row.facilitator_id)
+        if tree is not None and row.is_active:
+            start, end = event_interval(row.date_time, row.duration)
+            tree.insert(start, end, row.id)
+            self._events[row.id] = (row.facilitator_id, start)
+
+    def _tree(self, facilitator_id):
+        tree = self._trees.get(facilitator_id)
+        if tree is None:
+            rows = self.load_events(facilitator_id)
+            tree = IntervalTree()
+            for row in rows:
+                start, end = event_interval(row.date_time, row.duration)
+                tree.insert(start, end, row.id)
+                self._events[row.id] = (facilitator_id, start)
+            self._trees[facilitator_id] = tree
+            self._stats['trees_built'] += 1
+        return tree
+
+    def check(self, proposals):
+        """Conflicts for proposed events, each {'facilitator_id', 'start', 'end'} plus 'id' when it
+        moves an existing event.
+
+        Returns one list per proposal of its conflicts: {'event_id', 'start', 'end'} for
+        scheduled events (other than those the proposals move) and {'index', 'start', 'end'}
+        for other proposals.
+        """
+        results = [[] for _ in proposals]
+        by_facilitator = {}
+        for index, proposal in enumerate(proposals):
+            by_facilitator.setdefault(proposal['facilitator_id'], []).append(index)
+        # Checks only run on schedule writes: one at a time per process keeps the trees and the change feed in step
+        with self._lock:
+            self._refresh()
+            for facilitator_id, indexes in by_facilitator.items():
+                tree = self._tree(facilitator_id)
+                moved = {proposals[index]['id'] for index in indexes if proposals[index].get('id') is not None}
+                for index in indexes:
+                    proposal = proposals[index]
+                    if not moved and not tree.overlaps_any(proposal['start'], proposal['end']):
+                        continue
+                    results[index] += [{'event_id': key, 'start': start, 'end': end}
+                                       for start, end, key in tree.overlapping(proposal['start'], proposal['end'])
+                                       if key not in moved]
+                overlapping = overlap_groups([(proposals[index]['start'], proposals[index]['end'], index)
+                                              for index in indexes])
+                for index, others in overlapping.items():
+                    results[index] += [{'index': other, 'start': proposals[other]['start'],
+                                        'end': proposals[other]['end']} for other in sorted(others)]
+            self._stats['checks'] += len(proposals)
+            self._stats['conflicts'] += sum(1 for conflicts in results if conflicts)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, facilitators_loaded=len(self._trees), events_loaded=len(self._events))
@@ -0,0 +1,324 @@
+"""In-memory availability search over upcoming events.
+
+EventIndex keeps every active, upcoming event as an interval
+[date_time, date_time + duration]. The intervals are held in lists sorted by
+start time, by price and by free seats. A search walks the list matching its
+sort order, tests each event against the filters (window, type, price,
+duration, facilitator specialization, free seats) and stops as soon as the
+requested page is settled, so a page costs about the same whatever the size
+of the catalogue:
+
+    date_time        walk by start from the window's start; stop after the page
+    rank             walk by start, keeping the best scores; stop once no later
+                     event can score higher (see relevance())
+    price, available_spots
+                     narrow windows: rank the window's events by bisecting the
+                     start list; wide ones: walk the price / free-seat list
+
+The index is built on first use from `load()` and then kept current incrementally:
+- Events this process changed (mark_changed) are reloaded before the next search.
+- Every `refresh_interval` seconds, events whose updated_at moved are reloaded.
+  updated_at moves on every seat change too, which covers other workers.
+- A full rebuild every `rebuild_interval` seconds drops events that have started
+  and repairs anything missed.
+
+Seat counts in the index are therefore at most `refresh_interval` seconds old
+for changes made by other workers. Callers refresh the page they return from
+live counts.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Changes committed shortly before a poll may carry an earlier updated_at than rows already seen
+CHANGE_OVERLAP = timedelta(seconds=5)
+# Windows holding at most this many events are ranked in full for the price and seat sorts
+WINDOW_SCAN_LIMIT = 2000
+
+SORTS = ('rank', 'date_time', 'price', 'available_spots')
+
+IndexedEvent = namedtuple('IndexedEvent', [
+    'id', 'start', 'end', 'duration', 'price', 'event_type', 'title', 'max_participants', 'seats_taken',
+    'facilitator_id', 'facilitator_name', 'specialization', 'specialization_key'
+])
+
+
+def indexed_event(row):
+    """IndexedEvent from a row with the columns load() selects"""
+    duration = row.duration or 0
+    return IndexedEvent(
+        row.id, row.date_time, row.date_time + timedelta(minutes=duration), duration, row.price or 0.0,
+        row.event_type, row.title, row.max_participants or 0, row.seats_taken, row.facilitator_id,
+        row.facilitator_name, row.specialization, (row.specialization or '').lower())
+
+
+def partition(entry):
+    return entry.event_type, entry.specialization_key
+
+
+def start_key(entry):
+    return entry.start, entry.id
+
+
+def price_key(entry):
+    return entry.price, entry.start, entry.id
+
+
+def spots_key(entry):
+    return entry.seats_taken - entry.max_participants, entry.start, entry.id
+
+
+SORT_KEYS = {'date_time': start_key, 'price': price_key, 'available_spots': spots_key}
+
+
+class SortedEntries:
+    """Entries kept in `key` order, with parallel keys for bisecting"""
+
+    def __init__(self, key, entries):
+        self.key = key
+        self.entries = sorted(entries, key=key)
+        self.keys = [key(entry) for entry in self.entries]
+
+    def insert(self, entry):
+        key = self.key(entry)
+        position = bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.entries.insert(position, entry)
+
+    def remove(self, entry):
+        position = bisect_left(self.keys, self.key(entry))
+        del self.keys[position]
+        del self.entries[position]
+
+    def replace(self, old, new):
+        key = self.key(new)
+        if key == self.key(old):
+            # Same place in the order (e.g. only the seats changed): swap without moving the list
+            self.entries[bisect_left(self.keys, key)] = new
+        else:
+            self.remove(old)
+            self.insert(new)
+
+    def position(self, key):
+        return bisect_left(self.keys, key)
+
+
+class IntervalIndex:
+    """Event intervals sorted by start, price and free seats; updates are O(log n) bisects plus list moves.
+
+    The start order is also kept per (event_type, specialization), so searches
+    filtering on those walk only the matching events.
+    """
+
+    def __init__(self, entries=()):
+        entries = list(entries)
+        self._by_id = {entry.id: entry for entry in entries}
+        self.orders = {sort: SortedEntries(key, entries) for sort, key in SORT_KEYS.items()}
+        groups = {}
+        for entry in entries:
+            groups.setdefault(partition(entry), []).append(entry)
+        self.partitions = {name: SortedEntries(start_key, group) for name, group in groups.items()}
+        # Never lowered on removal: over-estimates only widen overlap scans and soften price scores
+        self.max_duration = max((entry.duration for entry in entries), default=0)
+        self.max_price = max((entry.price for entry in entries), default=0)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, event_id):
+        return self._by_id.get(event_id)
+
+    def add(self, entry):
+        """Insert an event or replace the indexed version of it"""
+        old = self._by_id.get(entry.id)
+        if old is not None and partition(old) != partition(entry):
+            self.discard(entry.id)
+            old = None
+        self._by_id[entry.id] = entry
+        name = partition(entry)
+        if name not in self.partitions:
+            self.partitions[name] = SortedEntries(start_key, ())
+        for order in [*self.orders.values(), self.partitions[name]]:
+            if old is None:
+                order.insert(entry)
+            else:
+                order.replace(old, entry)
+        self.max_duration = max(self.max_duration, entry.duration)
+        self.max_price = max(self.max_price, entry.price)
+
+    def discard(self, event_id):
+        entry = self._by_id.pop(event_id, None)
+        if entry is not None:
+            for order in self.orders.values():
+                order.remove(entry)
+            self.partitions[partition(entry)].remove(entry)
+
+    def starting(self, start, end, event_type=None, specialization=None):
+        """Entries starting in [start, end) in start order, only from the matching partitions"""
+        if event_type is None and specialization is None:
+            orders = [self.orders['date_time']]
+        else:
+            orders = [order for (kind, key), order in self.partitions.items()
+                      if (event_type is None or kind == event_type)
+                      and (specialization is None or specialization in key)]
+        slices = [order.entries[order.position((start, 0)):order.position((end, 0))] for order in orders]
+        if len(slices) == 1:
+            return slices[0]
+        return list(heapq.merge(*slices, key=start_key))
+
+
+def relevance(entry, start, span, price_ceiling):
+    """0..1: half for starting early in the window, 0.3 for price, 0.2 for the share of seats still free"""
+    soon = 1 - min(max((entry.start - start).total_seconds() / span, 0), 1)
+    cheap = 1 - entry.price / price_ceiling if price_ceiling else 1
+    free = max(entry.max_participants - entry.seats_taken, 0) / entry.max_participants if entry.max_participants else 0
+    return 0.5 * soon + 0.3 * cheap + 0.2 * free
+
+
+class EventIndex:
+    """Thread-safe, incrementally refreshed IntervalIndex of bookable events.
+
+    `load(changed_since=None, ids=())` returns rows with the IndexedEvent
+    columns plus is_active and updated_at. With changed_since=None it returns
+    every active upcoming event; otherwise the events changed since then and
+    those listed in `ids`.
+    """
+
+    def __init__(self, load, refresh_interval=2, rebuild_interval=3600):
+        self.load = load
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._index = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._changed = set()
+        self._built_at = None
+        self._polled_at = None
+        self._since = None
+        self._stats = {'rebuilds': 0, 'refreshes': 0, 'reloaded': 0}
+
+    def mark_changed(self, *event_ids):
+        """Reload these events before the next search (changes committed by this process)"""
+        with self._lock:
+            self._changed.update(event_ids)
+
+    def refresh(self):
+        clock = time.monotonic()
+        built = self._built_at is not None
+        if built and not self._changed and clock - self._polled_at < self.refresh_interval:
+            return
+        # Searches keep using the current index while one thread refreshes; only the first build waits
+        if not self._refresh_lock.acquire(blocking=not built):
+            return
+        try:
+            if self._built_at is None or clock - self._built_at >= self.rebuild_interval:
+                self._rebuild()
+            elif self._changed or time.monotonic() - self._polled_at >= self.refresh_interval:
+                self._update()
+        finally:
+            self._refresh_lock.release()
+
+    def _rebuild(self):
+        started = datetime.utcnow()
+        with self._lock:
+            self._changed.clear()
+        index = IntervalIndex(indexed_event(row) for row in self.load())
+        with self._lock:
+            self._index = index
+            self._since = started - CHANGE_OVERLAP
+            self._built_at = self._polled_at = time.monotonic()
+            self._stats['rebuilds'] += 1
+
+    def _update(self):
+        started = datetime.utcnow()
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        rows = self.load(changed_since=self._since, ids=sorted(changed))
+        with self._lock:
+            for row in rows:
+                if row.is_active and row.date_time > started:
+                    self._index.add(indexed_event(row))
+                else:
+                    self._index.discard(row.id)
+            self._since = started - CHANGE_OVERLAP
+            self._polled_at = time.monotonic()
+            self._stats['refreshes'] += 1
+            self._stats['reloaded'] += len(rows)
+
+    def search(self, start, end, overlap=False, event_type=None, specialization=None, min_price=None,
+               max_price=None, min_duration=None, max_duration=None, min_spots=1, sort='rank',
+               offset=0, limit=50):
+        """(page of IndexedEvents, whether more follow) for the events matching every given filter"""
+        self.refresh()
+        now = datetime.utcnow()
+        specialization = specialization.lower() if specialization else None
+
+        def matches(entry):
+            return (entry.start > now
+                    and (entry.end > start if overlap else entry.start >= start and entry.end <= end)
+                    and entry.start < end
+                    and (event_type is None or entry.event_type == event_type)
+                    and (min_price is None or entry.price >= min_price)
+                    and (max_price is None or entry.price <= max_price)
+                    and (min_duration is None or entry.duration >= min_duration)
+                    and (max_duration is None or entry.duration <= max_duration)
+                    and entry.max_participants - entry.seats_taken >= min_spots
+                    and (specialization is None or specialization in entry.specialization_key))
+
+        # One extra result tells whether another page follows
+        wanted = offset + limit + 1
+        with self._lock:
+            index = self._index
+            first = max(start, now) if not overlap else start - timedelta(minutes=index.max_duration)
+            window = index.starting(first, end, event_type, specialization)
+            if sort == 'rank':
+                found = self._best_ranked(window, matches, start, end, max_price or index.max_price, wanted)
+            elif sort == 'date_time':
+                found = self._first(window, matches, wanted)
+            elif len(window) <= WINDOW_SCAN_LIMIT:
+                found = heapq.nsmallest(wanted, filter(matches, window), key=SORT_KEYS[sort])
+            else:
+                found = self._first(index.orders[sort].entries, matches, wanted)
+        return found[offset:wanted - 1], len(found) == wanted
+
+    @staticmethod
+    def _first(entries, matches, wanted):
+        found = []
+        for entry in entries:
+            if matches(entry):
+                found.append(entry)
+                if len(found) == wanted:
+                    break
+        return found
+
+    @staticmethod
+    def _best_ranked(window, matches, start, end, price_ceiling, wanted):
+        """Top `wanted` by relevance, walking in start order until later starts cannot catch up"""
+        span = (end - start).total_seconds() or 1
+        best = []  # min-heap of (score, -position, entry): best[0] is the weakest kept
+        stop_at = None
+        for position, entry in enumerate(window):
+            if stop_at is not None and entry.start > stop_at:
+                break
+            if not matches(entry):
+                continue
+            item = (relevance(entry, start, span, price_ceiling), -position, entry)
+            if len(best) < wanted:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)
+            else:
+                continue
+            weakest = best[0][0]
+            if len(best) == wanted and weakest >= 0.5:
+                # Price and seats add at most 0.5 and `soon` only falls: past stop_at nothing can beat the weakest
+                stop_at = start + timedelta(seconds=(2 - 2 * weakest) * span)
+        return [entry for _, _, entry in sorted(best, reverse=True)]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, events=len(self._index) if self._index is not None else 0,
+                        pending_changes=len(self._changed))
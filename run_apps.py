@@ -1,30 +1,125 @@
+"""Start the booking system: main app and CRM app.
+
+By default each app runs under its own Gunicorn master (its own process group)
+with several worker processes and threads per worker, so throughput scales
+with cores. The database schema is migrated once here, before any worker
+starts. SIGTERM/SIGINT are forwarded to both masters, which stop accepting
+connections and let in-flight requests finish within GRACEFUL_TIMEOUT.
+
+    python run_apps.py               # migrate, then serve both apps
+    python run_apps.py --skip-init   # serve only (schema handled by a release step)
+    python run_apps.py --init-only   # migrate and exit (release step)
+    python run_apps.py --dev         # Flask development servers (also used on Windows)
+"""
+import argparse
+import multiprocessing
 import os
+import signal
+import subprocess
 import sys
-from threading import Thread
-from main_app.app import app as main_app
-from crm_app.crm_app import app as crm_app
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+GUNICORN_CONFIG = os.path.join(PROJECT_ROOT, 'gunicorn.conf.py')
 
 def initialize_database():
-    """Initialize the database"""
+    """Create or upgrade both schemas and load sample data once per deploy"""
     print("Initializing database...")
-    import subprocess
-    subprocess.run([sys.executable, 'init_db.py'])
+    subprocess.run([sys.executable, 'init_db.py'], cwd=PROJECT_ROOT, check=True)
 
-def run_crm_app():
-    """Run CRM app on port 5001"""
-    crm_app.run(host='0.0.0.0', port=5001, debug=False)
+def gunicorn_command(name, app_path, port, workers, threads):
+    return [
+        sys.executable, '-m', 'gunicorn',
+        '--config', GUNICORN_CONFIG,
+        '--name', name,
+        '--bind', f'0.0.0.0:{port}',
+        '--workers', str(workers),
+        '--threads', str(threads),
+        app_path
+    ]
 
-if __name__ == '__main__':
-    print("Starting Booking System...")
-    
-    # Initialize database
-    initialize_database()
-    
-    # Start CRM app in background thread
-    crm_thread = Thread(target=run_crm_app)
+def serve(commands):
+    """Run one Gunicorn master per app until a signal arrives or one of them exits"""
+    processes = [
+        subprocess.Popen(command, cwd=PROJECT_ROOT, start_new_session=True)
+        for command in commands
+    ]
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    exit_code = 0
+    while not stopping:
+        exited = [process for process in processes if process.poll() is not None]
+        if exited:
+            exit_code = exited[0].returncode or 1
+            print(f"{exited[0].args[-1]} exited with code {exited[0].returncode}; shutting down")
+            break
+        time.sleep(0.5)
+
+    # Graceful stop for every process group, then a hard kill for anything left
+    for process in processes:
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGTERM)
+    deadline = time.monotonic() + int(os.getenv('GRACEFUL_TIMEOUT', 30)) + 5
+    for process in processes:
+        try:
+            process.wait(timeout=max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+    return exit_code
+
+def run_dev_servers():
+    """Flask development servers in one process (Windows / local debugging)"""
+    from threading import Thread
+    from main_app.app import app as main_app, crm_dispatcher
+    from crm_app.crm_app import app as crm_app
+
+    crm_thread = Thread(target=lambda: crm_app.run(host='0.0.0.0', port=int(os.environ.get('CRM_PORT', 5001)), debug=False))
     crm_thread.daemon = True
     crm_thread.start()
-    
-    # Run main app on Railway's PORT
-    port = int(os.environ.get('PORT', 5000))
-    main_app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+
+    # Deliver queued CRM notifications in the background
+    crm_dispatcher.start()
+
+    main_app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=False)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Start the main app and the CRM app")
+    parser.add_argument('--skip-init', action='store_true', help="do not migrate the database before starting")
+    parser.add_argument('--init-only', action='store_true', help="migrate the database and exit")
+    parser.add_argument('--dev', action='store_true', help="use the Flask development servers")
+    args = parser.parse_args()
+
+    print("Starting Booking System...")
+
+    if not args.skip_init:
+        initialize_database()
+    if args.init_only:
+        sys.exit(0)
+
+    if args.dev or os.name == 'nt':
+        run_dev_servers()
+        sys.exit(0)
+
+    cores = multiprocessing.cpu_count()
+    sys.exit(serve([
+        gunicorn_command(
+            'main_app', 'main_app.app:app',
+            port=int(os.environ.get('PORT', 5000)),
+            workers=int(os.environ.get('MAIN_WORKERS', os.environ.get('WEB_CONCURRENCY', cores * 2 + 1))),
+            threads=int(os.environ.get('MAIN_THREADS', 4))
+        ),
+        gunicorn_command(
+            'crm_app', 'crm_app.crm_app:app',
+            port=int(os.environ.get('CRM_PORT', 5001)),
+            # Each open dashboard stream holds a thread, so the CRM favours threads over processes
+            workers=int(os.environ.get('CRM_WORKERS', 2)),
+            threads=int(os.environ.get('CRM_THREADS', 16))
+        )
+    ]))
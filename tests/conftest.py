@@ -0,0 +1,133 @@
+"""Shared fixtures for the regression tests.
+
+Both apps read their configuration from environment variables at import
+time. The `main` and `crm` fixtures therefore set a test environment once
+(temporary SQLite databases, no CRM delivery, quiet logs) before importing
+them, and `client` / `crm_client` give each test empty tables and fresh
+per-process caches and rate limits.
+
+The checks in benchmarks/ configure the apps themselves, so each one runs in
+its own interpreter with the environment the test run started with. Set
+TEST_DATABASE_URL (and TEST_CRM_DATABASE_URL) to run everything against
+throwaway PostgreSQL databases instead of SQLite files.
+"""
+import atexit
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+# Taken before the fixtures below configure the apps through os.environ
+BENCHMARK_ENV = dict(os.environ)
+
+
+@pytest.fixture(scope='session')
+def test_environment(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('apps')
+    os.environ.update({
+        'DATABASE_URL': os.getenv('TEST_DATABASE_URL') or f'sqlite:///{workdir}/main.db',
+        'CRM_DATABASE_URL': os.getenv('TEST_CRM_DATABASE_URL') or f'sqlite:///{workdir}/crm.db',
+        'JWT_SECRET_KEY': 'test-jwt-secret-key-long-enough-for-hs256',
+        'CRM_ENDPOINT': '',
+        'TRUSTED_PROXIES': '1',
+        'PASSWORD_HASH_SCHEME': 'pbkdf2',
+        'PASSWORD_HASH_COST': '1000',
+        'PASSWORD_HASH_PROCESSES': '0',
+        'LOG_LEVEL': 'WARNING',
+    })
+
+
+def stop_logging(pipeline):
+    # The log writer holds pytest's captured stdout, which is closed before atexit handlers run
+    pipeline.stop()
+    atexit.unregister(pipeline.stop)
+
+
+@pytest.fixture(scope='session')
+def main(test_environment):
+    """The main_app.app module"""
+    from main_app import app as main
+    yield main
+    stop_logging(main.log_pipeline)
+
+
+@pytest.fixture(scope='session')
+def crm(test_environment):
+    """The crm_app.crm_app module"""
+    from crm_app import crm_app
+    yield crm_app
+    stop_logging(crm_app.log_pipeline)
+
+
+@pytest.fixture
+def client(main, monkeypatch):
+    """Test client of the main app over empty tables"""
+    from common.ratelimit import MemoryBuckets
+    from main_app.cache import Cache, MemoryBackend
+    from main_app.schedule import ScheduleConflicts
+    from main_app.search import EventIndex
+
+    with main.app.app_context():
+        main.db.drop_all()
+        main.db.create_all()
+    monkeypatch.setattr(main.rate_limiter, 'backend', MemoryBuckets())
+    monkeypatch.setattr(main, 'event_cache', Cache(MemoryBackend(), ttl=main.app.config['CACHE_TTL']))
+    monkeypatch.setattr(main, 'event_index', EventIndex(main.load_search_rows))
+    monkeypatch.setattr(main, 'schedule_conflicts',
+                        ScheduleConflicts(main.load_schedule_rows, main.load_schedule_changes))
+    return main.app.test_client()
+
+
+@pytest.fixture
+def crm_client(crm, monkeypatch):
+    """Test client of the CRM app over empty tables"""
+    from common.ratelimit import MemoryBuckets
+
+    with crm.app.app_context():
+        crm.db.drop_all()
+        crm.db.create_all()
+    monkeypatch.setattr(crm.rate_limiter, 'backend', MemoryBuckets())
+    return crm.app.test_client()
+
+
+@pytest.fixture
+def add(main, client):
+    """Insert model instances into the main app's database; returns their ids"""
+
+    def add(*rows):
+        with main.app.app_context():
+            main.db.session.add_all(rows)
+            main.db.session.commit()
+            return [row.id for row in rows]
+
+    return add
+
+
+@pytest.fixture
+def auth(main):
+    """Authorization headers carrying a token for a user id"""
+    from flask_jwt_extended import create_access_token
+
+    def auth(user_id):
+        with main.app.app_context():
+            return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+    return auth
+
+
+@pytest.fixture
+def run_benchmark():
+    """Run benchmarks/<script> with `args`; returns its output, failing the test on a non-zero exit"""
+
+    def run(script, *args, timeout=600):
+        env = dict(BENCHMARK_ENV, LOG_LEVEL='WARNING')
+        result = subprocess.run([sys.executable, os.path.join(PROJECT_ROOT, 'benchmarks', script), *args],
+                                cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, timeout=timeout)
+        assert result.returncode == 0, f'{script} exited with {result.returncode}:\n{result.stdout}\n{result.stderr}'
+        return result.stdout
+
+    return run
@@ -0,0 +1,48 @@
+"""Verified-token cache of CachingJWTManager (main_app/auth.py)."""
+import pytest
+from flask_jwt_extended.default_callbacks import default_decode_key_callback
+
+from main_app.auth import CachingJWTManager, can_cache_decoding
+from main_app.cache import Cache, MemoryBackend
+
+
+@pytest.fixture
+def token_cache(main, monkeypatch):
+    cache = Cache(MemoryBackend(100), ttl=300)
+    monkeypatch.setattr(main.jwt, 'token_cache', cache)
+    return cache
+
+
+def test_installed_flask_jwt_extended_supports_the_cache():
+    assert can_cache_decoding()
+
+
+def test_repeated_token_is_verified_once(main, client, add, auth, token_cache):
+    headers = auth(add(main.User(email='user@example.com', name='User'))[0])
+    for _ in range(3):
+        assert client.get('/api/my-bookings', headers=headers).status_code == 200
+    # Each request looks the token up twice: for its rate limit key, then to authenticate
+    assert token_cache.stats()['namespaces']['token'] == {'hits': 4, 'misses': 2}
+
+    # A tampered signature is a different token: verified, and rejected
+    forged = headers['Authorization'][:-2] + ('AA' if not headers['Authorization'].endswith('AA') else 'BB')
+    response = client.get('/api/my-bookings', headers={'Authorization': forged})
+    assert (response.status_code, response.get_json()['sub_status']) == (401, 43)
+
+
+def test_custom_decode_key_loader_bypasses_the_cache(main, client, add, auth, token_cache, monkeypatch):
+    headers = auth(add(main.User(email='user@example.com', name='User'))[0])
+    assert client.get('/api/my-bookings', headers=headers).status_code == 200
+    assert main.jwt._decode_key_callback is default_decode_key_callback
+
+    # The key is retired: a cached token must not keep working
+    monkeypatch.setattr(main.jwt, '_decode_key_callback', lambda header, claims: 'retired' * 8)
+    response = client.get('/api/my-bookings', headers=headers)
+    assert (response.status_code, response.get_json()['sub_status']) == (401, 43)
+
+
+def test_cache_disables_itself_when_the_override_no_longer_fits(monkeypatch, caplog):
+    monkeypatch.setattr('main_app.auth.DECODE_PARAMETERS', ['self', 'encoded_token'])
+    manager = CachingJWTManager(cache_size=10)
+    assert manager.token_cache is None
+    assert 'JWT cache is disabled' in caplog.text
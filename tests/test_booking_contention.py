@@ -0,0 +1,10 @@
+"""No-oversell check: benchmarks/booking_contention.py must leave the event exactly full."""
+import os
+
+
+def test_concurrent_bookings_fill_event_without_overselling(run_benchmark, tmp_path):
+    database_url = os.getenv('TEST_DATABASE_URL') or f'sqlite:///{tmp_path}/contention.db'
+    output = run_benchmark('booking_contention.py', '--database-url', database_url,
+                           '--users', '200', '--capacity', '25', '--threads', '32')
+    assert 'confirmed:   25' in output
+    assert 'seats_taken: 25' in output
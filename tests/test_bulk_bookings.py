@@ -0,0 +1,93 @@
+"""Bulk cancel and move: set-based, and only for the facilitator of every event involved."""
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def setup(main, client, add, auth):
+    """Two facilitators with two events each, three booked users; the facilitators can sign in"""
+    own, other = add(main.Facilitator(name='Own', email='own@example.com'),
+                     main.Facilitator(name='Other', email='other@example.com'))
+    start = datetime.utcnow() + timedelta(days=1)
+    events = add(*[main.Event(title=f'Event {i}', event_type='session', duration=60, max_participants=10,
+                              date_time=start + timedelta(days=i), facilitator_id=facilitator_id)
+                   for i, facilitator_id in enumerate((own, own, other, other))])
+    users = add(*[main.User(email=f'user{i}@example.com', name=f'User {i}') for i in range(3)])
+    own_user, other_user = add(main.User(email='own@example.com', name='Own'),
+                               main.User(email='other@example.com', name='Other'))
+    bookings = {}
+    for event_id in (events[0], events[2]):
+        for user_id in users:
+            response = client.post('/api/bookings', json={'event_id': event_id}, headers=auth(user_id))
+            bookings.setdefault(event_id, []).append(response.get_json()['booking_id'])
+    return {'events': events, 'bookings': bookings, 'own': auth(own_user), 'other': auth(other_user),
+            'attendee': auth(users[0])}
+
+
+def booking_states(main):
+    with main.app.app_context():
+        return {booking.id: (booking.event_id, booking.status) for booking in main.Booking.query.all()}
+
+
+@pytest.mark.parametrize('body', [
+    lambda s: {'event_ids': [s['events'][2]]},
+    lambda s: {'booking_ids': s['bookings'][s['events'][2]][:1]},
+    lambda s: {'event_ids': [s['events'][0]], 'booking_ids': s['bookings'][s['events'][2]]},
+])
+def test_cancel_rejects_other_facilitators_bookings(main, client, setup, body):
+    before = booking_states(main)
+    response = client.post('/api/facilitator/bookings/cancel', json=body(setup), headers=setup['own'])
+    assert response.status_code == 403
+    assert booking_states(main) == before
+
+
+def test_cancel_rejects_callers_who_are_not_facilitators(main, client, setup):
+    response = client.post('/api/facilitator/bookings/cancel', json={'event_ids': [setup['events'][0]]},
+                           headers=setup['attendee'])
+    assert response.status_code == 403
+
+
+def test_facilitator_cancels_own_bookings(main, client, setup):
+    event_id = setup['events'][0]
+    response = client.post('/api/facilitator/bookings/cancel', json={'event_ids': [event_id]}, headers=setup['own'])
+    assert response.status_code == 200
+    assert sorted(response.get_json()['booking_ids']) == sorted(setup['bookings'][event_id])
+    with main.app.app_context():
+        assert main.db.session.get(main.Event, event_id).seats_taken == 0
+        # One batch outbox row holds the three cancellations
+        assert main.CrmOutbox.query.filter(main.CrmOutbox.payload.startswith('[')).count() == 1
+
+
+@pytest.mark.parametrize('body', [
+    lambda s: {'from_event_id': s['events'][2], 'to_event_id': s['events'][1]},
+    lambda s: {'from_event_id': s['events'][0], 'to_event_id': s['events'][3]},
+    lambda s: {'booking_ids': s['bookings'][s['events'][2]], 'to_event_id': s['events'][1]},
+])
+def test_move_rejects_other_facilitators_events(main, client, setup, body):
+    before = booking_states(main)
+    response = client.post('/api/facilitator/bookings/move', json=body(setup), headers=setup['own'])
+    assert response.status_code == 403
+    assert booking_states(main) == before
+    response = client.post('/api/facilitator/bookings/move', json=body(setup), headers=setup['attendee'])
+    assert response.status_code == 403
+
+
+def test_facilitator_moves_own_bookings(main, client, setup):
+    source, target = setup['events'][:2]
+    response = client.post('/api/facilitator/bookings/move', json={'from_event_id': source, 'to_event_id': target},
+                           headers=setup['own'])
+    assert response.status_code == 200
+    assert sorted(response.get_json()['booking_ids']) == sorted(setup['bookings'][source])
+    with main.app.app_context():
+        assert main.db.session.get(main.Event, source).seats_taken == 0
+        assert main.db.session.get(main.Event, target).seats_taken == 3
+
+
+def test_recurring_sessions_are_for_the_facilitator_only(main, client, setup):
+    with main.app.app_context():
+        own_id = main.Facilitator.query.filter_by(email='own@example.com').one().id
+    body = {'title': 'Series', 'date_time': '2031-01-01T09:00:00', 'count': 3, 'duration': 60}
+    url = f'/api/facilitator/events/{own_id}/recurring'
+    assert client.post(url, json=body, headers=setup['other']).status_code == 403
+    assert client.post(url, json=body, headers=setup['own']).status_code == 201
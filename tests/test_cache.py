@@ -0,0 +1,49 @@
+"""Event cache: which backends count as shared, and invalidations racing with loads (main_app/cache.py)."""
+from datetime import datetime, timedelta
+
+from common.shared_store import LocalRedis
+from main_app.cache import Cache, SharedBackend, cache_backend
+
+
+def test_only_a_real_shared_store_counts_as_shared():
+    assert not Cache(cache_backend('memory://')).shared
+    assert not Cache(cache_backend('local://')).shared
+    assert Cache(SharedBackend(LocalRedis())).shared
+
+
+def test_load_racing_an_invalidation_is_not_served():
+    cache = Cache(SharedBackend(LocalRedis()))
+    database = {'seats:1': 5, 'seats:2': 7}
+    loads = []
+
+    def racing_load(keys):
+        loads.append(keys)
+        stale = {key: database[key] for key in keys}
+        # A booking commits and invalidates between our read and our set
+        database['seats:1'] = 4
+        cache.invalidate('seats:1')
+        return stale
+
+    assert cache.read_through_many(['seats:1', 'seats:2'], racing_load) == {'seats:1': 5, 'seats:2': 7}
+    values = cache.read_through_many(['seats:1', 'seats:2'], lambda keys: {key: database[key] for key in keys})
+    assert values == {'seats:1': 4, 'seats:2': 7}
+    # seats:2 was stored and is still valid; seats:1 is now cached at its new version
+    assert cache.read_through_many(['seats:1', 'seats:2'], lambda keys: 1 / 0) == values
+    assert cache.stats()['namespaces']['seats'] == {'hits': 3, 'misses': 3}
+
+
+def test_bookings_update_shared_seat_counts(main, client, add, auth, monkeypatch):
+    monkeypatch.setattr(main, 'event_cache', Cache(SharedBackend(LocalRedis()), ttl=60))
+    facilitator_id, = add(main.Facilitator(name='Facilitator', email='facilitator@example.com'))
+    event_id, = add(main.Event(title='Session', event_type='session', duration=60, max_participants=3,
+                               date_time=datetime.utcnow() + timedelta(days=1), facilitator_id=facilitator_id))
+    user_id, = add(main.User(email='user@example.com', name='User'))
+    headers = auth(user_id)
+
+    def spots():
+        return client.get(f'/api/events/{event_id}', headers=headers).get_json()['available_spots']
+
+    assert spots() == 3
+    assert client.post('/api/bookings', json={'event_id': event_id}, headers=headers).status_code == 200
+    assert spots() == 2
+    assert main.event_cache.stats()['namespaces']['event'] == {'hits': 1, 'misses': 1}
@@ -0,0 +1,63 @@
+"""CRM notification ingest: retried deliveries are stored once (/notify and /notify/batch)."""
+import os
+
+TOKEN = {'Authorization': f"Bearer {os.getenv('CRM_BEARER_TOKEN', 'secure-bearer-token-123')}"}
+
+
+def notification(booking_id, key=None, **overrides):
+    data = {
+        'booking_id': booking_id,
+        'user': {'id': 1, 'name': 'User', 'email': 'user@example.com'},
+        'event': {'id': 7, 'title': 'Session', 'date_time': '2030-01-01T10:00:00'},
+        'facilitator_id': 3,
+        'type': 'created',
+    }
+    if key:
+        data['idempotency_key'] = key
+    data.update(overrides)
+    return data
+
+
+def stored(crm):
+    with crm.app.app_context():
+        return crm.BookingNotification.query.count()
+
+
+def test_batch_deduplicates_within_and_across_requests(crm, crm_client):
+    batch = [notification(1, 'a'), notification(2, 'b'), notification(1, 'a'), notification(3, 'c', user='x')]
+    response = crm_client.post('/notify/batch', json=batch, headers=TOKEN)
+    body = response.get_json()
+    assert (body['accepted'], body['duplicates'], body['rejected']) == (2, 1, 1)
+    assert [result['status'] for result in body['results']] == ['created', 'created', 'duplicate', 'error']
+    assert body['results'][2]['notification_id'] == body['results'][0]['notification_id']
+
+    # The outbox retries the whole batch after a lost response
+    retry = crm_client.post('/notify/batch', json=batch[:3] + [notification(4, 'd')], headers=TOKEN).get_json()
+    assert [result['status'] for result in retry['results']] == ['duplicate', 'duplicate', 'duplicate', 'created']
+    assert [result['notification_id'] for result in retry['results'][:3]] == \
+        [body['results'][i]['notification_id'] for i in (0, 1, 0)]
+    assert stored(crm) == 3
+
+
+def test_single_and_batch_deliveries_share_keys(crm, crm_client):
+    headers = dict(TOKEN, Accept='application/json')
+    first = crm_client.post('/notify', json=notification(1), headers=dict(headers, **{'Idempotency-Key': 'k1'}))
+    assert first.get_json()['status'] == 'success'
+    again = crm_client.post('/notify', json=notification(1, 'k1'), headers=headers).get_json()
+    assert (again['status'], again['notification_id']) == ('duplicate', first.get_json()['notification_id'])
+
+    # Without keys, one notification per booking, type and event
+    result, = crm_client.post('/notify/batch', json=[notification(1, 'k1')], headers=TOKEN).get_json()['results']
+    assert result['status'] == 'duplicate'
+    keyless = [notification(5), notification(5), notification(5, type='cancelled')]
+    results = crm_client.post('/notify/batch', json=keyless, headers=TOKEN).get_json()['results']
+    assert [result['status'] for result in results] == ['created', 'duplicate', 'created']
+    assert stored(crm) == 3
+
+
+def test_batch_rejects_malformed_bodies(crm, crm_client, monkeypatch):
+    monkeypatch.setitem(crm.app.config, 'NOTIFY_BATCH_MAX', 2)
+    assert crm_client.post('/notify/batch', json={'booking_id': 1}, headers=TOKEN).status_code == 400
+    assert crm_client.post('/notify/batch', json=[notification(i) for i in range(3)], headers=TOKEN).status_code == 413
+    assert crm_client.post('/notify/batch', json=[], headers={}).status_code == 401
+    assert stored(crm) == 0
@@ -0,0 +1,12 @@
+"""Index check: every statement of the hot endpoints must be served by an index."""
+import os
+
+
+def test_hot_path_statements_use_indexes(run_benchmark):
+    args = []
+    if os.getenv('TEST_DATABASE_URL') and os.getenv('TEST_CRM_DATABASE_URL'):
+        args = ['--database-url', os.environ['TEST_DATABASE_URL'],
+                '--crm-database-url', os.environ['TEST_CRM_DATABASE_URL']]
+    output = run_benchmark('explain_hot_paths.py', *args)
+    assert 'FULL SCAN' not in output
+    assert 'OK: every hot path statement uses an index' in output
@@ -0,0 +1,69 @@
+"""Idempotency-Key replay on POST /api/bookings (main_app/idempotency.py)."""
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def booking_setup(main, add, auth):
+    facilitator_id, = add(main.Facilitator(name='Facilitator', email='facilitator@example.com'))
+    event_ids = add(*[main.Event(title=f'Session {i}', event_type='session', duration=60, max_participants=5,
+                                 date_time=datetime.utcnow() + timedelta(days=1, hours=i),
+                                 facilitator_id=facilitator_id) for i in range(2)])
+    user_ids = add(*[main.User(email=f'user{i}@example.com', name=f'User {i}') for i in range(2)])
+    return event_ids, [auth(user_id) for user_id in user_ids]
+
+
+def bookings(main):
+    with main.app.app_context():
+        return main.Booking.query.count()
+
+
+def test_retry_replays_the_stored_response(main, client, booking_setup):
+    (event_id, _), (headers, _) = booking_setup
+    headers = dict(headers, **{'Idempotency-Key': 'booking-1'})
+    first = client.post('/api/bookings', json={'event_id': event_id}, headers=headers)
+    assert first.status_code == 200
+    assert 'Idempotent-Replayed' not in first.headers
+
+    retry = client.post('/api/bookings', json={'event_id': event_id}, headers=headers)
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert bookings(main) == 1
+
+
+def test_rejected_responses_are_replayed_too(main, client, booking_setup):
+    (event_id, _), (headers, _) = booking_setup
+    assert client.post('/api/bookings', json={'event_id': event_id}, headers=headers).status_code == 200
+    headers = dict(headers, **{'Idempotency-Key': 'booking-2'})
+    first = client.post('/api/bookings', json={'event_id': event_id}, headers=headers)
+    assert first.status_code == 400
+    retry = client.post('/api/bookings', json={'event_id': event_id}, headers=headers)
+    assert (retry.status_code, retry.get_json()) == (400, first.get_json())
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_key_reused_for_another_request_is_422(main, client, booking_setup):
+    (event_id, other_event_id), (headers, other_user) = booking_setup
+    keyed = dict(headers, **{'Idempotency-Key': 'booking-3'})
+    assert client.post('/api/bookings', json={'event_id': event_id}, headers=keyed).status_code == 200
+
+    response = client.post('/api/bookings', json={'event_id': other_event_id}, headers=keyed)
+    assert response.status_code == 422
+    assert bookings(main) == 1
+    # Keys are per user: someone else may use the same one
+    response = client.post('/api/bookings', json={'event_id': other_event_id},
+                           headers=dict(other_user, **{'Idempotency-Key': 'booking-3'}))
+    assert response.status_code == 200
+    assert 'Idempotent-Replayed' not in response.headers
+    assert bookings(main) == 2
+
+
+@pytest.mark.parametrize('key', ['', 'k' * 256])
+def test_invalid_key_is_rejected(main, client, booking_setup, key):
+    (event_id, _), (headers, _) = booking_setup
+    response = client.post('/api/bookings', json={'event_id': event_id},
+                           headers=dict(headers, **{'Idempotency-Key': key}))
+    assert response.status_code == 400
+    assert bookings(main) == 0
@@ -0,0 +1,94 @@
+"""Outbox delivery: retries, dead-lettering, and rows held back while the CRM circuit is open."""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from main_app.crm_client import CircuitOpenError, CRMClient
+from main_app.outbox import OutboxDispatcher, PermanentDeliveryError
+
+
+@pytest.fixture
+def outbox(main, client):
+    """Queue payloads in the main app's outbox; returns (queue, rows, make_due)"""
+    model = main.CrmOutbox
+
+    def queue(*payloads):
+        with main.app.app_context():
+            main.db.session.add_all([model(payload=json.dumps(payload)) for payload in payloads])
+            main.db.session.commit()
+
+    def rows():
+        with main.app.app_context():
+            return [(row.status, row.attempts) for row in model.query.order_by(model.id)]
+
+    def make_due():
+        with main.app.app_context():
+            main.db.session.execute(update(model).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+            main.db.session.commit()
+
+    return queue, rows, make_due
+
+
+def dispatcher(main, send, **kwargs):
+    return OutboxDispatcher(main.app, main.db, main.CrmOutbox, send, poll_interval=0, **kwargs)
+
+
+def test_failures_are_retried_then_dead_lettered(main, outbox):
+    queue, rows, make_due = outbox
+    queue({'booking_id': 1}, {'booking_id': 2})
+
+    def send(payload):
+        if payload['booking_id'] == 2:
+            raise PermanentDeliveryError('rejected')
+        raise RuntimeError('CRM notification failed: 503')
+
+    outbox_dispatcher = dispatcher(main, send, max_attempts=3)
+    for _ in range(3):
+        outbox_dispatcher.dispatch_due()
+        make_due()
+    assert rows() == [('dead', 3), ('dead', 1)]
+
+
+def test_open_circuit_defers_without_using_attempts(main, outbox):
+    queue, rows, make_due = outbox
+    queue({'booking_id': 1})
+    calls = []
+
+    def send(payload):
+        calls.append(payload)
+        if len(calls) <= 20:
+            raise CircuitOpenError('CRM circuit breaker is open', retry_after=30)
+
+    outbox_dispatcher = dispatcher(main, send, max_attempts=3)
+    for _ in range(20):
+        assert outbox_dispatcher.dispatch_due() == 1
+        assert rows() == [('pending', 0)]
+        # Not due again before the breaker half-opens
+        assert outbox_dispatcher.dispatch_due() == 0
+        make_due()
+    outbox_dispatcher.dispatch_due()
+    assert rows() == [('delivered', 1)]
+    assert outbox_dispatcher.stats()['deferred'] == 20
+
+
+def test_batch_rows_are_deferred_while_the_crm_is_down(main, outbox):
+    queue, rows, make_due = outbox
+    # A failing CRM on a closed port; the breaker opens after the first refused connection
+    crm = CRMClient('http://127.0.0.1:9/notify', 'token', batch_endpoint='http://127.0.0.1:9/notify/batch',
+                    connect_timeout=0.5, failure_threshold=1, reset_timeout=60)
+    queue([{'booking_id': 1}, {'booking_id': 2}], {'booking_id': 3})
+    outbox_dispatcher = dispatcher(main, crm.send, send_batch=crm.send_batch, max_attempts=2)
+
+    outbox_dispatcher.dispatch_due()
+    assert sorted(rows()) == [('pending', 0), ('pending', 1)]
+    for _ in range(5):
+        make_due()
+        outbox_dispatcher.dispatch_due()
+    assert sorted(rows()) == [('pending', 0), ('pending', 1)]
+    assert crm.metrics()['requests'] == 1
+    with main.app.app_context():
+        row = main.CrmOutbox.query.filter(main.CrmOutbox.attempts == 1).one()
+        assert row.last_error == 'CRM circuit breaker is open'
+        assert row.next_attempt_at > datetime.utcnow() + timedelta(seconds=50)
@@ -0,0 +1,80 @@
+"""Keyset pagination and field projection on the list endpoints."""
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def headers(main, add, auth):
+    user_id, = add(main.User(email='user@example.com', name='User'))
+    return auth(user_id)
+
+
+@pytest.fixture
+def events(main, add):
+    """Seven events, several of them starting at the same time"""
+    facilitator_id, = add(main.Facilitator(name='Facilitator', email='facilitator@example.com'))
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+    times = [start, start, start, start + timedelta(hours=1), start + timedelta(hours=1), start, start + timedelta(hours=2)]
+    return add(*[main.Event(title=f'Event {i}', event_type='session', duration=60, max_participants=5,
+                            date_time=date_time, facilitator_id=facilitator_id)
+                 for i, date_time in enumerate(times)])
+
+
+def walk(client, url, headers):
+    """Follow X-Next-Cursor from `url`; returns the pages' ids"""
+    pages = []
+    while url:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        pages.append([item['id'] for item in response.get_json()])
+        cursor = response.headers.get('X-Next-Cursor')
+        assert ('Link' in response.headers) == bool(cursor)
+        url = f'/api/events?limit=2&cursor={cursor}' if cursor else None
+    return pages
+
+
+def test_pages_cover_every_event_once_across_equal_start_times(client, headers, events):
+    pages = walk(client, '/api/events?limit=2', headers)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    # Ordered by start time, then id
+    assert sum(pages, []) == [events[i] for i in (0, 1, 2, 5, 3, 4, 6)]
+
+
+def test_last_page_has_no_next_cursor(client, headers, events):
+    response = client.get('/api/events?limit=7', headers=headers)
+    assert len(response.get_json()) == 7
+    assert 'X-Next-Cursor' not in response.headers
+    assert client.get('/api/events', headers=headers).headers.get('X-Next-Cursor') is None
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', base64.urlsafe_b64encode(b'[1, 2, 3]').decode(),
+                                    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+                                    base64.urlsafe_b64encode(b'5').decode()])
+def test_invalid_cursor_is_rejected(client, headers, events, cursor):
+    response = client.get(f'/api/events?cursor={cursor}', headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid cursor'
+
+
+def test_limit_bounds(main, client, headers, events, monkeypatch):
+    for limit in ('0', '-1', 'ten'):
+        assert client.get(f'/api/events?limit={limit}', headers=headers).status_code == 400
+    monkeypatch.setitem(main.app.config, 'MAX_PAGE_SIZE', 3)
+    response = client.get('/api/events?limit=100', headers=headers)
+    assert len(response.get_json()) == 3
+    assert response.headers['X-Next-Cursor']
+
+
+def test_fields_projection(client, headers, events):
+    response = client.get('/api/events?limit=1&fields=id,title', headers=headers)
+    assert response.get_json() == [{'id': events[0], 'title': 'Event 0'}]
+    response = client.get('/api/events?fields=id,secret', headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Unknown fields: secret'
+
+    assert client.post('/api/bookings', json={'event_id': events[0]}, headers=headers).status_code == 200
+    booking, = client.get('/api/my-bookings?fields=id,event,status', headers=headers).get_json()
+    assert set(booking) == {'id', 'event', 'status'}
+    assert booking['event']['title'] == 'Event 0'
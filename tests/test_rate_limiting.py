@@ -0,0 +1,53 @@
+"""Token buckets, Retry-After and client identification behind a proxy (common/ratelimit.py)."""
+import pytest
+
+from common.ratelimit import Limit, MemoryBuckets, SharedBuckets, parse_limit
+from common.shared_store import LocalRedis
+
+
+@pytest.mark.parametrize('make_buckets', [MemoryBuckets, lambda: SharedBuckets(LocalRedis())],
+                         ids=['memory', 'shared'])
+def test_bucket_allows_a_burst_then_reports_the_wait(make_buckets):
+    buckets = make_buckets()
+    limit = Limit(3, 60)
+    assert [buckets.take('client', limit)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, tokens, wait = buckets.take('client', limit)
+    assert not allowed
+    assert 0 < wait <= 20  # one token every 20 seconds
+    # Another client has a bucket of its own
+    assert buckets.take('other', limit)[0]
+
+
+def test_parse_limit():
+    assert parse_limit('off') is None
+    assert (parse_limit('10/minute').count, parse_limit('10/minute').period) == (10, 60)
+    assert parse_limit('5/30').period == 30
+    with pytest.raises(ValueError):
+        parse_limit('0/minute')
+
+
+def test_route_limit_answers_429_with_retry_after(client):
+    for _ in range(10):
+        response = client.post('/api/login', json={'email': 'nobody@example.com', 'password': 'x'})
+        assert response.status_code == 401
+    assert response.headers['X-RateLimit-Limit'] == '10'
+    assert response.headers['X-RateLimit-Remaining'] == '0'
+
+    response = client.post('/api/login', json={'email': 'nobody@example.com', 'password': 'x'})
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 6
+    # login has its own bucket; the default one is untouched
+    assert client.get('/').status_code == 200
+
+
+@pytest.mark.parametrize('app_name', ['main', 'crm'])
+def test_forwarded_clients_get_separate_buckets(request, monkeypatch, app_name):
+    module = request.getfixturevalue(app_name)
+    test_client = request.getfixturevalue('client' if app_name == 'main' else 'crm_client')
+    monkeypatch.setattr(module.rate_limiter, 'default', Limit(2, 60))
+
+    def get(address):
+        return test_client.get('/', headers={'X-Forwarded-For': address}).status_code
+
+    assert [get('203.0.113.1') for _ in range(3)] == [200, 200, 429]
+    assert get('203.0.113.2') == 200
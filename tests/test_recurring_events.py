@@ -0,0 +1,58 @@
+"""Recurring sessions: body validation and schedule conflicts."""
+import pytest
+
+
+@pytest.fixture
+def facilitator(main, add, auth):
+    facilitator_id, = add(main.Facilitator(name='Facilitator', email='facilitator@example.com'))
+    user_id, = add(main.User(email='facilitator@example.com', name='Facilitator'))
+    return f'/api/facilitator/events/{facilitator_id}/recurring', auth(user_id)
+
+
+BODY = {'title': 'Series', 'date_time': '2031-01-01T09:00:00', 'count': 3, 'duration': 60}
+
+
+@pytest.mark.parametrize('changes', [
+    {'date_time': 'tomorrow'},
+    {'title': ''},
+    {'count': 0},
+    {'count': '3'},
+    {'count': 10 ** 6},
+    {'interval_days': 0},
+    {'interval_days': 'abc'},
+    {'duration': 'abc'},
+    {'duration': -5},
+    {'max_participants': 'x'},
+    {'max_participants': None},
+    {'max_participants': 2 ** 40},
+    {'price': 'free'},
+    {'date_time': '9999-12-01T00:00:00', 'interval_days': 30},
+])
+def test_invalid_body_is_rejected(main, client, facilitator, changes):
+    url, headers = facilitator
+    response = client.post(url, json=dict(BODY, **changes), headers=headers)
+    assert response.status_code == 400
+    with main.app.app_context():
+        assert main.Event.query.count() == 0
+
+
+def test_series_is_created_and_counted(main, client, facilitator):
+    url, headers = facilitator
+    response = client.post(url, json=dict(BODY, max_participants=12, price=20), headers=headers)
+    assert response.status_code == 201
+    assert [event['date_time'] for event in response.get_json()['events']] == [
+        '2031-01-01T09:00:00', '2031-01-08T09:00:00', '2031-01-15T09:00:00']
+    with main.app.app_context():
+        stats = main.FacilitatorStats.query.one()
+        assert (stats.events, stats.capacity) == (3, 36)
+
+
+def test_series_clashing_with_itself_or_the_schedule_is_refused(main, client, facilitator):
+    url, headers = facilitator
+    # Sessions lasting longer than the interval overlap the next one
+    response = client.post(url, json=dict(BODY, duration=8 * 24 * 60), headers=headers)
+    assert response.status_code == 409
+    assert client.post(url, json=BODY, headers=headers).status_code == 201
+    response = client.post(url, json=dict(BODY, date_time='2031-01-08T09:30:00', count=1), headers=headers)
+    assert response.status_code == 409
+    assert [conflict['occurrence'] for conflict in response.get_json()['conflicts']] == [0]
@@ -0,0 +1,66 @@
+"""IntervalTree and overlap_groups against brute force (main_app/schedule.py)."""
+import random
+
+import pytest
+
+from main_app.schedule import IntervalTree, overlap_groups
+
+
+def brute_overlapping(intervals, start, end):
+    # In tree order: by start, then key
+    return sorted(((s, e, key) for s, e, key in intervals.values() if s < end and e > start),
+                  key=lambda interval: (interval[0], interval[2]))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_tree_matches_brute_force_through_inserts_and_removals(seed):
+    rng = random.Random(seed)
+    tree = IntervalTree(seed=seed)
+    intervals = {}
+    for key in range(400):
+        if intervals and rng.random() < 0.3:
+            # Remove a live interval, or try a (start, key) that is not in the tree
+            victim = rng.choice(list(intervals))
+            start = intervals[victim][0]
+            assert not tree.remove(start + 1, victim)
+            assert tree.remove(start, victim)
+            del intervals[victim]
+        else:
+            start = rng.randrange(0, 1000)
+            intervals[key] = (start, start + rng.randrange(1, 60), key)
+            tree.insert(*intervals[key])
+        assert len(tree) == len(intervals)
+
+        probe_start = rng.randrange(-20, 1020)
+        probe_end = probe_start + rng.randrange(1, 80)
+        expected = brute_overlapping(intervals, probe_start, probe_end)
+        assert tree.overlapping(probe_start, probe_end) == expected
+        assert tree.overlaps_any(probe_start, probe_end) == bool(expected)
+        if expected:
+            first = expected[0][2]
+            assert tree.overlaps_any(probe_start, probe_end, exclude={first}) == (len(expected) > 1)
+
+
+def test_touching_intervals_do_not_overlap():
+    tree = IntervalTree([(10, 20, 'a'), (20, 30, 'b'), (10, 20, 'c')], seed=1)
+    assert tree.overlapping(20, 21) == [(20, 30, 'b')]
+    assert not tree.overlaps_any(0, 10)
+    assert not tree.overlaps_any(30, 40)
+    assert [key for _, _, key in tree.overlapping(15, 25)] == ['a', 'c', 'b']
+    assert not tree.remove(10, 'missing')
+    assert len(tree) == 3
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_overlap_groups_matches_brute_force(seed):
+    rng = random.Random(seed)
+    intervals = []
+    for key in range(150):
+        start = rng.randrange(0, 500)
+        intervals.append((start, start + rng.randrange(1, 30), key))
+    expected = {}
+    for start, end, key in intervals:
+        others = [other for s, e, other in intervals if other != key and s < end and e > start]
+        if others:
+            expected[key] = sorted(others)
+    assert {key: sorted(others) for key, others in overlap_groups(intervals).items()} == expected
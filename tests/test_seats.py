@@ -0,0 +1,53 @@
+"""Seat counter: bookings claim seats atomically and capacity edits respect the seats taken."""
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def event(main, add):
+    facilitator_id, = add(main.Facilitator(name='Facilitator', email='facilitator@example.com'))
+    event_id, = add(main.Event(title='Session', event_type='session', duration=60, max_participants=2,
+                               date_time=datetime.utcnow() + timedelta(days=1), facilitator_id=facilitator_id))
+    return event_id
+
+
+def seats_taken(main, event_id):
+    with main.app.app_context():
+        return main.db.session.get(main.Event, event_id).seats_taken
+
+
+def test_bookings_stop_at_capacity(main, client, add, auth, event):
+    user_ids = add(*[main.User(email=f'user{i}@example.com', name=f'User {i}') for i in range(3)])
+    responses = [client.post('/api/bookings', json={'event_id': event}, headers=auth(user_id))
+                 for user_id in user_ids]
+    assert [response.status_code for response in responses] == [200, 200, 400]
+    assert responses[2].get_json()['message'] == 'Event is fully booked'
+    assert seats_taken(main, event) == 2
+
+    booking_id = responses[0].get_json()['booking_id']
+    assert client.delete(f'/api/bookings/{booking_id}', headers=auth(user_ids[0])).status_code == 200
+    # Cancelling twice gives the seat back once
+    assert client.delete(f'/api/bookings/{booking_id}', headers=auth(user_ids[0])).status_code == 200
+    assert seats_taken(main, event) == 1
+
+
+@pytest.mark.parametrize('value', [None, '5', 2.5, True, -1])
+def test_update_event_rejects_invalid_capacity(main, client, add, auth, event, value):
+    user_id, = add(main.User(email='user@example.com', name='User'))
+    response = client.put(f'/api/facilitator/events/{event}', json={'max_participants': value},
+                          headers=auth(user_id))
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'max_participants must be a non-negative integer'
+
+
+def test_update_event_keeps_capacity_above_seats_taken(main, client, add, auth, event):
+    user_id, = add(main.User(email='user@example.com', name='User'))
+    headers = auth(user_id)
+    assert client.post('/api/bookings', json={'event_id': event}, headers=headers).status_code == 200
+    response = client.put(f'/api/facilitator/events/{event}', json={'max_participants': 0}, headers=headers)
+    assert response.status_code == 400
+    assert client.put(f'/api/facilitator/events/{event}', json={'max_participants': 5},
+                      headers=headers).status_code == 200
+    with main.app.app_context():
+        assert main.db.session.get(main.Event, event).max_participants == 5
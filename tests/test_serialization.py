@@ -0,0 +1,51 @@
+"""JSON backends: orjson is opt-in and encodes like the standard library provider."""
+import json
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+
+from common.serialization import install_json_backend
+
+PAYLOAD = {
+    'zeta': 1,
+    'alpha': [1.5, None, True, 'café'],
+    'when': datetime(2030, 1, 2, 3, 4, 5),
+    'aware': datetime(2030, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+    'day': date(2030, 1, 2),
+    'price': Decimal('12.50'),
+    'id': uuid.UUID(int=1),
+    'nested': {'b': 2, 'a': {'y': 1, 'x': 0}},
+}
+
+
+def test_stdlib_is_the_default():
+    app = Flask(__name__)
+    provider = app.json
+    assert install_json_backend(app) == 'stdlib'
+    assert app.json is provider
+    with pytest.raises(ValueError):
+        install_json_backend(app, 'auto')
+
+
+def test_orjson_encodes_like_the_stdlib_provider():
+    pytest.importorskip('orjson')
+    stdlib, fast = Flask('stdlib'), Flask('fast')
+    assert install_json_backend(fast, 'orjson') == 'orjson'
+
+    expected = stdlib.json.dumps(PAYLOAD)
+    encoded = fast.json.dumps(PAYLOAD)
+    assert json.loads(encoded) == json.loads(expected)
+    assert json.loads(encoded)['when'] == 'Wed, 02 Jan 2030 03:04:05 GMT'
+    # Same key order
+    assert list(json.loads(encoded)) == list(json.loads(expected)) == sorted(PAYLOAD)
+
+    with fast.app_context():
+        response = fast.json.response(PAYLOAD)
+    with stdlib.app_context():
+        stdlib_response = stdlib.json.response(PAYLOAD)
+    assert response.mimetype == stdlib_response.mimetype
+    assert json.loads(response.get_data()) == json.loads(stdlib_response.get_data())
+    assert fast.json.loads(expected) == stdlib.json.loads(expected)
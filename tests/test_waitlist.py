@@ -0,0 +1,42 @@
+"""Waitlist: users queue for a full event and take freed seats first come, first served."""
+from datetime import datetime, timedelta
+
+
+def test_freed_seats_go_to_the_waitlist_in_order(main, client, add, auth):
+    facilitator_id, = add(main.Facilitator(name='Facilitator', email='facilitator@example.com'))
+    event_id, = add(main.Event(title='Session', event_type='session', duration=60, max_participants=1,
+                               date_time=datetime.utcnow() + timedelta(days=1), facilitator_id=facilitator_id))
+    first, *waiting = [auth(user_id) for user_id in
+                       add(*[main.User(email=f'user{i}@example.com', name=f'User {i}') for i in range(5)])]
+
+    booking_id = client.post('/api/bookings', json={'event_id': event_id}, headers=first).get_json()['booking_id']
+    responses = [client.post('/api/bookings', json={'event_id': event_id, 'waitlist': True}, headers=headers)
+                 for headers in waiting]
+    assert [(response.status_code, response.get_json()['position']) for response in responses] == \
+        [(202, 1), (202, 2), (202, 3), (202, 4)]
+    again = client.post('/api/bookings', json={'event_id': event_id, 'waitlist': True}, headers=waiting[0])
+    assert again.status_code == 400
+
+    # The second in line leaves; the others move up
+    entry_id = responses[1].get_json()['waitlist_id']
+    assert client.delete(f'/api/waitlist/{entry_id}', headers=waiting[1]).status_code == 200
+    assert [item['position'] for item in client.get('/api/my-waitlist', headers=waiting[3]).get_json()] == [3]
+
+    def confirmed(headers):
+        return [booking['event']['id'] for booking in client.get('/api/my-bookings', headers=headers).get_json()
+                if booking['status'] == 'confirmed']
+
+    # A cancellation hands its seat to the head of the queue
+    assert client.delete(f'/api/bookings/{booking_id}', headers=first).status_code == 200
+    assert confirmed(waiting[0]) == [event_id]
+    assert client.get('/api/my-waitlist', headers=waiting[0]).get_json() == []
+    assert [item['position'] for item in client.get('/api/my-waitlist', headers=waiting[2]).get_json()] == [1]
+
+    # Added capacity goes to the next in line, not to whoever books first
+    response = client.put(f'/api/facilitator/events/{event_id}', json={'max_participants': 2}, headers=first)
+    assert response.get_json()['promoted_from_waitlist'] == 1
+    assert confirmed(waiting[2]) == [event_id]
+    assert confirmed(waiting[1]) == confirmed(waiting[3]) == []
+    assert [item['position'] for item in client.get('/api/my-waitlist', headers=waiting[3]).get_json()] == [1]
+    with main.app.app_context():
+        assert main.db.session.get(main.Event, event_id).seats_taken == 2